@@ -0,0 +1,101 @@
+import os
+import json
+import hashlib
+import threading
+
+from PIL import Image, ImageOps
+
+# Per-deck cache of artworks that have already been fitted and cropped to the artwork window of their frame.
+# Cached artworks are keyed by the SHA-1 of the source file and the target window size, and stored losslessly as PNG in
+# <deck folder>/.cache/Artwork. The hash of each source file is remembered in index.json together with its size and
+# modification time, so repeat builds only stat the original artworks and never read or decode them again.
+
+ARTWORK_CACHE_FOLDER = os.path.join(".cache", "Artwork")
+
+class ArtworkCache:
+    def __init__(self, cache_folder):
+        self.cache_folder = cache_folder
+        self.index_path = os.path.join(cache_folder, "index.json")
+        self.lock = threading.Lock()
+        self.index_changed = False
+        try:
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+        except:
+            self.index = {}
+
+    # Returns the SHA-1 of the file at the input path, reading the file only if it changed since it was last hashed.
+    def source_hash(self, path):
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        with self.lock:
+            entry = self.index.get(key)
+        if entry is not None and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+            return entry["sha1"]
+        sha1 = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha1.update(chunk)
+        with self.lock:
+            self.index[key] = {"mtime": stat.st_mtime, "size": stat.st_size, "sha1": sha1.hexdigest()}
+            self.index_changed = True
+        return sha1.hexdigest()
+
+    def cached_path(self, source_hash, size):
+        return os.path.join(self.cache_folder, f"{source_hash}_{size[0]}x{size[1]}.png")
+
+    # Returns the artwork at the input path, scaled and center-cropped to exactly fill size (a (width, height) tuple).
+    def load(self, path, size):
+        size = (int(size[0]), int(size[1]))
+        cached_path = self.cached_path(self.source_hash(path), size)
+        if os.path.isfile(cached_path):
+            try:
+                image = Image.open(cached_path)
+                image.load()
+                return image
+            except:
+                pass
+        image = fit_artwork(path, size)
+        os.makedirs(self.cache_folder, exist_ok=True)
+        temporary_path = cached_path + "." + str(os.getpid()) + "." + str(threading.get_ident()) + ".tmp"
+        image.save(temporary_path, format="PNG")
+        os.replace(temporary_path, cached_path)
+        return image
+
+    def save(self):
+        with self.lock:
+            if not self.index_changed:
+                return
+            os.makedirs(self.cache_folder, exist_ok=True)
+            with open(self.index_path, "w") as f:
+                json.dump(self.index, f, indent=1)
+            self.index_changed = False
+
+# Opens the artwork at the input path and returns it scaled and center-cropped to exactly fill size.
+# Large JPEGs are decoded at a reduced scale with Pillow's draft mode, never below what the window needs.
+def fit_artwork(path, size):
+    image = Image.open(path)
+    scale = max(size[0]/image.size[0], size[1]/image.size[1])
+    if scale < 1:
+        image.draft("RGB", (int(image.size[0]*scale+1), int(image.size[1]*scale+1)))
+    if image.mode not in ["RGB", "RGBA"]:
+        image = image.convert("RGB")
+    return ImageOps.fit(image, size, method=Image.LANCZOS)
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+# Returns the artwork cache of the input deck folder.
+def get_cache(deck_folder):
+    cache_folder = os.path.join(deck_folder, ARTWORK_CACHE_FOLDER)
+    with _caches_lock:
+        if cache_folder not in _caches:
+            _caches[cache_folder] = ArtworkCache(cache_folder)
+        return _caches[cache_folder]
+
+# Writes the source hash index of every cache used so far.
+def save_caches():
+    with _caches_lock:
+        caches = list(_caches.values())
+    for cache in caches:
+        cache.save()
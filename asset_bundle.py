@@ -0,0 +1,167 @@
+import os
+import io
+import json
+import mmap
+import time
+import struct
+import argparse
+import threading
+
+from PIL import Image
+
+import paths
+
+# Packed bundle of the assets in ASSETS_PATH: the symbols, indicators and overlays (and optionally the frames) as raw, already decoded pixels,
+# and the font files as they are. The bundle is a single file, memory-mapped by every process that loads assets (see build_card.load_asset_image and
+# build_card.load_font), and each image in it is wrapped as a read-only Pillow image that points into the mapping instead of being read and
+# decoded (with Image.frombuffer): loading an asset takes microseconds, and the pixels are shared by every process through the page cache.
+# Pillow only maps buffers without copying them in a few raw modes, so RGB images are packed as RGBX (with a padding byte per pixel) and
+# copied out of the mapping as RGB images (still without being decoded), since RGBX images can't be written by every encoder. RGBA and L
+# images are mapped as they are, and every image starts on a page boundary. Only RGB, RGBA and L images are packed; assets in other modes are still
+# read from their files.
+# The bundle is built by running this module. It records the size and modification time of every packed file, and an asset whose file
+# changed since is read from the file instead (with a warning), until the bundle is built again.
+# The frames are left out by default, since with every frame in CardBorders the bundle takes a few GB (the frames are not compressed);
+# --frames packs them too.
+
+ASSET_BUNDLE_VERSION = 2
+MAGIC = b"MTGASSETBUNDLE"
+HEADER_SIZE = 4096
+ALIGNMENT = 4096
+# Image mode: raw mode of the packed pixels
+PACKED_MODES = {"RGB": "RGBX", "RGBA": "RGBA", "L": "L"}
+IMAGE_EXTENSIONS = [".png", ".jpg"]
+FONT_EXTENSIONS = [".ttf", ".otf"]
+
+# Returns the key of the asset at the input path in the bundle (its path relative to the assets folder), or None if it is outside of it.
+def get_key(path, assets_path=paths.ASSETS_PATH):
+    key = os.path.relpath(os.path.abspath(path), os.path.abspath(assets_path))
+    if key.startswith(".."):
+        return None
+    return key.replace(os.sep, "/")
+
+# Writes the bundle of every asset in assets_path to bundle_path. Returns the number of assets packed and the size of the bundle in bytes.
+#   frames -- If True, the frames in CARD_BORDERS_PATH are packed too.
+def build_bundle(bundle_path=paths.ASSET_BUNDLE_PATH, assets_path=paths.ASSETS_PATH, frames=False):
+    index = {}
+    os.makedirs(os.path.dirname(bundle_path), exist_ok=True)
+    temporary_path = bundle_path + "." + str(os.getpid()) + ".tmp"
+    with open(temporary_path, "wb") as f:
+        f.write(b"\0" * HEADER_SIZE)
+        for root, folders, filenames in os.walk(assets_path):
+            folders.sort()
+            if not frames and os.path.abspath(root) == os.path.abspath(paths.CARD_BORDERS_PATH):
+                continue
+            for filename in sorted(filenames):
+                path = os.path.join(root, filename)
+                extension = os.path.splitext(filename)[1].lower()
+                stat = os.stat(path)
+                entry = {"file_size": stat.st_size, "mtime": stat.st_mtime}
+                if extension in IMAGE_EXTENSIONS:
+                    try:
+                        image = Image.open(path)
+                        image.load()
+                    except Exception as e:
+                        print(f"WARNING: Could not decode the asset {path}, so it was not packed: {e}")
+                        continue
+                    if image.mode not in PACKED_MODES:
+                        continue
+                    data = image.convert(PACKED_MODES[image.mode]).tobytes() if image.mode == "RGB" else image.tobytes()
+                    entry.update({"kind": "image", "mode": image.mode, "rawmode": PACKED_MODES[image.mode], "size": list(image.size)})
+                elif extension in FONT_EXTENSIONS:
+                    with open(path, "rb") as font_file:
+                        data = font_file.read()
+                    entry["kind"] = "font"
+                else:
+                    continue
+                f.seek(-f.tell() % ALIGNMENT, os.SEEK_CUR)
+                entry.update({"offset": f.tell(), "length": len(data)})
+                f.write(data)
+                index[get_key(path, assets_path)] = entry
+        index_data = json.dumps({"version": ASSET_BUNDLE_VERSION, "entries": index}, separators=(",", ":")).encode("utf-8")
+        index_offset = f.tell()
+        f.write(index_data)
+        f.seek(0)
+        f.write(MAGIC + struct.pack("<QQ", index_offset, len(index_data)))
+        bundle_size = index_offset + len(index_data)
+    os.replace(temporary_path, bundle_path)
+    return len(index), bundle_size
+
+class AssetBundle:
+    def __init__(self, bundle_path=paths.ASSET_BUNDLE_PATH, assets_path=paths.ASSETS_PATH):
+        self.path = bundle_path
+        self.assets_path = assets_path
+        self.warned_outdated = False
+        with open(bundle_path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{bundle_path} is not an asset bundle.")
+        index_offset, index_length = struct.unpack("<QQ", self.map[len(MAGIC):len(MAGIC)+16])
+        index = json.loads(self.map[index_offset:index_offset+index_length])
+        if index["version"] != ASSET_BUNDLE_VERSION:
+            raise ValueError(f"The asset bundle {bundle_path} was built by another version of asset_bundle.py.")
+        self.entries = index["entries"]
+
+    # Returns the entry of the asset at the input path, or None if it isn't packed or its file changed since the bundle was built.
+    def get_entry(self, path, kind):
+        key = get_key(path, self.assets_path)
+        entry = self.entries.get(key) if key is not None else None
+        if entry is None or entry["kind"] != kind:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if stat.st_size != entry["file_size"] or stat.st_mtime != entry["mtime"]:
+            if not self.warned_outdated:
+                print(f"WARNING: {path} changed since the asset bundle was built, so it is read from its file. Run asset_bundle.py to build the bundle again.")
+                self.warned_outdated = True
+            return None
+        return entry
+
+    # Returns the image at the input path as a read-only image mapped from the bundle (Pillow copies it before any change), or None.
+    # RGB assets are returned as RGB copies of the mapped pixels.
+    def get_image(self, path):
+        entry = self.get_entry(path, "image")
+        if entry is None:
+            return None
+        buffer = memoryview(self.map)[entry["offset"]:entry["offset"]+entry["length"]]
+        image = Image.frombuffer(entry["mode"], tuple(entry["size"]), buffer, "raw", entry["rawmode"], 0, 1)
+        if image.mode != entry["mode"]:
+            image = image.convert(entry["mode"])
+        return image
+
+    # Returns the font file at the input path as a file object, or None.
+    def get_font_file(self, path):
+        entry = self.get_entry(path, "font")
+        if entry is None:
+            return None
+        return io.BytesIO(self.map[entry["offset"]:entry["offset"]+entry["length"]])
+
+_bundle = None
+_bundle_loaded = False
+_bundle_lock = threading.Lock()
+
+# Returns the asset bundle shared by every asset load in this process, or None if there is no (valid) bundle.
+def get_bundle():
+    global _bundle, _bundle_loaded
+    with _bundle_lock:
+        if not _bundle_loaded:
+            _bundle_loaded = True
+            if os.path.isfile(paths.ASSET_BUNDLE_PATH):
+                try:
+                    _bundle = AssetBundle()
+                except Exception as e:
+                    print("WARNING: Could not open the asset bundle, so assets are read from their files:", e)
+        return _bundle
+
+def main():
+    parser = argparse.ArgumentParser(description='Packs the assets into a memory-mapped bundle of decoded images and fonts')
+    parser.add_argument('--frames', help='Pack the frames in CardBorders too (a few GB)', action='store_true', dest='frames')
+    args = parser.parse_args()
+    start_time = time.perf_counter()
+    num_assets, bundle_size = build_bundle(frames=args.frames)
+    print(f"Packed {num_assets} assets into {paths.ASSET_BUNDLE_PATH} ({bundle_size/(1<<20):.1f} MB) in {time.perf_counter()-start_time:.1f}s.")
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,15 @@
 ﻿import os
 import re
 import unicodedata
-from PIL import Image, ImageDraw, ImageFont
+from functools import lru_cache
+from PIL import Image, ImageDraw, ImageFont, UnidentifiedImageError
 import game_elements
-from paths import ASSETS_PATH, SYMBOL_PATH, SET_SYMBOL_PATH, SAGA_SYMBOL_PATH, MDFC_INDICATOR_PATH, FONT_PATHS
+import output_encoding
+import artwork_cache
+import layout_cache
+import rich_text
+import asset_bundle
+from paths import ASSETS_PATH, CARD_BORDERS_PATH, SYMBOL_PATH, SET_SYMBOL_PATH, SAGA_SYMBOL_PATH, MDFC_INDICATOR_PATH, FONT_PATHS
 
 POSITION_CARD_NAME  = (66,77)
 POSITION_CARD_TYPE  = (66,609)
@@ -22,6 +28,9 @@ POSITION_FLAVOR_LINE = (82,None)
 POSITION_SAGA_LINE = (84,None)
 POSITION_SAGA_NUM_CHAPTERS = (250,232)
 POSITION_SAGA_CHAPTER_SYMBOLS = (31,None)
+POSITION_ARTWORK = (58,118)
+POSITION_TOKEN_ARTWORK = (58,170)
+POSITION_SAGA_ARTWORK = (373,118)
 
 MAX_HEIGHT_CARD_NAME  = 44.5
 MAX_HEIGHT_CARD_TYPE  = 37.5
@@ -35,6 +44,10 @@ MAX_WIDTH_CARD_NAME = 575
 MAX_WIDTH_CARD_TYPE = 567
 MAX_HEIGHT_POWER_TOUGHNESS = 39
 
+SIZE_ARTWORK = (628,459)
+SIZE_TOKEN_ARTWORK = (628,521)
+SIZE_SAGA_ARTWORK = (313,754)
+
 CARD_WIDTH = 744
 CARD_HEIGHT = 1039
 
@@ -48,40 +61,179 @@ WHITE = (255,255,255)
 ################################################################################
 ################################################################################
 
+# Returns the input length, position or size (a number, or a tuple/list of them) multiplied by the resolution scale. None entries are kept and integers are rounded to integers.
+# Every layout constant above is given for 744x1039 output, so drawing code passes them through scale_value to render at other resolutions (e.g., 0.5 for drafts, 2 for print masters).
+def scale_value(value, scale):
+    if value is None:
+        return None
+    if type(value)==tuple or type(value)==list:
+        return type(value)(scale_value(v, scale) for v in value)
+    if scale == 1:
+        return value
+    if type(value)==int:
+        return max(1, round(value*scale)) if value > 0 else round(value*scale)
+    return value*scale
+
+# Decoded asset images (frames, symbols, indicators...), keyed by (path, size). Images returned by load_asset_image are shared, so callers must copy them before drawing on them.
+_asset_images = {}
+
+# Returns the decoded image at the input path, resized to size (a (width, height) tuple) if given. Each asset is only read and decoded from disk once per process,
+# or mapped from the asset bundle without decoding if there is one (see asset_bundle).
+#   scale -- resolution scale applied to size (or to the asset's own size if size is None). Downscaled assets are cached too, so drafts never resize the same asset twice.
+def load_asset_image(path, size=None, scale=1):
+    if scale != 1:
+        size = scale_value(size if size is not None else load_asset_image(path).size, scale)
+    key = (path, size)
+    image = _asset_images.get(key)
+    if image is None:
+        bundle = asset_bundle.get_bundle()
+        image = bundle.get_image(path) if bundle is not None else None
+        if image is None:
+            image = Image.open(path)
+        if size is not None:
+            image = image.resize(size)
+        image.load()
+        _asset_images[key] = image
+    return image
+
+# Returns the TrueType font of the input size. Fonts are only loaded once per (file, size) pair.
+@lru_cache(maxsize=None)
+def load_font(font_filename, font_size):
+    bundle = asset_bundle.get_bundle()
+    font_file = bundle.get_font_file(font_filename) if bundle is not None else None
+    return ImageFont.truetype(font_file if font_file is not None else font_filename, font_size)
+
+# Loads every symbol, indicator and overlay image (and optionally every card frame) into the asset cache, so later renders never touch the Assets folder.
+#   frames -- If True, decodes every frame in CardBorders. If a list, decodes only those frame paths. If False/None, frames are decoded on first use.
+#   scale  -- resolution scale of the assets to preload.
+def preload_assets(frames=False, scale=1):
+    asset_folders = [ASSETS_PATH, SYMBOL_PATH, SET_SYMBOL_PATH, SAGA_SYMBOL_PATH, MDFC_INDICATOR_PATH]
+    for folder in asset_folders:
+        for filename in sorted(os.listdir(folder)):
+            if os.path.splitext(filename)[1].lower() in [".png", ".jpg"]:
+                load_asset_image(os.path.join(folder, filename), scale=scale)
+    if frames is True:
+        frames = [os.path.join(CARD_BORDERS_PATH, f) for f in sorted(os.listdir(CARD_BORDERS_PATH)) if f.endswith(".jpg")]
+    for frame in (frames or []):
+        load_asset_image(frame, scale=scale)
+    for font_filename in FONT_PATHS.values():
+        load_font(font_filename, scale_value(MAX_FONT_SIZE_RULES_TEXT_LETTERS, scale))
+
 # Returns a list of all card names in the input search_path directory with the names <cardname>.jpg or <cardname>_<number>.jpg (used to search for Artworks or Cards)
-def find_cards_with_card_name(cardname, search_path):
+#   extensions -- file extensions to accept in place of .jpg (e.g., the extension of the encoder used to save the Cards folder)
+def find_cards_with_card_name(cardname, search_path, extensions=(".jpg",)):
     matching_files = []
-    pattern1 = re.compile(rf"^{re.escape(unicodedata.normalize('NFC', cardname))}\.jpg$")
-    pattern2 = re.compile(rf"^{re.escape(unicodedata.normalize('NFC', cardname))}_\d+\.jpg$")
+    extension_pattern = "(" + "|".join(re.escape(e) for e in extensions) + ")"
+    pattern1 = re.compile(rf"^{re.escape(unicodedata.normalize('NFC', cardname))}{extension_pattern}$")
+    pattern2 = re.compile(rf"^{re.escape(unicodedata.normalize('NFC', cardname))}_\d+{extension_pattern}$")
     for file in os.listdir(search_path):
         if pattern1.match(unicodedata.normalize('NFC', file)) or pattern2.match(unicodedata.normalize('NFC', file)):
             matching_files.append(unicodedata.normalize('NFC', file))
     return matching_files
 
-def create_card_image_from_Card(card, save_path=None, black_token_cover=True):
+# Returns the (position, size) of the artwork window in the frame of the input card, at the input resolution scale.
+def get_artwork_window(card, scale=1):
+    if card.is_saga():
+        return scale_value(POSITION_SAGA_ARTWORK, scale), scale_value(SIZE_SAGA_ARTWORK, scale)
+    elif card.is_token():
+        return scale_value(POSITION_TOKEN_ARTWORK, scale), scale_value(SIZE_TOKEN_ARTWORK, scale)
+    else:
+        return scale_value(POSITION_ARTWORK, scale), scale_value(SIZE_ARTWORK, scale)
+
+# Opens the artwork of the input card, fitted and cropped to the card's artwork window. artwork_path is either the artwork file itself or the folder containing <cardname>.jpg.
+# Fitted artworks are cached in the deck folder (see artwork_cache), so unchanged artworks are never decoded again.
+# Returns None, with a warning, if the artwork is missing or can't be read or decoded. Any other error is raised.
+def load_artwork_image(card, artwork_path=None, scale=1):
+    if artwork_path is None:
+        artwork_path = os.path.join(".", "Artwork")
+    pattern1 = re.compile(rf"^{re.escape(card.name)}\.jpg$")
+    pattern2 = re.compile(rf"^{re.escape(card.name)}_\d+\.jpg$")
+    if not (pattern1.match(os.path.basename(artwork_path)) or pattern2.match(os.path.basename(artwork_path))):
+        artwork_path = os.path.join(artwork_path, card.name+".jpg")
+    if not os.path.isfile(artwork_path):
+        print("  Failed to open artwork image for card " + card.name + ".jpeg")
+        return None
+    _, size = get_artwork_window(card, scale)
+    try:
+        return artwork_cache.get_cache(os.path.dirname(os.path.dirname(os.path.abspath(artwork_path)))).load(artwork_path, size)
+    except (OSError, UnidentifiedImageError) as e:
+        print("  Failed to open artwork image for card " + card.name + ".jpeg:", e)
+        return None
+
+# Returns a list of (artwork filename, decoded artwork image) pairs for every artwork of the input card in artwork_folder.
+# The image is None for any artwork that could not be opened. Returns an empty list if the card has no artwork.
+def load_card_artworks(card, artwork_folder, scale=1):
+    card_artworks = find_cards_with_card_name(card.name, search_path=artwork_folder) if os.path.isdir(artwork_folder) else []
+    return [(card_artwork, load_artwork_image(card, os.path.join(artwork_folder, card_artwork), scale)) for card_artwork in card_artworks]
+
+# Renders one card image per artwork of the input card and saves them to save_path.
+#   encoder      -- OutputEncoder used to save the images. Defaults to the Cards (or Tokens) encoder in output_encoding.encoders.
+#   encoder_pool -- If given, an EncoderPool that writes the images in the background instead of blocking here.
+#   artwork_images -- Optional list of (artwork filename, decoded image) pairs, as returned by load_card_artworks. If None, the artworks are read from the Artwork folder next to save_path.
+#   scale        -- resolution scale of the rendered images (1 for 744x1039 output).
+#   layer        -- Optional image returned by CardDraw.render_layer for this card. If given, the artworks are pasted onto it and nothing else is drawn.
+# Returns a list of (card artwork filename, rendered image) pairs, which can be passed on to create_printing_image_from_Card.
+def create_card_image_from_Card(card, save_path=None, black_token_cover=True, encoder=None, encoder_pool=None, artwork_images=None, scale=1, layer=None):
     if type(card)!=game_elements.Card:
         raise TypeError("Input card must be of type Card.")
-    card_artworks = find_cards_with_card_name(card.name, search_path=os.path.join(os.path.dirname(save_path), "Artwork"))
-    if len(card_artworks)==0:
+    if encoder is None:
+        encoder = output_encoding.encoders["Tokens" if card.is_token() else "Cards"]
+    if artwork_images is None:
+        artwork_images = load_card_artworks(card, os.path.join(os.path.dirname(save_path), "Artwork"), scale)
+    if len(artwork_images)==0:
         print(f"  WARNING: No artworks found for card {card.name} in Artworks folder.")
-        card_artworks = [card.name+".jpg"]
-    for card_artwork in card_artworks:
+        artwork_images = [(card.name+".jpg", None)]
+    rendered_images = []
+    # The frame, text and symbols are the same for every artwork, so they are drawn once and each artwork is pasted onto a copy of them
+    card_draw = CardDraw(card, save_path=save_path, scale=scale)
+    if layer is None:
+        layer = card_draw.render_layer(black_token_cover=black_token_cover)
+    for card_artwork, artwork_image in artwork_images:
         this_save_path = save_path if save_path.endswith(card_artwork) else os.path.join(save_path, card_artwork)
-        card_draw = CardDraw(card, save_path=this_save_path)
-        card_draw.write_name()
-        card_draw.write_type_line()
-        card_draw.write_rules_text()
-        card_draw.paste_mana_symbols()
-        card_draw.paste_set_symbol()
-        card_draw.adjust_token_frame(black_token_cover)
-        card_draw.paste_artwork(artwork_path=os.path.join(os.path.dirname(save_path), "Artwork", card_artwork))
-        card_draw.paste_mdfc_indicator()
-        card_draw.write_power_toughness()
-        card_draw.save()
+        image = card_draw.composite_artwork(layer, artwork_path=os.path.join(os.path.dirname(save_path), "Artwork", card_artwork), artwork_image=artwork_image)
+        if encoder_pool is not None:
+            encoder_pool.submit(encoder, image, this_save_path)
+        else:
+            encoder.save(image, this_save_path)
+        rendered_images.append((card_artwork, image))
+    return rendered_images
+
+# Returns the printing image (shrunk card on a black background, with the corners and bottom text covered) for the input rendered card image.
+#   scale -- resolution scale of the printing image. By default, the scale the card image was rendered at.
+def create_printing_image(card, image_card, scale=None):
+    if scale is None:
+        scale = image_card.size[0] / CARD_WIDTH
+    image_bkg = load_asset_image(os.path.join(ASSETS_PATH, 'black_card.jpg'), scale=scale)
+    shrink_ratio = 0.85
+    image_card = image_card.resize((round(744 * scale * shrink_ratio), round(1039 * scale * shrink_ratio)))
+    new_image = image_bkg.copy()
+    new_image.paste(image_card, (round((1 - shrink_ratio) / 2 * 744 * scale), round((1 - shrink_ratio) / 2 * 1039 * scale)))
+    draw = ImageDraw.Draw(new_image)
+    xy = [(55, 78), (55, 106), (82, 78)]
+    draw.polygon(scale_value(xy, scale), fill="black", outline="black")
+    xy = [(660, 78), (690, 106), (690, 78)]
+    draw.polygon(scale_value(xy, scale), fill="black", outline="black")
+    xy = [(55, 934), (55, 962), (82, 962)]
+    draw.polygon(scale_value(xy, scale), fill="black", outline="black")
+    xy = [(660, 962), (690, 934), (690, 962)]
+    draw.polygon(scale_value(xy, scale), fill="black", outline="black")
+    if card.is_creature() or card.is_vehicle():
+        xy = [(428, 913), (428, 947), (650, 947), (650, 913)]
+        draw.polygon(scale_value(xy, scale), fill="black", outline="black")
+    else:
+        xy = [(428, 900), (428, 947), (650, 947), (650, 900)]
+        draw.polygon(scale_value(xy, scale), fill="black", outline="black")
+    return new_image
     
-def create_printing_image_from_Card(card, saved_image_path=None, save_path=None):
+# Creates the printing images for every saved image of the input card.
+#   card_images  -- Optional list of (card image filename, image) pairs, as returned by create_card_image_from_Card. If given, these are used instead of reading the saved card images back from saved_image_path.
+#   encoder      -- OutputEncoder used to save the images. Defaults to the Printing encoder in output_encoding.encoders.
+#   encoder_pool -- If given, an EncoderPool that writes the images in the background.
+def create_printing_image_from_Card(card, saved_image_path=None, save_path=None, card_images=None, encoder=None, encoder_pool=None):
     if type(card) != game_elements.Card:
         raise TypeError("Input card must be of type Card.")
+    if encoder is None:
+        encoder = output_encoding.encoders["Printing"]
     card_or_token = "Tokens" if card.is_token() else "Cards"
     if saved_image_path is None:
         saved_image_path = card_or_token
@@ -103,37 +255,24 @@ def create_printing_image_from_Card(card, saved_image_path=None, save_path=None)
         else:
             save_path = os.path.join(save_path, "Printing")
     # Find all cards with the card name
-    card_names = find_cards_with_card_name(card.name, saved_image_path)
-    for card_name in card_names:
+    if card_images is None:
+        saved_extensions = (".jpg", output_encoding.encoders[card_or_token].extension)
+        card_images = [(card_name, None) for card_name in find_cards_with_card_name(card.name, saved_image_path, extensions=saved_extensions)]
+    for card_name, image_card in card_images:
         # Set the paths to retrieve the card image and write the printing image
         current_saved_image_path = os.path.join(saved_image_path, card_name)
         current_save_path = f"{os.path.splitext(save_path)[0]}/{card_name}"
         if card.is_token():
             current_save_path = os.path.join(os.path.dirname(current_save_path), "_TOKEN_"+os.path.basename(current_save_path))
         # Load and process image
-        image_bkg = Image.open(os.path.join(ASSETS_PATH, 'black_card.jpg'))
-        image_card = Image.open(current_saved_image_path)
-        shrink_ratio = 0.85
-        image_card = image_card.resize((round(744 * shrink_ratio), round(1039 * shrink_ratio)))
-        new_image = image_bkg.copy()
-        new_image.paste(image_card, (round((1 - shrink_ratio) / 2 * 744), round((1 - shrink_ratio) / 2 * 1039)))
-        draw = ImageDraw.Draw(new_image)
-        xy = [(55, 78), (55, 106), (82, 78)]
-        draw.polygon(xy, fill="black", outline="black")
-        xy = [(660, 78), (690, 106), (690, 78)]
-        draw.polygon(xy, fill="black", outline="black")
-        xy = [(55, 934), (55, 962), (82, 962)]
-        draw.polygon(xy, fill="black", outline="black")
-        xy = [(660, 962), (690, 934), (690, 962)]
-        draw.polygon(xy, fill="black", outline="black")
-        if card.is_creature() or card.is_vehicle():
-            xy = [(428, 913), (428, 947), (650, 947), (650, 913)]
-            draw.polygon(xy, fill="black", outline="black")
-        else:
-            xy = [(428, 900), (428, 947), (650, 947), (650, 900)]
-            draw.polygon(xy, fill="black", outline="black")
+        if image_card is None:
+            image_card = Image.open(current_saved_image_path)
+        new_image = create_printing_image(card, image_card)
         # Save the new image
-        new_image.save(current_save_path)
+        if encoder_pool is not None:
+            encoder_pool.submit(encoder, new_image, current_save_path)
+        else:
+            encoder.save(new_image, current_save_path)
 
 ################################################################################
 ################################################################################
@@ -143,7 +282,9 @@ def create_printing_image_from_Card(card, saved_image_path=None, save_path=None)
 # # https://gist.github.com/turicas/1455973
 
 class CardDraw(object):
-    def __init__(self, card, filename=None, save_path=None):
+    # scale -- resolution scale of the card image. Every position, size and font is multiplied by it (0.5 renders a 372x520 draft, 2 a 1488x2078 print master).
+    # draw  -- If False, the frame is not decoded and write_text only measures text, so the layout of the card can be checked without drawing it (see layout_check).
+    def __init__(self, card, filename=None, save_path=None, scale=1, draw=True):
         if type(card)!=game_elements.Card:
             raise TypeError("Could not create a new CardDraw object. Input card must be of type Card.")
         self.card = card
@@ -155,53 +296,83 @@ class CardDraw(object):
         elif not save_path.endswith(".jpg"):
             save_path = os.path.join(save_path, self.filename)
         self.save_path = save_path
-        self.image = Image.open(self.card.frame)
-        self.size = self.image.size
+        self.scale = scale
+        if draw:
+            self.image = load_asset_image(self.card.frame, scale=scale).copy()
+            self.size = self.image.size
+            self.draw = ImageDraw.Draw(self.image)
+        else:
+            self.image = None
+            self.size = self.scaled((CARD_WIDTH, CARD_HEIGHT))
+            self.draw = None
+
+    # Saves the card image with the input OutputEncoder (by default, the Cards or Tokens encoder) and returns the path written.
+    def save(self, save_path=None, encoder=None):
+        if encoder is None:
+            encoder = output_encoding.encoders["Tokens" if self.card.is_token() else "Cards"]
+        return encoder.save(self.image, save_path or self.save_path)
+
+    # Draws every element of the card onto the frame, in order, and returns the finished image. If artwork_path is None, the artwork window is left empty.
+    #   artwork_image -- an already decoded artwork image, used instead of opening artwork_path.
+    def render(self, artwork_path=None, black_token_cover=True, artwork_image=None):
+        self.render_layer(black_token_cover)
+        if artwork_path is not None or artwork_image is not None:
+            self.paste_artwork(artwork_path=artwork_path, artwork_image=artwork_image)
+        return self.image
+
+    # Draws every element of the card except its artwork onto the frame and returns the image, with the artwork window left as in the frame.
+    # The MDFC indicator and power/toughness are drawn below every artwork window, so drawing them before the artwork is pasted gives the same image.
+    def render_layer(self, black_token_cover=True):
+        self.write_name()
+        self.write_type_line()
+        self.write_rules_text()
+        self.paste_mana_symbols()
+        self.paste_set_symbol()
+        self.adjust_token_frame(black_token_cover)
+        self.paste_mdfc_indicator()
+        self.write_power_toughness()
+        return self.image
+
+    # Returns a copy of the input layer (as returned by render_layer) with the input artwork pasted into its window. If artwork_path is None, the artwork window is left empty.
+    def composite_artwork(self, layer, artwork_path=None, artwork_image=None):
+        self.image = layer.copy()
         self.draw = ImageDraw.Draw(self.image)
+        if artwork_path is not None or artwork_image is not None:
+            self.paste_artwork(artwork_path=artwork_path, artwork_image=artwork_image)
+        return self.image
 
-    def save(self, save_path=None):
-        self.image.save(save_path or self.save_path)
+    # Returns the input layout constant (given for 744x1039 output) at this card's resolution scale.
+    def scaled(self, value):
+        return scale_value(value, self.scale)
 
     def get_text_size(self, font_filename, font_size, text):
-        font = ImageFont.truetype(font_filename, font_size)
+        font = load_font(font_filename, font_size)
         _, _, x, y = font.getbbox(text)
         return (x,y)
     
-    # italics_start_indices -- a list of every index in the current block of text where font should change to italics from regular
-    # italics_end_indices   -- a list of every index in the current block of text where font should change from italics to regular
-    # italics_index_offset  -- an integer giving the number of characters from the current text block that occurred BEFORE the input line of text. Used to adjust italics_start_indices.
-    def get_text_size_adjusted_for_italics(self, font_size, text, italics_start_indices, italics_end_indices, italics_index_offset, font_filename=FONT_PATHS["rules"], font_filename_italics=FONT_PATHS["flavor"]):
-        if len(italics_start_indices) != len(italics_end_indices):
-            raise ValueError("Input italics_start_indices and italics_end_indices must be lists of the same length.")
-        italics_start_indices_mod = [italics_start_indices[si] - italics_index_offset for si in range(len(italics_start_indices)) if (italics_end_indices[si] - italics_index_offset > 0)]  # italics_start_indices[si] - italics_index_offset >= 0 and
-        italics_end_indices_mod   = [italics_end_indices[ei]   - italics_index_offset for ei in range(len(italics_end_indices))   if (italics_end_indices[ei] - italics_index_offset > 0)]
-        italics_start_indices = [si if si>=0 else 0 for si in italics_start_indices_mod]
-        italics_end_indices   = [ei if ei>=0 else 0 for ei in italics_end_indices_mod]
-        for i, (start, end) in enumerate(zip(italics_start_indices, italics_end_indices)):
-            if end<start:
-                raise ValueError("Each corresponding pair of start and end indices in italics_start_indices and italics_end_indices must statisfy start<=end.")
-        if len(italics_start_indices)==0:
-            return self.get_text_size(font_filename, font_size, text)
-        starts_italicized, ends_italicized = (0 in italics_start_indices), (max(italics_end_indices)>=len(text))
-        combined_indices = sorted(italics_start_indices.copy() + italics_end_indices.copy())
-        if not starts_italicized:
-            combined_indices = [0] + combined_indices
-        if not ends_italicized:
-            combined_indices.append(len(text))
-        is_italicized = starts_italicized
+    # Returns the size of a line of text given as a sequence of rich_text.TextRuns. Consecutive runs of the same style are measured together, italic ones with font_filename_italics.
+    def get_runs_size(self, font_size, runs, font_filename=FONT_PATHS["rules"], font_filename_italics=FONT_PATHS["flavor"]):
         total_text_size = [0,0]
-        for i in range(1, len(combined_indices)):
-            font_file = font_filename_italics if is_italicized else font_filename
-            this_text_chunk = text[combined_indices[i-1]:combined_indices[i]]
-            size_this_chunk = self.get_text_size(font_file, font_size, this_text_chunk)
+        for chunk, italic in rich_text.group_by_italics(runs):
+            size_this_chunk = self.get_text_size(font_filename_italics if italic else font_filename, font_size, chunk)
             total_text_size[0] += size_this_chunk[0]
             total_text_size[1] = max(total_text_size[1], size_this_chunk[1])
-            is_italicized = not is_italicized
         return tuple(total_text_size)
 
+    # Returns the largest font size at which text fits in max_width and max_height. Font sizes found for names, type lines, etc. are kept in the layout cache.
     def get_font_size(self, text, font, max_width=None, max_height=None, min_font_size=1):
         if max_width is None and max_height is None:
             raise ValueError('You need to pass max_width or max_height')
+        cache = layout_cache.get_cache()
+        font_size_key = cache.key("font_size", text, font, max_width, max_height, min_font_size)
+        font_size = cache.get(font_size_key)
+        if font_size is not None:
+            return font_size
+        font_size = self.fit_font_size(text, font, max_width, max_height, min_font_size)
+        cache.put(font_size_key, font_size)
+        return font_size
+
+    def fit_font_size(self, text, font, max_width=None, max_height=None, min_font_size=1):
         font_size = min_font_size
         text_size = self.get_text_size(font, font_size, text)
         if (max_width is not None and text_size[0] > max_width) or (max_height is not None and text_size[1] > max_height):
@@ -213,25 +384,16 @@ class CardDraw(object):
             text_size = self.get_text_size(font, font_size, text)
         
     # Writes a single line of text:
-    # italics_start_indices -- a list of every index in the current block of text where font should change to italics from regular
-    # italics_end_indices   -- a list of every index in the current block of text where font should change from italics to regular
-    # italics_index_offset  -- an integer giving the number of characters from the current text block that occurred BEFORE the input line of text. Used to adjust italics_start_indices.
-    def write_text(self, position, text, font_filename, font_filename_italics=FONT_PATHS["flavor"], font_size="fill", color=BLACK, max_width=None, max_height=None, adjust_for_below_letters=False, x_centered=False, y_centered=True, return_symbol_positions=False, italics_start_indices=[], italics_end_indices=[], italics_index_offset=0):
-        if len(italics_start_indices) != len(italics_end_indices):
-            raise ValueError("Input italics_start_indices and italics_end_indices must be lists of the same length.")
-        italics_start_indices_mod = [italics_start_indices[si] - italics_index_offset for si in range(len(italics_start_indices)) if (italics_end_indices[si] - italics_index_offset > 0)]  # italics_start_indices[si] - italics_index_offset >= 0 and
-        italics_end_indices_mod   = [italics_end_indices[ei]   - italics_index_offset for ei in range(len(italics_end_indices))   if (italics_end_indices[ei] - italics_index_offset > 0)]
-        italics_start_indices = [si if si>=0 else 0 for si in italics_start_indices_mod]
-        italics_end_indices   = [ei if ei>=0 else 0 for ei in italics_end_indices_mod]
-        for i, (start, end) in enumerate(zip(italics_start_indices, italics_end_indices)):
-            if end<start:
-                raise ValueError("Each corresponding pair of start and end indices in italics_start_indices and italics_end_indices must statisfy start<=end.")
+    # runs -- the line as a sequence of rich_text.TextRuns, whose italic runs are drawn with font_filename_italics. If None, the whole text is drawn with font_filename.
+    def write_text(self, position, text, font_filename, font_filename_italics=FONT_PATHS["flavor"], font_size="fill", color=BLACK, max_width=None, max_height=None, adjust_for_below_letters=False, x_centered=False, y_centered=True, return_symbol_positions=False, runs=None):
+        if runs is None:
+            runs = rich_text.style_line(text, [])
         if font_size == 'fill' and (max_width is not None or max_height is not None):
             font_size = self.get_font_size(text, font_filename, max_width, max_height)
-        # text_size = self.get_text_size(font_filename, font_size, text)
-        text_size = self.get_text_size_adjusted_for_italics(font_size, text, italics_start_indices, italics_end_indices, italics_index_offset)
-        font_regular = ImageFont.truetype(font_filename, font_size)
-        font_italics = ImageFont.truetype(font_filename_italics, font_size)
+        # The size used to position the text is measured with the rules text fonts, which every position constant was tuned with.
+        text_size = self.get_runs_size(font_size, runs)
+        font_regular = load_font(font_filename, font_size)
+        font_italics = load_font(font_filename_italics, font_size)
         if position == 'center':
             x = (self.size[0] - text_size[0]) / 2
             y = (self.size[1] - text_size[1]) / 2
@@ -260,48 +422,51 @@ class CardDraw(object):
             # If none of the slightly/mid/very below letters are present, raise the y-value significantly:  
             else:
                 y -= text_size[1]*adjustment_weight_very
-        if len(italics_start_indices)==0:
-            starts_italicized, ends_italicized = False, False
-            combined_indices = [0, len(text)]
-        else:
-            starts_italicized, ends_italicized = (0 in italics_start_indices), (max(italics_end_indices)>=len(text))
-            combined_indices = sorted(italics_start_indices.copy() + italics_end_indices.copy())
-            if not starts_italicized:
-                combined_indices = [0] + combined_indices
-            if not ends_italicized:
-                combined_indices.append(len(text))
-        is_italicized = starts_italicized
         current_x = x
-        for i in range(1, len(combined_indices)):
+        advance = 0
+        drawn_chunks = [] # (index of the chunk's first character in the line, width of the line before the chunk, chunk text, font file) of each chunk drawn
+        chunk_start = 0
+        for this_text_chunk, is_italicized in rich_text.group_by_italics(runs):
             font_file = font_filename_italics if is_italicized else font_filename
             font = font_italics if is_italicized else font_regular
-            this_text_chunk = text[combined_indices[i-1]:combined_indices[i]]
             size_this_chunk = self.get_text_size(font_file, font_size, this_text_chunk)
-            self.draw.text((current_x, y), this_text_chunk, font=font, fill=color)
+            if self.draw is not None:
+                self.draw.text((current_x, y), this_text_chunk, font=font, fill=color)
+            drawn_chunks.append((chunk_start, advance, this_text_chunk, font_file))
             current_x += size_this_chunk[0]
-            is_italicized = not is_italicized
-        # self.draw.text((x, y), text, font=font, fill=color)
+            advance += size_this_chunk[0]
+            chunk_start += len(this_text_chunk)
         if return_symbol_positions:
+            # Each symbol is placed at the width of the text before it, not counting the space just before it: the advance of the
+            # chunks drawn before that point, plus the chunk it falls in measured up to it.
             symbol_positions = []
-            for i, char in enumerate(text):
-                if char=="○":
-                    # size_so_far = self.get_text_size(font_filename, font_size, text[0:i-1])
-                    size_so_far = self.get_text_size_adjusted_for_italics(font_size, text[0:i-1], italics_start_indices, italics_end_indices, 0, font_filename=font_filename, font_filename_italics=font_filename_italics)                  
-                    symbol_positions.append((int(x+size_so_far[0]), int(y)))
+            run_start = 0
+            for run in runs:
+                if run.symbol:
+                    cut = max(run_start-1, 0) if run_start > 0 else max(len(text)-1, 0)
+                    for chunk_start, chunk_advance, this_text_chunk, font_file in reversed(drawn_chunks):
+                        if chunk_start <= cut:
+                            break
+                    size_so_far = chunk_advance + self.get_text_size(font_file, font_size, this_text_chunk[0:cut-chunk_start])[0]
+                    symbol_positions.append((int(x+size_so_far), int(y)))
+                run_start += len(run.text)
             return text_size, symbol_positions
         else:
             return text_size
 
-    # TODO -- within flavor text, support non-italicized words
-    def write_rules_text(self, font_size='fill', color=BLACK, place='left'):
+    # Fits the rules text (or Saga chapters) of the card into its text box, without drawing anything.
+    # Returns a dictionary with everything write_rules_text needs to draw it (font size, line breaks, italics, symbols and starting position), or None if the card has no rules text.
+    # The dictionary only contains JSON types, so it can be stored in the layout cache.
+    def layout_rules_text(self, font_size='fill'):
         font_filename, font_filename_flavor = FONT_PATHS["rules"], FONT_PATHS["flavor"]
         text, text_flavor = self.card.rules, self.card.flavor
+        num_chapters, unique_chapter_group_numbers = None, []
         if (text is None or len(text)==0) and (text_flavor is None or len(text_flavor)==0) and (self.card.rules1 is None and self.card.rules2 is None and self.card.rules3 is None and self.card.rules4 is None and self.card.rules5 is None):
-            return
+            return None
         if self.card.is_saga():
-            max_width = MAX_WIDTH_SAGA_RULES_TEXT_BOX
+            max_width = self.scaled(MAX_WIDTH_SAGA_RULES_TEXT_BOX)
         else:
-            max_width = MAX_WIDTH_RULES_TEXT_BOX
+            max_width = self.scaled(MAX_WIDTH_RULES_TEXT_BOX)
         if (text is None or len(text)==0) and text_flavor is not None:
             text = text_flavor
             font_filename = font_filename_flavor
@@ -311,8 +476,6 @@ class CardDraw(object):
             unique_chapter_groups = [] # Each element contains unique text. If all chapters are unique, this has the same length as the number of chapters.
             unique_chapter_group_numbers = [] # Element i contains the chapter numbers (1-6) that have the text of the ith element of unique_chapter_groups.
             num_chapters = sum([ctext is not None for ctext in all_chapter_texts])
-            num_chapters_image = Image.open(os.path.join(SAGA_SYMBOL_PATH, str(num_chapters)+".jpg"))
-            self.image.paste(num_chapters_image, POSITION_SAGA_NUM_CHAPTERS)
             for ci, chapter_text in enumerate(all_chapter_texts):
                 if chapter_text is None:
                     break
@@ -329,23 +492,23 @@ class CardDraw(object):
                         text += "\n\n"
             text_flavor = None
         elif text is None and text_flavor is None:
-            return
+            return None
         if self.card.is_token():
-            max_height = MAX_HEIGHT_TOKEN_RULES_TEXT_BOX
+            max_height = self.scaled(MAX_HEIGHT_TOKEN_RULES_TEXT_BOX)
             if self.card.is_creature():
-                max_height -= 15
-            x,y = POSITION_TOKEN_RULES_TEXT
+                max_height -= self.scaled(15)
+            x,y = self.scaled(POSITION_TOKEN_RULES_TEXT)
         elif self.card.is_saga():
-            max_height = MAX_HEIGHT_SAGA_RULES_TEXT_BOX
-            x,y = POSITION_SAGA_RULES_TEXT
+            max_height = self.scaled(MAX_HEIGHT_SAGA_RULES_TEXT_BOX)
+            x,y = self.scaled(POSITION_SAGA_RULES_TEXT)
         else:
-            max_height = MAX_HEIGHT_RULES_TEXT_BOX
-            x,y = POSITION_RULES_TEXT
+            max_height = self.scaled(MAX_HEIGHT_RULES_TEXT_BOX)
+            x,y = self.scaled(POSITION_RULES_TEXT)
         if (self.card.related_indicator is not None) and len(self.card.related_indicator)>0 and (self.card.special is not None) and ("mdfc" in self.card.special.lower()):
-            max_height -= 14
+            max_height -= self.scaled(14)
         if font_size == 'fill':
             fill = True
-            font_size = self.get_font_size(text, font_filename, max_height=MAX_FONT_SIZE_RULES_TEXT_LETTERS, max_width=MAX_WIDTH_RULES_TEXT_BOX)
+            font_size = self.get_font_size(text, font_filename, max_height=self.scaled(MAX_FONT_SIZE_RULES_TEXT_LETTERS), max_width=self.scaled(MAX_WIDTH_RULES_TEXT_BOX))
         else:
             fill = False
         text_blocks = text.split('\n')
@@ -389,143 +552,46 @@ class CardDraw(object):
         first_box_fill_attempt = True
         text_lines = []
         flavor_block_line_index = None
-        # Find the indices where each italics element should start/end in each text block:
-        italics_start_indices_per_text_block = []
-        italics_end_indices_per_text_block = []
+        # Parse each text block once into its plain text, the style of each of its characters and its words (see rich_text):
+        nonspace_italic_flags_per_text_block = []
+        words_per_text_block = []
         for ti, this_text_block in enumerate(text_blocks):
-            if not any([it in this_text_block for it in ["(",")","<i>","</i>"]]):
-                italics_start_indices_per_text_block.append([])
-                italics_end_indices_per_text_block.append([])
-                continue
-            need_to_update_text_block = False
-            force_italics_start_positions, force_italics_end_positions = [], []
-            last_found_indicator = None
-            for position in range(len(this_text_block)):
-                try:
-                    if this_text_block[position:position+3]=="<i>":
-                        if last_found_indicator is None or last_found_indicator != "<i>":
-                            force_italics_start_positions.append(position)
-                            this_text_block = this_text_block[0:position] + this_text_block[position+3:]
-                            need_to_update_text_block = True
-                            last_found_indicator = "<i>"
-                    elif this_text_block[position:position+4]=="</i>":
-                        if last_found_indicator is None or last_found_indicator != "</i>":
-                            force_italics_end_positions.append(position)
-                            this_text_block = this_text_block[0:position] + this_text_block[position+4:]
-                            need_to_update_text_block = True
-                            last_found_indicator = "</i>"
-                    elif this_text_block[position]=="(":
-                        if last_found_indicator is None or last_found_indicator != "(":
-                            force_italics_start_positions.append(position)
-                            last_found_indicator = "("
-                    elif this_text_block[position]==")":
-                        if last_found_indicator is None or last_found_indicator != ")":
-                            force_italics_end_positions.append(position+1)
-                            last_found_indicator = ")"
-                except:
-                    pass
-            if need_to_update_text_block:
-                text_blocks[ti] = this_text_block
-            while len(force_italics_end_positions) < len(force_italics_start_positions):
-                force_italics_end_positions.append(len(text_blocks[ti])+1)
-            while len(force_italics_start_positions) < len(force_italics_end_positions):
-                force_italics_start_positions = [0] + force_italics_start_positions
-            italics_start_indices_per_text_block.append(force_italics_start_positions)
-            italics_end_indices_per_text_block.append(force_italics_end_positions)
-        # For text block i, italics_start_indices_per_text_block[i] gives a list of each time the font should switch to italics, and italics_end_indices_per_text_block[i] gives a list of identical length giving each time the font should switch back to normal.
+            text_blocks[ti], italic_flags = rich_text.parse_italics(this_text_block)
+            nonspace_italic_flags_per_text_block.append(rich_text.get_nonspace_italic_flags(text_blocks[ti], italic_flags))
+            words_per_text_block.append(rich_text.split_words(text_blocks[ti]))
         # Determine the size of the complete rules text and break it up into separate lines:
-        stored_complete_italics_start_indices = italics_start_indices_per_text_block.copy()
-        stored_complete_italics_end_indices = italics_end_indices_per_text_block.copy()
         while total_height > max_height:
-            italics_start_indices_per_text_block = stored_complete_italics_start_indices.copy()
-            italics_end_indices_per_text_block = stored_complete_italics_end_indices.copy()
             if not first_box_fill_attempt:
                 font_size -= 1
             text_height = self.get_text_size(font_filename, font_size, "j")[1]
             text_height_flavor = self.get_text_size(font_filename_flavor, font_size, "j")[1]
             saga_separator_line_indices = []
             text_lines = []
-            text_lines_block_indices = [] # Same length as text_lines. Keeps track of which text block index, if any (None otherwise), each line corresponds to
+            text_lines_runs = [] # Same length as text_lines. The styled runs of each line.
             cumulative_text_height = text_height
-            for ti, this_text_block in enumerate(text_blocks):
-                stored_italics_start_indices = italics_start_indices_per_text_block[ti].copy()
-                stored_italics_end_indices = italics_end_indices_per_text_block[ti].copy()
+            for ti, words in enumerate(words_per_text_block):
+                nonspace_italic_flags = nonspace_italic_flags_per_text_block[ti]
                 while True:
-                    italics_start_indices_per_text_block[ti] = stored_italics_start_indices.copy()
-                    italics_end_indices_per_text_block[ti] = stored_italics_end_indices.copy()
-                    lines = []
+                    lines = [] # Each element is (list of words in the line, index of the line's first character in nonspace_italic_flags)
                     line = []
-                    words = this_text_block.split()
-                    # Count any times that a symbol is preceded by a character separated only ONE space -- this will require any later italics indices to be shifted by one.
-                    extra_italics_shift_indices = []
-                    if len(italics_start_indices_per_text_block[ti])>0:
-                        for txtchr_i, txtchr in enumerate(this_text_block):
-                            if txtchr_i < 2 or txtchr != "○":
-                                continue
-                            if (this_text_block[txtchr_i-2] not in [" ", "○"]) and (this_text_block[txtchr_i-1] == " "):
-                                if txtchr_i not in extra_italics_shift_indices:
-                                    extra_italics_shift_indices.append(txtchr_i)
-                    # Re-adjust for edge case where symbol is preceded by a char separated only by one space (no spaces in original input text):
-                    for extra_italics_shift_index in extra_italics_shift_indices:
-                        for italics_i in range(len(italics_start_indices_per_text_block[ti])):
-                            if italics_start_indices_per_text_block[ti][italics_i] > extra_italics_shift_index:
-                                italics_start_indices_per_text_block[ti][italics_i] += 1
-                            if italics_end_indices_per_text_block[ti][italics_i] > extra_italics_shift_index:
-                                italics_end_indices_per_text_block[ti][italics_i] += 1
-                    # Preprocess the split words to combine all of the symbols into a single word:
-                    words_adjusted_for_symbols = []
-                    last_symbol_seen = None
-                    for wi, word in enumerate(words):
-                        if word != "○":
-                            if last_symbol_seen is not None:
-                                italics_index_adjustment = wi - last_symbol_seen - 1
-                                for italics_i in range(len(italics_start_indices_per_text_block[ti])):
-                                    if italics_start_indices_per_text_block[ti][italics_i] > len(" ".join(words_adjusted_for_symbols[:last_symbol_seen])):
-                                        italics_start_indices_per_text_block[ti][italics_i] += italics_index_adjustment
-                                    if italics_end_indices_per_text_block[ti][italics_i] > len(" ".join(words_adjusted_for_symbols[:last_symbol_seen])):
-                                        italics_end_indices_per_text_block[ti][italics_i] += italics_index_adjustment
-                                words_adjusted_for_symbols.append(" " + "  ".join(words[last_symbol_seen:wi])+(" " if ((wi<=len(words)-1) and (words[wi] not in [".",",",":"]))else ""))
-                                last_symbol_seen = None
-                            words_adjusted_for_symbols.append(word)
-                            continue
-                        if last_symbol_seen is None:
-                            last_symbol_seen = wi
-                        if wi==len(words)-1:
-                            words_adjusted_for_symbols.append(" " + "  ".join(words[last_symbol_seen:]))
-                    # One more pass through the adjusted words, combining any symbols with following punctuation:
-                    words_readjusted = []
-                    previous_word_is_symbol = False
-                    previous_word_is_quote = False
-                    for word in words_adjusted_for_symbols:
-                        if previous_word_is_symbol and word in [".",",",":",".\""]:
-                            words_readjusted[-1] = words_readjusted[-1] + " " + word
-                        elif previous_word_is_quote and "○" in word:
-                            words_readjusted[-1] = words_readjusted[-1] + word
-                        else:
-                            words_readjusted.append(word)
-                        previous_word_is_symbol = "○" in word
-                        previous_word_is_quote = "\"" in word
-                    words = words_readjusted.copy()
+                    line_start = 0
                     # Compute the size of this text block and divide it into separate lines:
-                    current_italics_index_offset = 0
                     for word in words:
-                        reached_creature_pt_box = self.card.is_creature() and (cumulative_text_height > (MAX_HEIGHT_RULES_TEXT_BOX-40))
+                        reached_creature_pt_box = self.card.is_creature() and (cumulative_text_height > self.scaled(MAX_HEIGHT_RULES_TEXT_BOX-40))
                         new_line = ' '.join(line + [word])
-                        # size = self.get_text_size(font_filename, font_size, new_line)
-                        size = self.get_text_size_adjusted_for_italics(font_size, new_line, italics_start_indices_per_text_block[ti], italics_end_indices_per_text_block[ti], current_italics_index_offset, font_filename, font_filename_flavor)
-                        this_max_width = max_width-70 if reached_creature_pt_box else max_width # Ensures the rules text doesn't run into the power/toughness box
+                        size = self.get_runs_size(font_size, rich_text.style_line(new_line, nonspace_italic_flags, line_start), font_filename, font_filename_flavor)
+                        this_max_width = max_width-self.scaled(70) if reached_creature_pt_box else max_width # Ensures the rules text doesn't run into the power/toughness box
                         if size[0] <= this_max_width:
                             line.append(word)
                         else:
-                            current_italics_index_offset += len(line)+1
                             cumulative_text_height += text_height
-                            lines.append(line)
+                            lines.append((line, line_start))
+                            line_start += rich_text.count_nonspace(' '.join(line))
                             line = [word]
                     if line:
                         cumulative_text_height += text_height
-                        reached_creature_pt_box = self.card.is_creature() and (cumulative_text_height > (MAX_HEIGHT_RULES_TEXT_BOX-40))
-                        lines.append(line)
-                    if font_size >= MAX_FONT_SIZE_RULES_TEXT_LETTERS:
+                        lines.append((line, line_start))
+                    if font_size >= self.scaled(MAX_FONT_SIZE_RULES_TEXT_LETTERS):
                         break
                     elif fill and ti==0 and first_box_fill_attempt:
                         font_size += 1
@@ -537,17 +603,17 @@ class CardDraw(object):
                     text_height = text_height_flavor
                     flavor_block_line_index = len(text_lines)
                     text_lines += [" "]
-                    text_lines_block_indices.append(None)
+                    text_lines_runs.append(rich_text.style_line(" ", []))
                 elif self.card.is_saga() and ti in saga_separator_indices:
                     saga_separator_line_indices.append(len(text_lines))
                     text_lines += [" "]
-                    text_lines_block_indices.append(None)
-                text_lines += [' '.join(line) for line in lines if line]
-                text_lines_block_indices += [ti for line in lines if line]
+                    text_lines_runs.append(rich_text.style_line(" ", []))
+                text_lines += [' '.join(line) for line, _ in lines if line]
+                text_lines_runs += [rich_text.style_line(' '.join(line), nonspace_italic_flags, line_start) for line, line_start in lines if line]
                 if ti != len(text_blocks)-1 and (True if flavor_block_index is None else ti < flavor_block_index):
                     cumulative_text_height += text_height/2
                     text_lines += [""]
-                    text_lines_block_indices.append(None)
+                    text_lines_runs.append(rich_text.style_line("", []))
             text_height = self.get_text_size(font_filename, font_size, "j")[1]
             total_height = len(text_lines)*text_height - (0.5*text_height)*len([t for t in text_lines if t==""])
             if not fill:
@@ -556,19 +622,51 @@ class CardDraw(object):
         if max_height > total_height:
             if self.card.is_saga():
                 y += (max_height - total_height) / 3
-                y -= 3
+                y -= self.scaled(3)
             else:
                 y += (max_height - total_height) / 2
-                y -= 3
+                y -= self.scaled(3)
+        symbol_size = self.get_text_size(font_filename, font_size, "I")[1]
+        return {"font_size": font_size, "flavor_only": font_filename == font_filename_flavor, "x": x, "y": y, "max_width": max_width,
+                "text_height": text_height, "symbol_size": symbol_size, "text_lines": text_lines, "text_lines_runs": text_lines_runs,
+                "flavor_block_line_index": flavor_block_line_index, "saga_separator_line_indices": saga_separator_line_indices,
+                "symbols": list_of_symbols, "num_chapters": num_chapters, "chapter_group_numbers": unique_chapter_group_numbers, "symbol_positions": None}
+
+    # Returns the layout of the rules text (see layout_rules_text) and its key in the persistent layout cache (see layout_cache). The layout is looked up
+    # in the cache by the card's text and text box, so text that was already laid out, on this card or any other, in this build or an earlier one,
+    # never goes through the fitting loop again. Layouts that are not cached yet are laid out but not added to the cache.
+    def get_rules_text_layout(self, font_size='fill', place='left'):
+        cache = layout_cache.get_cache()
+        layout_key = cache.key("rules_text", self.card.rules, self.card.flavor, [self.card.rules1, self.card.rules2, self.card.rules3, self.card.rules4, self.card.rules5, self.card.rules6],
+                               self.card.is_token(), self.card.is_creature(), self.card.is_saga(), self.card.special, self.card.related_indicator, font_size, place, self.scale)
+        layout = cache.get(layout_key)
+        if layout is None:
+            layout = self.layout_rules_text(font_size)
+        return layout, layout_key
+
+    # TODO -- within flavor text, support non-italicized words
+    # Draws the rules text of the card, laid out by get_rules_text_layout.
+    def write_rules_text(self, font_size='fill', color=BLACK, place='left'):
+        cache = layout_cache.get_cache()
+        layout, layout_key = self.get_rules_text_layout(font_size, place)
+        if layout is None:
+            return
+        font_filename, font_filename_flavor = (FONT_PATHS["flavor"] if layout["flavor_only"] else FONT_PATHS["rules"]), FONT_PATHS["flavor"]
+        font_size, x, y, max_width = layout["font_size"], layout["x"], layout["y"], layout["max_width"]
+        text_height, symbol_size, text_lines, text_lines_runs = layout["text_height"], layout["symbol_size"], layout["text_lines"], layout["text_lines_runs"]
+        flavor_block_line_index, saga_separator_line_indices = layout["flavor_block_line_index"], layout["saga_separator_line_indices"]
+        list_of_symbols, unique_chapter_group_numbers = layout["symbols"], layout["chapter_group_numbers"]
+        # Symbol positions are only measured the first time a layout is drawn:
+        find_symbol_positions = layout["symbol_positions"] is None
+        if layout["num_chapters"] is not None:
+            num_chapters_image = load_asset_image(os.path.join(SAGA_SYMBOL_PATH, str(layout["num_chapters"])+".jpg"), scale=self.scale)
+            self.image.paste(num_chapters_image, self.scaled(POSITION_SAGA_NUM_CHAPTERS))
         height = y
         list_of_symbol_positions = []
-        symbol_size = self.get_text_size(font_filename, font_size, "I")[1]
         flavor_line_position = None
         saga_line_positions = []
-        previous_seen_block_index = None
-        current_italics_index_offset = 0
         for index, line in enumerate(text_lines):
-            total_size = self.get_text_size(font_filename, font_size, line)
+            total_size = self.get_text_size(font_filename, font_size, line) if place != 'left' else None
             if line=="":
                 height += text_height/2
             elif line==" ":
@@ -577,51 +675,45 @@ class CardDraw(object):
                 height += text_height
             if index == flavor_block_line_index:
                 font_filename = font_filename_flavor
-                flavor_line_position = (POSITION_FLAVOR_LINE[0], int(height-text_height/4))
+                flavor_line_position = (self.scaled(POSITION_FLAVOR_LINE[0]), int(height-text_height/4))
             elif self.card.is_saga() and index in saga_separator_line_indices:
-                saga_line_positions.append((POSITION_SAGA_LINE[0], int(height)))
-            block_index = text_lines_block_indices[index]
-            # Whenever we reach a new text block, need to reset the italics index offset:
-            if (previous_seen_block_index is None and block_index is not None) or (previous_seen_block_index is not None and block_index is not None and previous_seen_block_index<block_index):
-                previous_seen_block_index = block_index
-                current_italics_index_offset = 0
-            if block_index is None:
-                italics_start_indices, italics_end_indices = [], []
-            else:
-                italics_start_indices, italics_end_indices = italics_start_indices_per_text_block[block_index], italics_end_indices_per_text_block[block_index]
+                saga_line_positions.append((self.scaled(POSITION_SAGA_LINE[0]), int(height)))
+            runs = tuple(rich_text.TextRun(*run) for run in text_lines_runs[index])
             if place == 'left':
-                _, symbol_positions = self.write_text((x, height), line, font_filename=font_filename, font_filename_italics=font_filename_flavor, font_size=font_size, color=color, return_symbol_positions=True, italics_start_indices=italics_start_indices, italics_end_indices=italics_end_indices, italics_index_offset=current_italics_index_offset)
+                x_left = x
             elif place == 'right':
                 x_left = x + max_width - total_size[0]
-                _, symbol_positions = self.write_text((x_left, height), line, font_filename=font_filename, font_filename_italics=font_filename_flavor, font_size=font_size, color=color, return_symbol_positions=True, italics_start_indices=italics_start_indices, italics_end_indices=italics_end_indices, italics_index_offset=current_italics_index_offset)
             elif place == 'center':
                 x_left = int(x + ((max_width - total_size[0]) / 2))
-                _, symbol_positions = self.write_text((x_left, height), line, font_filename=font_filename, font_filename_italics=font_filename_flavor, font_size=font_size, color=color, return_symbol_positions=True, italics_start_indices=italics_start_indices, italics_end_indices=italics_end_indices, italics_index_offset=current_italics_index_offset)
-            list_of_symbol_positions += [(s[0], s[1]+int(0.1*symbol_size)) for s in symbol_positions]
-            current_italics_index_offset += len(line)+1
-        self.paste_in_text_symbols(list_of_symbols, list_of_symbol_positions, symbol_size)
+            written = self.write_text((x_left, height), line, font_filename=font_filename, font_filename_italics=font_filename_flavor, font_size=font_size, color=color, return_symbol_positions=find_symbol_positions, runs=runs)
+            if find_symbol_positions:
+                list_of_symbol_positions += [(s[0], s[1]+int(0.1*symbol_size)) for s in written[1]]
+        if find_symbol_positions:
+            layout["symbol_positions"] = list_of_symbol_positions
+            cache.put(layout_key, layout)
+        self.paste_in_text_symbols(list_of_symbols, [tuple(p) for p in layout["symbol_positions"]], symbol_size)
         # Paste the line between text and flavor text:
         if flavor_line_position is not None:
-            flavor_line_image = Image.open(os.path.join(ASSETS_PATH, "flavor_line.png"))
+            flavor_line_image = load_asset_image(os.path.join(ASSETS_PATH, "flavor_line.png"), scale=self.scale)
             self.image.paste(flavor_line_image, flavor_line_position, flavor_line_image)
         # Paste the lines between Saga chapters:
         if len(saga_line_positions)>0:
-            saga_line_image = Image.open(os.path.join(ASSETS_PATH, "saga_line.png"))
+            saga_line_image = load_asset_image(os.path.join(ASSETS_PATH, "saga_line.png"), scale=self.scale)
             for saga_line_position in saga_line_positions:
                 self.image.paste(saga_line_image, saga_line_position, saga_line_image)
         # Paste Saga chapter symbols:
         if self.card.is_saga():
-            single_saga_symbol_height = 65
-            y_bounds = [POSITION_SAGA_RULES_TEXT[1]-3] + [slp[1] for slp in saga_line_positions] + [POSITION_SAGA_RULES_TEXT[1]+MAX_HEIGHT_SAGA_RULES_TEXT_BOX-20-46*(len(unique_chapter_group_numbers)==1)]
+            single_saga_symbol_height = self.scaled(65)
+            y_bounds = [self.scaled(POSITION_SAGA_RULES_TEXT[1]-3)] + [slp[1] for slp in saga_line_positions] + [self.scaled(POSITION_SAGA_RULES_TEXT[1]+MAX_HEIGHT_SAGA_RULES_TEXT_BOX-20-46*(len(unique_chapter_group_numbers)==1))]
             y_bounds_by_group = []
             for gi, group_numbers in enumerate(unique_chapter_group_numbers):
                 y_bounds_by_group.append((y_bounds[gi],y_bounds[gi+1]))
                 group_center_ypos = (y_bounds_by_group[gi][0]+y_bounds_by_group[gi][1])/2
                 this_group_ypos = int(group_center_ypos - (single_saga_symbol_height * len(group_numbers))/2)
                 for gnum in group_numbers:
-                    saga_chapter_symbol_image = Image.open(os.path.join(SAGA_SYMBOL_PATH, "ch"+str(gnum)+".png"))
-                    self.image.paste(saga_chapter_symbol_image, (POSITION_SAGA_CHAPTER_SYMBOLS[0], this_group_ypos), saga_chapter_symbol_image)
-                    this_group_ypos += single_saga_symbol_height + 4 + 4*(len(unique_chapter_group_numbers)==1)
+                    saga_chapter_symbol_image = load_asset_image(os.path.join(SAGA_SYMBOL_PATH, "ch"+str(gnum)+".png"), scale=self.scale)
+                    self.image.paste(saga_chapter_symbol_image, (self.scaled(POSITION_SAGA_CHAPTER_SYMBOLS[0]), this_group_ypos), saga_chapter_symbol_image)
+                    this_group_ypos += single_saga_symbol_height + self.scaled(4 + 4*(len(unique_chapter_group_numbers)==1))
         return (max_width, height - y)
 
     def write_name(self):
@@ -639,7 +731,7 @@ class CardDraw(object):
             color = BLACK
         font_filename = FONT_PATHS["token"] if self.card.is_token() else FONT_PATHS["name"]
         x_centered = self.card.is_token()
-        self.write_text(position, self.card.name, font_filename=font_filename, font_size='fill', max_height=MAX_HEIGHT_CARD_NAME, max_width=max_width, adjust_for_below_letters=1, x_centered=x_centered, color=color)
+        self.write_text(self.scaled(position), self.card.name, font_filename=font_filename, font_size='fill', max_height=self.scaled(MAX_HEIGHT_CARD_NAME), max_width=self.scaled(max_width), adjust_for_below_letters=1, x_centered=x_centered, color=color)
 
     def write_type_line(self):
         if self.card.special is not None and "back" in self.card.special:
@@ -657,7 +749,7 @@ class CardDraw(object):
             position = POSITION_SAGA_CARD_TYPE
         else:
             position = POSITION_CARD_TYPE
-        self.write_text(position, self.card.get_type_line(), font_filename=FONT_PATHS["name"], font_size='fill', max_height=MAX_HEIGHT_CARD_TYPE, max_width=MAX_WIDTH_CARD_TYPE - max_width_adjustment, adjust_for_below_letters=1, color=color)
+        self.write_text(self.scaled(position), self.card.get_type_line(), font_filename=FONT_PATHS["name"], font_size='fill', max_height=self.scaled(MAX_HEIGHT_CARD_TYPE), max_width=self.scaled(MAX_WIDTH_CARD_TYPE - max_width_adjustment), adjust_for_below_letters=1, color=color)
 
     def write_power_toughness(self):
         if self.card.is_vehicle():
@@ -668,21 +760,19 @@ class CardDraw(object):
             color = BLACK
         maxpt = max(0 if (self.card.power is None or self.card.power in ["*","x","X"]) else int(self.card.power), 0 if (self.card.toughness is None or self.card.toughness in ["*","x","X"]) else int(self.card.toughness))
         minpt = min(0 if (self.card.power is None or self.card.power in ["*","x","X"]) else int(self.card.power), 0 if (self.card.toughness is None or self.card.toughness in ["*","x","X"]) else int(self.card.toughness))
-        max_height = MAX_HEIGHT_POWER_TOUGHNESS-3 if (maxpt >= 10 and minpt < 10) else MAX_HEIGHT_POWER_TOUGHNESS
+        max_height = self.scaled(MAX_HEIGHT_POWER_TOUGHNESS-3 if (maxpt >= 10 and minpt < 10) else MAX_HEIGHT_POWER_TOUGHNESS)
         if self.card.power is not None:
-            self.write_text(POSITION_POWER if (self.card.power in ["*","x","X"] or int(self.card.power)<10) else (POSITION_POWER[0]-15, POSITION_POWER[1]), self.card.power, font_filename=FONT_PATHS["name"], font_size='fill', max_height=max_height, max_width=MAX_HEIGHT_POWER_TOUGHNESS, adjust_for_below_letters=0, color=color)
+            self.write_text(self.scaled(POSITION_POWER if (self.card.power in ["*","x","X"] or int(self.card.power)<10) else (POSITION_POWER[0]-15, POSITION_POWER[1])), self.card.power, font_filename=FONT_PATHS["name"], font_size='fill', max_height=max_height, max_width=self.scaled(MAX_HEIGHT_POWER_TOUGHNESS), adjust_for_below_letters=0, color=color)
         if self.card.toughness is not None:
-            self.write_text(POSITION_TOUGHNESS, self.card.toughness, font_filename=FONT_PATHS["name"], font_size='fill', max_height=max_height, max_width=MAX_HEIGHT_POWER_TOUGHNESS, adjust_for_below_letters=0, color=color)
+            self.write_text(self.scaled(POSITION_TOUGHNESS), self.card.toughness, font_filename=FONT_PATHS["name"], font_size='fill', max_height=max_height, max_width=self.scaled(MAX_HEIGHT_POWER_TOUGHNESS), adjust_for_below_letters=0, color=color)
 
     def paste_in_text_symbols(self, symbols, symbol_positions, symbol_size, shadow=False):
         symbols = [os.path.join(SYMBOL_PATH, symbol.replace('/','')+".png") for symbol in symbols]
         for symbol, symbol_position in zip(symbols, symbol_positions):
             if shadow:
-                shadow_image = Image.open(os.path.join(SYMBOL_PATH, "black.png"))
-                shadow_image = shadow_image.resize((symbol_size, symbol_size))
-                self.image.paste(shadow_image, (symbol_position[0]-1, symbol_position[1]+3), shadow_image)
-            mana_image = Image.open(symbol)
-            mana_image = mana_image.resize((symbol_size, symbol_size))
+                shadow_image = load_asset_image(os.path.join(SYMBOL_PATH, "black.png"), (symbol_size, symbol_size))
+                self.image.paste(shadow_image, (symbol_position[0]-self.scaled(1), symbol_position[1]+self.scaled(3)), shadow_image)
+            mana_image = load_asset_image(symbol, (symbol_size, symbol_size))
             self.image.paste(mana_image, symbol_position, mana_image)
 
     def paste_mana_symbols(self):
@@ -691,15 +781,13 @@ class CardDraw(object):
         mana_symbols = [m.replace('}','').replace('/','') for m in self.card.mana.split('{')]
         mana_symbol_paths = [os.path.join(SYMBOL_PATH, symbol+".png") for symbol in mana_symbols if (len(symbol)!=0 and os.path.isfile(os.path.join(SYMBOL_PATH, symbol+".png")))]
         mana_symbol_paths.reverse()
-        position = POSITION_MANA_SYMBOL
+        position = self.scaled(POSITION_MANA_SYMBOL)
         for mana_symbol in mana_symbol_paths:
-            shadow_image = Image.open(os.path.join(SYMBOL_PATH, "black.png"))
-            shadow_image = shadow_image.resize((MANA_SYMBOL_SIZE, MANA_SYMBOL_SIZE))
-            self.image.paste(shadow_image, (position[0]-1, position[1]+3), shadow_image)
-            mana_image = Image.open(mana_symbol)
-            mana_image = mana_image.resize((MANA_SYMBOL_SIZE, MANA_SYMBOL_SIZE))
+            shadow_image = load_asset_image(os.path.join(SYMBOL_PATH, "black.png"), (MANA_SYMBOL_SIZE, MANA_SYMBOL_SIZE), scale=self.scale)
+            self.image.paste(shadow_image, (position[0]-self.scaled(1), position[1]+self.scaled(3)), shadow_image)
+            mana_image = load_asset_image(mana_symbol, (MANA_SYMBOL_SIZE, MANA_SYMBOL_SIZE), scale=self.scale)
             self.image.paste(mana_image, position, mana_image)
-            position = (position[0]-(3+MANA_SYMBOL_SIZE), position[1])
+            position = (position[0]-self.scaled(3+MANA_SYMBOL_SIZE), position[1])
 
     def paste_set_symbol(self):
         if self.card.rarity is None or len(self.card.rarity)==0:
@@ -714,34 +802,22 @@ class CardDraw(object):
             set_symbol_path = os.path.join(SET_SYMBOL_PATH, "Rare.png")
         else:
             set_symbol_path = os.path.join(SET_SYMBOL_PATH, "Mythic.png")
-        rarity_image = Image.open(set_symbol_path)
-        rarity_image = rarity_image.resize((int((1200/981)*SET_SYMBOL_SIZE), SET_SYMBOL_SIZE))
+        rarity_image = load_asset_image(set_symbol_path, (int((1200/981)*SET_SYMBOL_SIZE), SET_SYMBOL_SIZE), scale=self.scale)
         if self.card.is_token():
             position = POSITION_TOKEN_SET_SYMBOL
         elif self.card.is_saga():
             position = POSITION_SAGA_SET_SYMBOL
         else:  
             position = POSITION_SET_SYMBOL
-        self.image.paste(rarity_image, position, rarity_image)
-
-    def paste_artwork(self, artwork_path=None):
-        if artwork_path is None:
-            artwork_path = os.path.join(".", "Artwork")
-        pattern1 = re.compile(rf"^{re.escape(self.card.name)}\.jpg$")
-        pattern2 = re.compile(rf"^{re.escape(self.card.name)}_\d+\.jpg$")
-        if not (pattern1.match(os.path.basename(artwork_path)) or pattern2.match(os.path.basename(artwork_path))):
-            artwork_path = os.path.join(artwork_path, self.card.name+".jpg")
-        try:
-            artwork_image = Image.open(artwork_path)
-        except:
-            print("  Failed to open artwork image for card " + self.card.name + ".jpeg")
+        self.image.paste(rarity_image, self.scaled(position), rarity_image)
+
+    def paste_artwork(self, artwork_path=None, artwork_image=None):
+        if artwork_image is None:
+            artwork_image = load_artwork_image(self.card, artwork_path, self.scale)
+        if artwork_image is None:
             return
-        if self.card.is_saga():
-            self.image.paste(artwork_image, (373, 118))
-        elif self.card.is_token():
-            self.image.paste(artwork_image, (58, 170))
-        else:
-            self.image.paste(artwork_image, (58, 118))
+        position, _ = get_artwork_window(self.card, self.scale)
+        self.image.paste(artwork_image, position)
         
     def paste_mdfc_indicator(self):
         mdfc_indicator = self.card.related_indicator
@@ -791,8 +867,8 @@ class CardDraw(object):
             indicator_filename += "back.png"
         else:
             indicator_filename += "front.png"
-        indicator_image = Image.open(os.path.join(MDFC_INDICATOR_PATH, indicator_filename))
-        indicator_position_x, indicator_position_y = 27, 929
+        indicator_image = load_asset_image(os.path.join(MDFC_INDICATOR_PATH, indicator_filename), scale=self.scale)
+        indicator_position_x, indicator_position_y = self.scaled((27, 929))
         self.image.paste(indicator_image, (indicator_position_x, indicator_position_y), indicator_image)
         # Paste mana symbols:
         mana_symbol_size_mdfc_indicator = 23
@@ -800,19 +876,17 @@ class CardDraw(object):
             mana_symbols = [m.replace('}','').replace('/','') for m in mana.split('{')]
             mana_symbol_paths = [os.path.join(SYMBOL_PATH, symbol+".png") for symbol in mana_symbols if (len(symbol)!=0 and os.path.isfile(os.path.join(SYMBOL_PATH, symbol+".png")))]
             mana_symbol_paths.reverse()
-            mana_position = (305, 936)
+            mana_position = self.scaled((305, 936))
             for mana_symbol in mana_symbol_paths:
-                shadow_image = Image.open(os.path.join(SYMBOL_PATH, "black.png"))
-                shadow_image = shadow_image.resize((mana_symbol_size_mdfc_indicator, mana_symbol_size_mdfc_indicator))
-                self.image.paste(shadow_image, (mana_position[0]-1, mana_position[1]+3), shadow_image)
-                mana_image = Image.open(mana_symbol)
-                mana_image = mana_image.resize((mana_symbol_size_mdfc_indicator, mana_symbol_size_mdfc_indicator))
+                shadow_image = load_asset_image(os.path.join(SYMBOL_PATH, "black.png"), (mana_symbol_size_mdfc_indicator, mana_symbol_size_mdfc_indicator), scale=self.scale)
+                self.image.paste(shadow_image, (mana_position[0]-self.scaled(1), mana_position[1]+self.scaled(3)), shadow_image)
+                mana_image = load_asset_image(mana_symbol, (mana_symbol_size_mdfc_indicator, mana_symbol_size_mdfc_indicator), scale=self.scale)
                 self.image.paste(mana_image, mana_position, mana_image)
-                mana_position = (mana_position[0]-(3+mana_symbol_size_mdfc_indicator), mana_position[1])
+                mana_position = (mana_position[0]-self.scaled(3+mana_symbol_size_mdfc_indicator), mana_position[1])
         # Paste text:
-        text_position = (64, 944)
-        max_height_mdfc_indicator = 30
-        max_width_mdfc_indicator = 245 - (0 if (mana is None) else mana.count("{")*mana_symbol_size_mdfc_indicator)
+        text_position = self.scaled((64, 944))
+        max_height_mdfc_indicator = self.scaled(30)
+        max_width_mdfc_indicator = self.scaled(245 - (0 if (mana is None) else mana.count("{")*mana_symbol_size_mdfc_indicator))
         color = BLACK if ((self.card.special is not None) and ("back" in self.card.special)) else WHITE
         font_filename = FONT_PATHS["name"]
         self.write_text(text_position, text, font_filename=font_filename, font_size='fill', max_height=max_height_mdfc_indicator, max_width=max_width_mdfc_indicator, adjust_for_below_letters=1, x_centered=False, color=color)
@@ -823,5 +897,5 @@ class CardDraw(object):
         if not black_token_cover:
             return
         black_image_name = ("legendary_" if self.card.is_legendary() else "") + "token_black_frame_cover.png"
-        black_image = Image.open(os.path.join(ASSETS_PATH, black_image_name))
+        black_image = load_asset_image(os.path.join(ASSETS_PATH, black_image_name), scale=self.scale)
         self.image.paste(black_image, (0,0), black_image)
\ No newline at end of file
@@ -6,14 +6,43 @@ from random import randint
 
 import paths
 import game_elements
-import build_card
+import output_encoding
+import build_scheduler
+# Pillow, NumPy and the modules rendering, checking or storing cards are imported by the functions that use them, so that --help and
+# --summary-only start without loading them (see import_budget.py).
+
+DRAFT_SCALE = 0.5
 
 # Creates the card images (including tokens) and the printing images.
 #   skip_complete -- If true, skips over creating the images for any cards with the complete flag set.
-#   automatic_tokens -- If true, re-generates the _Tokens.json before generating images for the tokens. Otherwise, searches for an existing tokens JSON only.
-def create_images_from_Deck(deck, save_path=None, skip_complete=True, automatic_tokens=True):
+#   automatic_tokens -- If true, generates the tokens of the deck in memory (see Deck.get_tokens) before generating images for them. Otherwise, searches for an existing tokens JSON only.
+#   encoder_pool -- EncoderPool used to write the images in the background. If None, one is created for this call and waited on before returning.
+#   prefetch -- Number of cards whose frames and artworks are decoded ahead of the card being laid out (see render_pipeline).
+#   scale -- Resolution scale of the images: 1 for the normal 744x1039 cards, DRAFT_SCALE for quick drafts, 2 for high-DPI print masters.
+#   jobs -- Number of build tasks run at the same time (see add_image_tasks).
+#   profile -- If true, the render time of every card and token is recorded to calibrate the render cost model (see render_cost).
+#   workers -- render_workers.RenderWorkerPool rendering the cards and tokens in worker processes. If None, they are rendered in this process.
+# Returns the Deck of the tokens (None if there are none), so that it can be passed on to update_cockatrice.
+def create_images_from_Deck(deck, save_path=None, skip_complete=True, automatic_tokens=True, encoder_pool=None, prefetch=4, scale=1, jobs=4, profile=False, workers=None):
     if type(deck)!=game_elements.Deck:
         raise TypeError("Input deck must be of type Deck.")
+    if encoder_pool is None:
+        with output_encoding.EncoderPool() as encoder_pool:
+            return create_images_from_Deck(deck, save_path=save_path, skip_complete=skip_complete, automatic_tokens=automatic_tokens, encoder_pool=encoder_pool, prefetch=prefetch, scale=scale, jobs=jobs, profile=profile, workers=workers)
+    scheduler = build_scheduler.BuildScheduler(max_workers=jobs)
+    add_image_tasks(scheduler, deck, save_path=save_path, skip_complete=skip_complete, automatic_tokens=automatic_tokens, encoder_pool=encoder_pool, prefetch=prefetch, scale=scale, profile=profile, workers=workers)
+    scheduler.run()
+    return scheduler.get_result("extract tokens")
+
+# Adds the tasks creating the images of the deck to the input build_scheduler.BuildScheduler (see create_images_from_Deck for the other arguments):
+#   render cards   -- Renders the cards and their printing images. Up to date if every image is already linked to its stored render.
+#   extract tokens -- Returns the Deck of the tokens made by the cards (or read from the tokens JSON). Runs while the cards are rendered.
+#   render tokens  -- Renders the tokens and their printing images, after extract tokens.
+#   finish images  -- Waits for every image to be written and evicts old renders from the render store, after both renders.
+def add_image_tasks(scheduler, deck, save_path=None, skip_complete=True, automatic_tokens=True, encoder_pool=None, prefetch=4, scale=1, profile=False, workers=None):
+    import render_pipeline
+    import render_store
+    import render_cost
     if save_path is None:
         save_path = os.path.join(paths.DECK_PATH, deck.name)
     if not os.path.isdir(save_path):
@@ -25,42 +54,55 @@ def create_images_from_Deck(deck, save_path=None, skip_complete=True, automatic_
     printing_path = os.path.join(paths.DECK_PATH, deck.name, "Printing")
     if not os.path.isdir(printing_path):
         os.mkdir(printing_path)
-    num_to_create = len([c for c in deck.cards if (not c.complete)]) if skip_complete else len(deck.cards)
-    num_created_so_far = 0
-    for card in deck.cards:
-        if card.complete and skip_complete:
-            continue
-        num_created_so_far += 1
-        print("Building image for card", num_created_so_far, "of", num_to_create, ":", card.name)
-        build_card.create_card_image_from_Card(card, save_path=save_path)
-        build_card.create_printing_image_from_Card(card, saved_image_path=save_path, save_path=printing_path)
-    if automatic_tokens:
-        deck.get_tokens()
-    try:
-        setname = (deck.name.lower().replace("the ",""))[0:3].upper()
-        setname = game_elements.Set.adjust_forbidden_custom_setname(setname)
-        tokens_deck = game_elements.Deck.from_json(os.path.join(paths.DECK_PATH, deck.name, deck.name+'_Tokens.json'), setname, deck.name+"_Tokens")
-        tokens_path = os.path.join(paths.DECK_PATH, deck.name, "Tokens")
-        if not os.path.isdir(tokens_path):
-            os.mkdir(tokens_path)
-        num_to_create = len([c for c in tokens_deck.cards if (not c.complete)]) if skip_complete else len(tokens_deck.cards)
-        num_created_so_far = 0
-        for card in tokens_deck.cards:
-            if card.complete and skip_complete:
-                continue
-            num_created_so_far += 1
-            print("Building image for token", num_created_so_far, "of", num_to_create, ":", card.name)
-            build_card.create_card_image_from_Card(card, save_path=tokens_path)
-            build_card.create_printing_image_from_Card(card, saved_image_path=tokens_path, save_path=printing_path)
-    except:
-        pass
+    tokens_path = os.path.join(paths.DECK_PATH, deck.name, "Tokens")
+    store = render_store.get_store()
+    cost_model = render_cost.get_model()
+    cards_to_create = [c for c in deck.cards if not (c.complete and skip_complete)]
+    scheduler.add("render cards", lambda: render_pipeline.render_cards(cards_to_create, save_path, printing_path, encoder_pool=encoder_pool, prefetch=prefetch, label="card", scale=scale, render_store=store, cost_model=cost_model, profile=profile, workers=workers),
+                  is_up_to_date=lambda: render_pipeline.is_rendered(cards_to_create, save_path, printing_path, scale, store))
+    # Returns the tokens deck, or None if tokens aren't generated and the deck has no tokens JSON file
+    def extract_tokens():
+        if automatic_tokens:
+            return deck.get_tokens()
+        try:
+            return game_elements.Deck.from_json(os.path.join(paths.DECK_PATH, deck.name, deck.name+'_Tokens.json'), game_elements.Deck.get_setname_from_deck_folder(deck.name), deck.name+"_Tokens")
+        except FileNotFoundError:
+            return None
+    scheduler.add("extract tokens", extract_tokens)
+    # Returns the tokens to render (None if there is no tokens deck)
+    def get_tokens_to_create():
+        tokens_deck = scheduler.get_result("extract tokens")
+        if tokens_deck is None:
+            return None
+        return [c for c in tokens_deck.cards if not (c.complete and skip_complete)]
+    def render_tokens():
+        tokens_to_create = get_tokens_to_create()
+        if tokens_to_create is None:
+            return
+        try:
+            if not os.path.isdir(tokens_path):
+                os.mkdir(tokens_path)
+            render_pipeline.render_cards(tokens_to_create, tokens_path, printing_path, encoder_pool=encoder_pool, prefetch=prefetch, label="token", scale=scale, render_store=store, cost_model=cost_model, profile=profile, workers=workers)
+        except:
+            pass
+    def tokens_are_rendered():
+        tokens_to_create = get_tokens_to_create()
+        return tokens_to_create is not None and os.path.isdir(tokens_path) and render_pipeline.is_rendered(tokens_to_create, tokens_path, printing_path, scale, store)
+    scheduler.add("render tokens", render_tokens, ["extract tokens"], is_up_to_date=tokens_are_rendered)
+    def finish_images():
+        encoder_pool.wait()
+        store.evict()
+    scheduler.add("finish images", finish_images, ["render cards", "render tokens"])
 
 # Updates the custom.xml file that Cockatrice uses to generate card information
 # xml_filepath -- path to the custom.xml file used within Cockatrice.
 # json_filepath -- path to the custom.json file used only to keep track of each different custom card. Since this is used to build custom.xml, if a card needs to be removed, it should be deleted from custom.json.
 # replace_existing_custom_set -- If true and a file is found in Cockatrice/customsets/ named 01.custom.xml, that file is replaced, removing any existing custom cards. Otherwise, increments the last number found and saves a new file.
 # replace_deck_files -- If true, replaces deck.cod files in Cockatrice/decks
-def update_cockatrice(deck, xml_filepath=None, json_filepath=None, xml_filepath_tokens=None, json_filepath_tokens=None, replace_existing_custom_set=True, replace_deck_files=True):
+# store -- Optional card_store.CardStore holding the deck. If given, the tokens are read from the store (unless tokens_deck is given), and only the cards and tokens whose rows changed
+#          (or whose images were rendered again) since the deck was last exported to Cockatrice are exported. The others are kept from custom.json.
+# tokens_deck -- Optional Deck of the tokens, as returned by create_images_from_Deck. If None, the tokens are read from the store or the _Tokens.json file.
+def update_cockatrice(deck, xml_filepath=None, json_filepath=None, xml_filepath_tokens=None, json_filepath_tokens=None, replace_existing_custom_set=True, replace_deck_files=True, store=None, tokens_deck=None):
     if not os.path.isdir(paths.COCKATRICE_MANUFACTOR_PATH):
         os.mkdir(paths.COCKATRICE_MANUFACTOR_PATH)
     if xml_filepath is None:
@@ -92,12 +134,26 @@ def update_cockatrice(deck, xml_filepath=None, json_filepath=None, xml_filepath_
     setname = game_elements.Set.adjust_forbidden_custom_setname((deck.name.lower().replace("the ",""))[0:3].upper())
     # Get any tokens that must be updated in Cockatrice
     try:
-        tokens_deck = game_elements.Deck.from_json(os.path.join(paths.DECK_PATH, deck.name, deck.name+'_Tokens.json'), setname, deck.name+"_Tokens")
+        if tokens_deck is None and store is not None:
+            tokens_deck = game_elements.Deck.from_store(store, deck.name, tokens=True)
+        elif tokens_deck is None:
+            tokens_deck = game_elements.Deck.from_json(os.path.join(paths.DECK_PATH, deck.name, deck.name+'_Tokens.json'), setname, deck.name+"_Tokens")
         tokens_cards = tokens_deck.cards   
     except Exception as e:
         tokens_cards = []
     if error_archiving_original_tokens:
         tokens_cards = []
+    cards_extension = output_encoding.encoders["Cards"].extension
+    tokens_extension = output_encoding.encoders["Tokens"].extension
+    cockatrice_encoder = output_encoding.encoders["Cockatrice"]
+    cockatrice_extension = ".full.jpeg" if cockatrice_encoder.image_format == "jpeg" else ".full"+cockatrice_encoder.extension
+    changed_names = None if store is None else store.get_changed_names(deck.name, "cockatrice")
+    last_export_time = None if store is None else store.get_export_time(deck.name, "cockatrice")
+    # Returns True if the card (or token) at the input image paths must be exported again.
+    def is_changed(card, image_paths):
+        if changed_names is None or card.name in changed_names:
+            return True
+        return any([os.path.isfile(image_path) and os.path.getmtime(image_path) > last_export_time for image_path in image_paths])
     cdict = {} # Cards
     tdict = {} # Tokens
     all_token_names_this_deck = []
@@ -108,38 +164,42 @@ def update_cockatrice(deck, xml_filepath=None, json_filepath=None, xml_filepath_
             this_card_name = setname+"_"+card.name
             tokens_with_this_name_paths = [] # Saved tokens paths (a list since some tokens can have duplicates, like MyToken_1.jpg)
             tokens_cockatrice_target_paths = [] # Paths in the cockatrice folder to which to copy the tokens
-            base_path_this_token = os.path.join(paths.DECK_PATH, deck.name, "Tokens", card.name+".jpg")
+            base_path_this_token = os.path.join(paths.DECK_PATH, deck.name, "Tokens", card.name+tokens_extension)
             if os.path.exists(base_path_this_token):
                 duplicate_token_names.append(this_card_name.replace('"', '').replace("."," "))
                 tokens_with_this_name_paths.append(base_path_this_token)
-                tokens_cockatrice_target_paths.append(os.path.join(paths.COCKATRICE_IMAGE_PATH, this_card_name.replace('"', '').replace("."," ")+".full.jpeg"))
+                tokens_cockatrice_target_paths.append(os.path.join(paths.COCKATRICE_IMAGE_PATH, this_card_name.replace('"', '').replace("."," ")))
                 found_this_token = True
             this_token_counter = 1
             while True:
-                incremented_token_path = os.path.join(paths.DECK_PATH, deck.name, "Tokens", card.name+"_"+str(this_token_counter)+".jpg")
+                incremented_token_path = os.path.join(paths.DECK_PATH, deck.name, "Tokens", card.name+"_"+str(this_token_counter)+tokens_extension)
                 if os.path.isfile(incremented_token_path):
                     duplicate_token_names.append(this_card_name.replace('"', '').replace("."," ")+"_"+str(this_token_counter))
                     tokens_with_this_name_paths.append(incremented_token_path)
-                    tokens_cockatrice_target_paths.append(os.path.join(paths.COCKATRICE_IMAGE_PATH, this_card_name.replace('"', '').replace("."," ")+"_"+str(this_token_counter)+".full.jpeg"))
+                    tokens_cockatrice_target_paths.append(os.path.join(paths.COCKATRICE_IMAGE_PATH, this_card_name.replace('"', '').replace("."," ")+"_"+str(this_token_counter)))
                     found_this_token = True
                     this_token_counter += 1
                 else:
                     break
             if not found_this_token:
                 print(f"\nWARNING: Could not find any tokens with the name {card.name} in the tokens path:", os.path.join(paths.DECK_PATH, deck.name, "Tokens"), "  This token's artwork was not added to Cockatrice.")
+            if len(duplicate_token_names)>0:
+                all_token_names_this_deck += duplicate_token_names
+            if not is_changed(card, tokens_with_this_name_paths):
+                continue
             for saved_token_path, target_cockatrice_token_path in zip(tokens_with_this_name_paths, tokens_cockatrice_target_paths):
                 try:
-                    shutil.copy(saved_token_path, target_cockatrice_token_path)
+                    cockatrice_encoder.export(saved_token_path, target_cockatrice_token_path, cockatrice_extension)
                 except:
                     print("\nWARNING: Could not copy the image from the path " + saved_token_path + " to the Cockatrice path. This token's artwork was not added to Cockatrice. Check to make sure the image exists.")
-            if len(duplicate_token_names)>0:
-                all_token_names_this_deck += duplicate_token_names
         else:
             this_card_name = card.name
-            current_image_path = os.path.join(paths.DECK_PATH, deck.name, "Cards", card.name+".jpg")
+            current_image_path = os.path.join(paths.DECK_PATH, deck.name, "Cards", card.name+cards_extension)
+            if not is_changed(card, [current_image_path]):
+                continue
             modified_this_card_name = this_card_name.replace('"', '').replace("."," ")
             try:
-                shutil.copy(current_image_path, os.path.join(paths.COCKATRICE_IMAGE_PATH, modified_this_card_name+".full.jpeg"))
+                cockatrice_encoder.export(current_image_path, os.path.join(paths.COCKATRICE_IMAGE_PATH, modified_this_card_name), cockatrice_extension)
             except:
                 print("\nWARNING: Could not copy the image from the path " + current_image_path + " to the Cockatrice path. This card's artwork was not added to Cockatrice. Check to make sure the image exists.")
         name = (this_card_name).replace('"','&quot;').replace("."," ")
@@ -319,30 +379,92 @@ def update_cockatrice(deck, xml_filepath=None, json_filepath=None, xml_filepath_
             cdeck.write('    <zone name="tokens">\n')
             for cdeck_tokenname in sorted(all_token_names_this_deck):
                 cdeck.write('        <card number="1" name="'+cdeck_tokenname+'"/>\n')
-            for cdeck_common_tokenname in sorted(tokens_deck.common_tokens):
+            for cdeck_common_tokenname in (sorted(tokens_deck.common_tokens) if tokens_deck is not None else []):
                 cdeck.write('        <card number="1" name="'+cdeck_common_tokenname+' Token"/>\n')
             cdeck.write('    </zone>\n')
             cdeck.write('</cockatrice_deck>\n')
         cdeck.close()
+    if store is not None:
+        store.mark_exported(deck.name, "cockatrice")
+
+# Returns the deck in the input folder. If a card_store.CardStore is given, the deck JSON file is imported into it first and the deck is read from it.
+def load_deck(deck_folder, store=None):
+    if store is None:
+        return game_elements.Deck.from_deck_folder(deck_folder)
+    deck_json_filepath = game_elements.Deck.get_deck_json_filepath(deck_folder)
+    deck_name = os.path.basename(deck_json_filepath).replace(".json","")
+    if os.path.isfile(deck_json_filepath):
+        store.import_json(deck_json_filepath, deck_name=deck_name, setname=game_elements.Deck.get_setname_from_deck_folder(deck_folder))
+    return game_elements.Deck.from_store(store, deck_name)
 
 def main():
     parser = argparse.ArgumentParser(description='MTG Custom Card Builder')
     parser.add_argument('-d', '--deck', help='Name of Commander / Deck', type=str, default='Test', dest='deck')
     parser.add_argument('-t', '--automatic-tokens', help='1 if _Tokens.json should be generated automatically', type=int, default=True, dest='automatic_tokens')
+    parser.add_argument('-e', '--encoding', help='Output encoding as TARGET=FORMAT[:OPTIONS], where TARGET is one of '+', '.join(output_encoding.ENCODING_TARGETS)+' and FORMAT is jpeg, png or webp (e.g., Printing=jpeg:quality=95,subsampling=0 or Cockatrice=webp:quality=80). Omit TARGET= to set every target. Can be repeated.', type=str, action='append', default=[], dest='encoding')
+    parser.add_argument('--encoder-threads', help='Number of background threads used to encode and write images', type=int, default=2, dest='encoder_threads')
+    parser.add_argument('-j', '--jobs', help='Number of build tasks (rendering the cards, extracting and rendering the tokens, updating Cockatrice) run at the same time', type=int, default=4, dest='jobs')
+    parser.add_argument('-w', '--render-workers', help='Number of worker processes rendering cards in parallel (0 renders them in the main process). Defaults to the number of CPUs (0 on a single CPU).', type=int, default=None, dest='render_workers')
+    parser.add_argument('--prefetch', help='Number of cards whose frames and artworks are decoded ahead of the card being laid out', type=int, default=4, dest='prefetch')
+    parser.add_argument('--draft', help='Render quick low-resolution drafts (equivalent to --scale '+str(DRAFT_SCALE)+')', action='store_true', dest='draft')
+    parser.add_argument('--scale', help='Resolution scale of the rendered images (e.g., 2 for a high-DPI print master). Cockatrice is only updated at scale 1.', type=float, default=None, dest='scale')
+    parser.add_argument('--profile', help='Record the render time of every card and token, and calibrate the render cost model used to render the slowest cards first (see render_cost.py)', action='store_true', dest='profile')
+    parser.add_argument('--check', help='Only check the layout of every card and token of the deck (frames, symbols and text fitting) without rendering anything (see layout_check.py)', action='store_true', dest='check')
+    parser.add_argument('--summary-only', help='Only print the statistics of the deck, without rendering anything or loading the rendering modules', action='store_true', dest='summary_only')
+    parser.add_argument('--store', help='Path of a SQLite card store (see card_store.py). The deck JSON files are imported into the store, the deck is read from the store, and Cockatrice is only updated with the cards that changed.', type=str, default=None, dest='store')
     args = parser.parse_args()
+    if args.scale is not None and args.scale <= 0:
+        raise ValueError("Scale must be positive.")
+    scale = args.scale if args.scale is not None else (DRAFT_SCALE if args.draft else 1)
+    output_encoding.configure_encoders(args.encoding)
     deck_folder = os.path.join(paths.DECK_PATH, ' '.join(word[0].upper() + word[1:] for word in args.deck.split()))
+    if args.check:
+        import layout_check
+        num_cards, num_tokens, problems = layout_check.check_deck(deck_folder)
+        layout_check.print_problems(os.path.basename(deck_folder), num_cards, num_tokens, problems)
+        return
+    import deck_statistics
+    store = None
+    if args.store is not None:
+        import card_store
+        store = card_store.CardStore(args.store)
+    if args.summary_only:
+        deck_statistics.print_statistics(deck_statistics.get_statistics([load_deck(deck_folder, store)])[0])
+        if store is not None:
+            store.close()
+        return
+    import render_workers
     print("BUILDING DECK: ", deck_folder, "\n")
     for directory in ["Cards", "Artwork", "Printing"]:
         if not os.path.isdir(os.path.join(deck_folder, directory)):
             os.mkdir(os.path.join(deck_folder, directory))
-    deck = game_elements.Deck.from_deck_folder(deck_folder)
-    deck.print_color_summary()
-    deck.print_mana_summary()
-    deck.print_type_summary()
-    deck.print_tag_summary()
-    create_images_from_Deck(deck, automatic_tokens=args.automatic_tokens)
-    if deck.name != "Test":
-        update_cockatrice(deck)
+    deck = load_deck(deck_folder, store)
+    deck_statistics.print_statistics(deck_statistics.get_statistics([deck])[0])
+    # Cockatrice is updated after the images are written, since the tokens are exported under the names of their images (one per artwork)
+    # The render workers are forked before any build thread is started
+    workers = render_workers.RenderWorkerPool.start(args.render_workers if args.render_workers is not None else render_workers.get_default_workers(), scale=scale, frames=[card.frame for card in deck.cards])
+    scheduler = build_scheduler.BuildScheduler(max_workers=args.jobs)
+    with output_encoding.EncoderPool(max_workers=args.encoder_threads) as encoder_pool:
+        add_image_tasks(scheduler, deck, automatic_tokens=args.automatic_tokens, encoder_pool=encoder_pool, prefetch=args.prefetch, scale=scale, profile=args.profile, workers=workers)
+        cockatrice_dependencies = ["finish images"]
+        if store is not None:
+            def import_tokens():
+                if os.path.isfile(os.path.join(deck_folder, deck.name+'_Tokens.json')):
+                    store.import_tokens_json(deck.name, os.path.join(deck_folder, deck.name+'_Tokens.json'))
+            scheduler.add("store tokens", import_tokens, ["extract tokens"])
+            cockatrice_dependencies.append("store tokens")
+        if scale == 1 and deck.name != "Test":
+            scheduler.add("update cockatrice", lambda: update_cockatrice(deck, store=store, tokens_deck=scheduler.get_result("extract tokens")), cockatrice_dependencies)
+        try:
+            scheduler.run()
+        finally:
+            if workers is not None:
+                workers.shutdown()
+    scheduler.print_report()
+    if scale != 1:
+        print("\nRendered at scale", scale, "-- Cockatrice was not updated.")
+    if store is not None:
+        store.close()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,125 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Runs the steps of a build as a graph of tasks. Each task names the tasks it depends on, and starts as soon as all of them have finished,
+# so tasks that don't depend on each other (e.g., rendering the cards and extracting the tokens) run at the same time on a small thread pool.
+# A task can be given an up-to-date check, run when its dependencies have finished: if it returns True, the task is skipped and counts as
+# finished. If a task fails, the tasks that depend on it are skipped, and its error is raised once the other tasks have finished.
+# The time of every task is recorded, and the report lists the critical path: the chain of dependent tasks that took the longest, which
+# bounds how long the build can take however many tasks run at the same time.
+
+FINISHED_STATUSES = ["done", "up to date"]
+
+class BuildTask:
+    def __init__(self, name, function, dependencies=[], is_up_to_date=None):
+        self.name = name
+        self.function = function
+        self.dependencies = list(dependencies)
+        self.is_up_to_date = is_up_to_date
+        self.status = "pending" # Then one of "done", "up to date", "failed" or "skipped"
+        self.result = None
+        self.error = None
+        self.start_time = None
+        self.end_time = None
+
+    def run(self):
+        self.start_time = time.perf_counter()
+        try:
+            if self.is_up_to_date is not None and self.is_up_to_date():
+                self.status = "up to date"
+            else:
+                self.result = self.function()
+                self.status = "done"
+        finally:
+            self.end_time = time.perf_counter()
+
+    # Returns the number of seconds the task took (0 if it didn't run).
+    def get_duration(self):
+        if self.start_time is None or self.end_time is None:
+            return 0
+        return self.end_time - self.start_time
+
+class BuildScheduler:
+    #   max_workers -- Number of tasks run at the same time. With 1, the tasks run one after another in the order they were added.
+    def __init__(self, max_workers=4):
+        if max_workers < 1:
+            raise ValueError("A build scheduler needs at least one worker.")
+        self.max_workers = max_workers
+        self.tasks = {}
+        self.wall_time = None
+
+    # Adds a task calling function (with no arguments) once every task named in dependencies has finished. Dependencies must be added
+    # first, so the tasks always form a graph without cycles. Returns the BuildTask.
+    #   is_up_to_date -- Optional function returning True if the task has nothing to do.
+    def add(self, name, function, dependencies=[], is_up_to_date=None):
+        if name in self.tasks:
+            raise ValueError(f"The build already has a task named {name}.")
+        for dependency in dependencies:
+            if dependency not in self.tasks:
+                raise ValueError(f"The task {name} depends on {dependency}, which has not been added to the build.")
+        task = BuildTask(name, function, dependencies, is_up_to_date)
+        self.tasks[name] = task
+        return task
+
+    # Returns the value returned by the function of the named task (None if it was up to date or didn't run).
+    def get_result(self, name):
+        return self.tasks[name].result
+
+    # Runs every task. Raises the error of the first failed task (in the order they were added), if any.
+    def run(self):
+        start_time = time.perf_counter()
+        pending = [task for task in self.tasks.values() if task.status == "pending"]
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="build") as executor:
+            while len(pending) > 0 or len(running) > 0:
+                # Tasks are kept in the order they were added, so dependencies are always looked at before the tasks depending on them
+                for task in list(pending):
+                    dependency_statuses = [self.tasks[dependency].status for dependency in task.dependencies]
+                    if any([status in ["failed", "skipped"] for status in dependency_statuses]):
+                        task.status = "skipped"
+                        pending.remove(task)
+                    elif all([status in FINISHED_STATUSES for status in dependency_statuses]):
+                        running[executor.submit(task.run)] = task
+                        pending.remove(task)
+                if len(running) == 0:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    task = running.pop(future)
+                    try:
+                        future.result()
+                    except Exception as e:
+                        task.status = "failed"
+                        task.error = e
+        self.wall_time = time.perf_counter() - start_time
+        for task in self.tasks.values():
+            if task.status == "skipped":
+                print(f"WARNING: Skipped the build task {task.name}, since a task it depends on failed.")
+        for task in self.tasks.values():
+            if task.status == "failed":
+                raise task.error
+
+    # Returns the list of tasks on the critical path: the chain of dependent tasks with the largest total duration.
+    def get_critical_path(self):
+        path_durations = {}
+        previous_tasks = {}
+        for task in self.tasks.values():
+            previous_task = max(task.dependencies, key=lambda dependency: path_durations[dependency], default=None)
+            previous_tasks[task.name] = previous_task
+            path_durations[task.name] = task.get_duration() + (path_durations[previous_task] if previous_task is not None else 0)
+        if len(path_durations) == 0:
+            return []
+        critical_path = []
+        name = max(path_durations, key=lambda name: path_durations[name])
+        while name is not None:
+            critical_path.insert(0, self.tasks[name])
+            name = previous_tasks[name]
+        return critical_path
+
+    def print_report(self):
+        up_to_date_names = [task.name for task in self.tasks.values() if task.status == "up to date"]
+        if len(up_to_date_names) > 0:
+            print("\nUp to date:", ", ".join(up_to_date_names))
+        critical_path = self.get_critical_path()
+        critical_path_duration = sum([task.get_duration() for task in critical_path])
+        print(f"\nBuild tasks finished in {self.wall_time:.2f}s. Critical path ({critical_path_duration:.2f}s): " + " -> ".join([f"{task.name} ({task.get_duration():.2f}s)" for task in critical_path]))
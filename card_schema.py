@@ -0,0 +1,109 @@
+# Schema of the cards in a deck JSON file. Every field a card can have is listed once in CARD_SCHEMA with the types it accepts, the
+# conversion applied to accepted values and its default, so a whole deck is validated and defaulted in a single pass over its cards.
+# Every problem found is collected with the card and field it belongs to, instead of stopping at the first one, and the resulting
+# records are complete and clean, so they can be turned into Cards without checking them again (see game_elements.Card.from_record).
+
+RARITIES = ["common", "uncommon", "rare", "mythic"]
+COLORS = ['w','u','b','r','g']
+
+def convert_rarity(rarity):
+    if type(rarity)==int:
+        return RARITIES[max(min(rarity, 3), 0)]
+    return rarity
+
+def convert_colors(colors):
+    if not all([c in COLORS for c in colors]):
+        raise ValueError("each element of colors must be in 'wubrg'")
+    return colors
+
+def convert_tags(tags):
+    return [tags] if type(tags)==str else tags
+
+def convert_flag(flag):
+    return int(flag)
+
+def convert_number(number):
+    return str(number) if type(number)==int else number
+
+# field: (accepted types, conversion of accepted values or None, default). None is accepted for every field.
+CARD_SCHEMA = {"name":              ((str,), None, None),
+               "artist":            ((str,), None, None),
+               "artwork":           ((str,), None, None),
+               "setname":           ((str,), None, None), # Defaults to the set name of the deck
+               "mana":              ((str,), None, None),
+               "cardtype":          ((str,), None, None),
+               "subtype":           ((str,), None, None),
+               "power":             ((str, int), convert_number, None),
+               "toughness":         ((str, int), convert_number, None),
+               "rarity":            ((str, int), convert_rarity, None),
+               "rules":             ((str,), None, None),
+               "rules1":            ((str,), None, None),
+               "rules2":            ((str,), None, None),
+               "rules3":            ((str,), None, None),
+               "rules4":            ((str,), None, None),
+               "rules5":            ((str,), None, None),
+               "rules6":            ((str,), None, None),
+               "flavor":            ((str,), None, None),
+               "special":           ((str,), None, None),
+               "related":           ((str, list), None, None),
+               "related_indicator": ((str,), None, None),
+               "colors":            ((list,), convert_colors, None),
+               "tags":              ((str, list), convert_tags, None),
+               "complete":          ((int, bool, str), convert_flag, 0),
+               "real":              ((int, bool, str), convert_flag, 0),
+               "frame":             ((str,), None, None)}
+TYPE_NAMES = {str: "str", int: "int", bool: "bool", list: "list"}
+
+# Returns the record of the input card dictionary, with every field of CARD_SCHEMA converted or defaulted, and a list of (card name, field, problem).
+# Fields that aren't in the schema are left out of the record.
+def validate_card(keyname, card, setname="UNK"):
+    if type(card)!=dict:
+        return None, [(keyname, None, "card must be a dictionary")]
+    card_name = card.get("name") if type(card.get("name"))==str else keyname
+    record = {}
+    errors = []
+    for field, (types, convert, default) in CARD_SCHEMA.items():
+        value = card.get(field)
+        if value is None:
+            record[field] = default
+        elif type(value) not in types:
+            errors.append((card_name, field, f"{field} must be of type " + " or ".join([TYPE_NAMES[t] for t in types]) + f", not {type(value).__name__}"))
+        elif convert is None:
+            record[field] = value
+        else:
+            try:
+                record[field] = convert(value)
+            except Exception as e:
+                errors.append((card_name, field, f"could not convert {field} ({value!r}): {e}"))
+    if "name" not in card:
+        errors.append((card_name, "name", "name is missing"))
+    if "setname" not in card:
+        record["setname"] = setname
+    return record, errors
+
+# Validates every card of the input deck dictionary (as in a deck JSON file). Returns:
+#   records       -- list of (key, record) of the valid cards, in the order of the dictionary
+#   basics_dict   -- the _basics entry of the dictionary ({} if there is none)
+#   common_tokens -- the _common_tokens entry of the dictionary ([] if there is none)
+#   errors        -- list of (card name, field, problem) of every problem found. field is None for problems with the card as a whole.
+def validate_deck_dict(card_dict, setname="UNK"):
+    records = []
+    basics_dict = {}
+    common_tokens = []
+    errors = []
+    for keyname, card in card_dict.items():
+        if keyname.lower() == "_basics":
+            basics_dict = card
+        elif keyname.lower() == "_common_tokens":
+            common_tokens = card
+        else:
+            record, card_errors = validate_card(keyname, card, setname)
+            if len(card_errors) > 0:
+                errors += card_errors
+            else:
+                records.append((keyname, record))
+    return records, basics_dict, common_tokens, errors
+
+# Returns a message listing every problem in the input list of (card name, field, problem).
+def format_errors(errors, deck_name="Unknown"):
+    return f"The deck {deck_name} has {len(errors)} invalid card field" + ("" if len(errors)==1 else "s") + ":\n" + "\n".join([f"  {card_name}: {problem}" for card_name, _, problem in errors])
@@ -0,0 +1,356 @@
+import os
+import re
+import sys
+import json
+import time
+import bisect
+import argparse
+
+import paths
+from game_elements import Deck, Mana
+
+# Search over the cards of every deck in DECK_PATH, using inverted indexes (term -> set of card ids) for each searchable field.
+# The indexed cards are stored in SEARCH_INDEX_PATH together with the size and modification time of each deck file, so the index is
+# updated incrementally: only deck files that were added, changed or removed since the last search are read again.
+#
+# Queries combine terms with AND (implicit, or "and"), OR ("or"), NOT ("not" or a leading "-") and parentheses. Terms are:
+#   field:value      -- Cards whose field contains value (case-insensitive). A trailing * matches any value starting with the prefix.
+#   field:"a phrase" -- For text and name, cards containing the exact phrase.
+#   field<op>number  -- For numeric fields, with op one of = < <= > >= (e.g., toughness>=5). field:number is the same as field=number.
+#   value            -- Cards whose name or rules text contains value.
+# Examples: text:treasure, "type:creature color:g type:legendary toughness>=5", tag:ramp-*, "(color:u or color:r) -type:land mv<=2"
+
+SEARCH_INDEX_VERSION = 1
+TERM_FIELDS = ["name", "text", "type", "supertype", "subtype", "tag", "color", "rarity", "special", "deck"]
+NUMERIC_FIELDS = ["mv", "power", "toughness", "colors"]
+FIELD_ALIASES = {"t":"type", "c":"color", "o":"text", "rules":"text", "manavalue":"mv", "cmc":"mv", "pow":"power", "tou":"toughness", "tags":"tag", "subtypes":"subtype"}
+
+WORD_PATTERN = re.compile(r"\{[^}]*\}|[a-z0-9]+")
+QUERY_TOKEN_PATTERN = re.compile(r'\s*(\(|\)|-(?=\S)|[^\s()"]*"[^"]*"|[^\s()]+)')
+QUERY_TERM_PATTERN = re.compile(r'^([a-z]+)(>=|<=|>|<|=|:)(.+)$')
+
+# Returns the lowercased words of the input text. Mana and tap symbols (e.g., {t}, {2/w}) are kept as single words.
+def get_words(text):
+    return WORD_PATTERN.findall(text.lower())
+
+# Returns the rules text of the input card (every rules field, one per line), with the italics tags removed.
+def get_rules_text(card):
+    rules = [r for r in [card.rules, card.rules1, card.rules2, card.rules3, card.rules4, card.rules5, card.rules6] if r is not None]
+    return "\n".join(rules).replace("<i>", "").replace("</i>", "")
+
+def to_number(value):
+    try:
+        return int(value)
+    except:
+        return None
+
+# Returns (record, terms) of a card. The record holds what is displayed for the card, its text for phrase searches and its numeric fields;
+# terms holds the indexed terms of each term field.
+def get_card_record(card, deck_name):
+    rules_text = get_rules_text(card)
+    terms = {
+        "name":      get_words(card.name or ""),
+        "text":      get_words(rules_text),
+        "type":      get_words(card.get_type_line().split(" — ")[0]),
+        "supertype": get_words(card.supertype or ""),
+        "subtype":   get_words(card.subtype or ""),
+        "tag":       [tag.lower() for tag in (card.tags or [])] + [tag.lower().partition("-")[0] for tag in (card.tags or []) if "-" in tag],
+        "color":     Mana.mask_colors[card.color_mask] if card.color_mask != 0 else ["c"],
+        "rarity":    [card.rarity.lower()] if card.rarity is not None else [],
+        "special":   [card.special.lower()] if card.special is not None else [],
+        "deck":      [deck_name.lower()]}
+    numbers = {
+        "mv":        card.get_mana_value(),
+        "power":     to_number(card.power),
+        "toughness": to_number(card.toughness),
+        "colors":    Mana.color_counts[card.color_mask]}
+    record = {"deck": deck_name, "name": card.name, "mana": card.mana, "type_line": card.get_type_line(),
+              "text": " ".join(((card.name or "")+"\n"+rules_text).lower().split()),
+              "numbers": {field:value for field, value in numbers.items() if value is not None}}
+    return record, {field:set(words) for field, words in terms.items()}
+
+# Returns the records of the cards of the input deck, and the postings of the deck (field -> term -> indices of the cards in the deck).
+def index_deck(deck):
+    records, postings = [], {field:{} for field in TERM_FIELDS}
+    for card_index, card in enumerate(deck.cards):
+        record, terms = get_card_record(card, deck.name)
+        records.append(record)
+        for field, field_terms in terms.items():
+            for term in field_terms:
+                postings[field].setdefault(term, []).append(card_index)
+    return records, postings
+
+class CardIndex:
+    def __init__(self, deck_path=paths.DECK_PATH, index_path=paths.SEARCH_INDEX_PATH):
+        self.deck_path = deck_path
+        self.index_path = index_path
+        self.decks = {} # deck name -> {"stamp": [mtime_ns, size] of the deck file, "cards": [card records], "postings": postings of the deck (see index_deck)}
+        self.records = {} # card id -> card record
+        self.deck_card_ids = {} # deck name -> [card ids]
+        self.postings = {field:{} for field in TERM_FIELDS} # field -> term -> set of card ids
+        self.numeric_postings = {field:{} for field in NUMERIC_FIELDS} # field -> number -> set of card ids
+        self.sorted_keys = {} # field -> sorted terms or numbers of the field, built on first use after a change
+        self.next_card_id = 0
+        self.changed = False
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.index_path) as f:
+                stored = json.load(f)
+            if stored["version"] != SEARCH_INDEX_VERSION:
+                return
+            for deck_name, deck in stored["decks"].items():
+                self.add_deck(deck_name, deck["stamp"], deck["cards"], deck["postings"])
+        except:
+            pass
+        self.changed = False
+
+    def save(self):
+        if not self.changed:
+            return
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        temporary_path = self.index_path + ".tmp"
+        with open(temporary_path, "w") as f:
+            json.dump({"version": SEARCH_INDEX_VERSION, "decks": self.decks}, f, separators=(",", ":"))
+        os.replace(temporary_path, self.index_path)
+        self.changed = False
+
+    # Adds the cards of a deck to the index. The cards of a deck get consecutive ids, so the deck's postings are merged with an offset.
+    def add_deck(self, deck_name, stamp, records, postings):
+        self.decks[deck_name] = {"stamp": stamp, "cards": records, "postings": postings}
+        first_card_id = self.next_card_id
+        self.next_card_id += len(records)
+        self.deck_card_ids[deck_name] = range(first_card_id, self.next_card_id)
+        for card_id, record in zip(self.deck_card_ids[deck_name], records):
+            self.records[card_id] = record
+            for field, number in record["numbers"].items():
+                self.numeric_postings[field].setdefault(number, set()).add(card_id)
+        for field, field_postings in postings.items():
+            index_postings = self.postings[field]
+            for term, card_indices in field_postings.items():
+                card_ids = {first_card_id+card_index for card_index in card_indices}
+                if term in index_postings:
+                    index_postings[term] |= card_ids
+                else:
+                    index_postings[term] = card_ids
+        self.sorted_keys = {}
+        self.changed = True
+
+    def remove_deck(self, deck_name):
+        if deck_name not in self.decks:
+            return
+        card_ids = self.deck_card_ids.pop(deck_name)
+        card_id_set = set(card_ids)
+        for field, field_postings in self.decks[deck_name]["postings"].items():
+            for term in field_postings.keys():
+                self.postings[field][term] -= card_id_set
+                if len(self.postings[field][term]) == 0:
+                    del self.postings[field][term]
+        for card_id in card_ids:
+            record = self.records.pop(card_id)
+            for field, number in record["numbers"].items():
+                self.numeric_postings[field][number].discard(card_id)
+                if len(self.numeric_postings[field][number]) == 0:
+                    del self.numeric_postings[field][number]
+        del self.decks[deck_name]
+        self.sorted_keys = {}
+        self.changed = True
+
+    # Re-reads every deck file that was added or changed since it was indexed, and drops the decks whose file was removed.
+    # Returns (names of the decks read again, names of the decks dropped).
+    def refresh(self):
+        updated, removed = [], []
+        deck_names = Deck.find_deck_names(self.deck_path) if os.path.isdir(self.deck_path) else []
+        for deck_name in deck_names:
+            deck_json_filepath = Deck.get_deck_json_filepath(os.path.join(self.deck_path, deck_name))
+            stat = os.stat(deck_json_filepath)
+            stamp = [stat.st_mtime_ns, stat.st_size]
+            if deck_name in self.decks and self.decks[deck_name]["stamp"] == stamp:
+                continue
+            try:
+                deck = Deck.from_json(deck_json_filepath, deck_name=deck_name)
+            except Exception as e:
+                print("WARNING: Could not read the deck " + deck_json_filepath + " (" + str(e) + "). Its cards are not searchable.", file=sys.stderr)
+                continue
+            self.remove_deck(deck_name)
+            self.add_deck(deck_name, stamp, *index_deck(deck))
+            updated.append(deck_name)
+        for deck_name in list(self.decks.keys()):
+            if deck_name not in deck_names:
+                self.remove_deck(deck_name)
+                removed.append(deck_name)
+        return updated, removed
+
+    def get_sorted_keys(self, field):
+        if field not in self.sorted_keys:
+            self.sorted_keys[field] = sorted((self.postings[field] if field in self.postings else self.numeric_postings[field]).keys())
+        return self.sorted_keys[field]
+
+    # Returns the set of ids of the cards whose field contains the input term, or a term starting with the input prefix if it ends with *.
+    def lookup_term(self, field, term):
+        postings = self.postings[field]
+        if not term.endswith("*"):
+            return set(postings.get(term, ()))
+        prefix = term[:-1]
+        keys = self.get_sorted_keys(field)
+        card_ids = set()
+        for i in range(bisect.bisect_left(keys, prefix), len(keys)):
+            if not keys[i].startswith(prefix):
+                break
+            card_ids |= postings[keys[i]]
+        return card_ids
+
+    # Returns the set of ids of the cards whose numeric field satisfies "<field> <operator> <number>".
+    def lookup_range(self, field, operator, number):
+        postings = self.numeric_postings[field]
+        if operator in ["=", ":"]:
+            return set(postings.get(number, ()))
+        keys = self.get_sorted_keys(field)
+        if operator == "<":
+            selected = keys[:bisect.bisect_left(keys, number)]
+        elif operator == "<=":
+            selected = keys[:bisect.bisect_right(keys, number)]
+        elif operator == ">":
+            selected = keys[bisect.bisect_right(keys, number):]
+        else:
+            selected = keys[bisect.bisect_left(keys, number):]
+        card_ids = set()
+        for key in selected:
+            card_ids |= postings[key]
+        return card_ids
+
+    # Returns the set of ids of the cards containing every word of the input phrase, in order, in their name and rules text.
+    def lookup_phrase(self, field, phrase):
+        words = get_words(phrase)
+        if len(words) == 0:
+            return set(self.records.keys())
+        card_ids = None
+        for word in words:
+            word_ids = self.lookup_term(field, word)
+            card_ids = word_ids if card_ids is None else card_ids & word_ids
+        phrase = " ".join(phrase.lower().split())
+        return {card_id for card_id in card_ids if phrase in self.records[card_id]["text"]}
+
+    def evaluate_term(self, token):
+        match = QUERY_TERM_PATTERN.match(token.lower())
+        if match is None:
+            field, operator, value = None, ":", token.lower()
+        else:
+            field, operator, value = match.groups()
+            field = FIELD_ALIASES.get(field, field)
+        if field in NUMERIC_FIELDS:
+            number = to_number(value)
+            if number is None:
+                raise ValueError("The value of " + field + " must be an integer (got " + value + ").")
+            return self.lookup_range(field, operator, number)
+        if field is not None and field not in TERM_FIELDS:
+            raise ValueError("Unknown search field: " + field + ". Fields are " + ", ".join(TERM_FIELDS + NUMERIC_FIELDS) + ".")
+        if operator != ":":
+            raise ValueError("Only numeric fields (" + ", ".join(NUMERIC_FIELDS) + ") can be compared with " + operator + ".")
+        if value.startswith('"') and value.endswith('"') and len(value) >= 2:
+            if field is None:
+                return self.lookup_phrase("text", value[1:-1]) | self.lookup_phrase("name", value[1:-1])
+            if field not in ["text", "name"]:
+                value = value[1:-1]
+            else:
+                return self.lookup_phrase(field, value[1:-1])
+        if field is None:
+            return self.lookup_term("text", value) | self.lookup_term("name", value)
+        if field in ["text", "name", "type", "supertype", "subtype"] and not value.endswith("*"):
+            words = get_words(value)
+            card_ids = self.lookup_term(field, words[0]) if len(words) > 0 else set()
+            for word in words[1:]:
+                card_ids &= self.lookup_term(field, word)
+            return card_ids
+        return self.lookup_term(field, value)
+
+    # Returns the records of the cards matching the input query, in deck and card order.
+    def search(self, query):
+        tokens = [token for token in QUERY_TOKEN_PATTERN.findall(query) if len(token) > 0]
+        position = 0
+        # Recursive-descent parser: or_expression := and_expression ("or" and_expression)*, and_expression := unary (["and"] unary)*,
+        # unary := ("not" | "-") unary | "(" or_expression ")" | term
+        def parse_or():
+            nonlocal position
+            card_ids = parse_and()
+            while position < len(tokens) and tokens[position].lower() == "or":
+                position += 1
+                card_ids = card_ids | parse_and()
+            return card_ids
+        def parse_and():
+            nonlocal position
+            card_ids = parse_unary()
+            while position < len(tokens) and tokens[position] != ")" and tokens[position].lower() != "or":
+                if tokens[position].lower() == "and":
+                    position += 1
+                card_ids = card_ids & parse_unary()
+            return card_ids
+        def parse_unary():
+            nonlocal position
+            if position >= len(tokens):
+                raise ValueError("Incomplete query: " + query)
+            token = tokens[position]
+            position += 1
+            if token.lower() == "not" or token == "-":
+                return set(self.records.keys()) - parse_unary()
+            if token == "(":
+                card_ids = parse_or()
+                if position >= len(tokens) or tokens[position] != ")":
+                    raise ValueError("Missing closing parenthesis in query: " + query)
+                position += 1
+                return card_ids
+            if token == ")":
+                raise ValueError("Unexpected closing parenthesis in query: " + query)
+            return self.evaluate_term(token)
+        if len(tokens) == 0:
+            card_ids = set(self.records.keys())
+        else:
+            card_ids = parse_or()
+            if position < len(tokens):
+                raise ValueError("Unexpected closing parenthesis in query: " + query)
+        return [self.records[card_id] for card_id in sorted(card_ids)]
+
+def print_results(records, elapsed_seconds=None):
+    for record in records:
+        print(record["deck"] + "\t" + (record["name"] or "") + "\t" + (record["mana"] or "") + "\t" + record["type_line"])
+    print(len(records), "card" + ("" if len(records)==1 else "s") + ("" if elapsed_seconds is None else " ("+str(round(elapsed_seconds*1000, 2))+" ms)"))
+
+def main():
+    parser = argparse.ArgumentParser(description='MTG Custom Card Search')
+    parser.add_argument('query', help='Search query (e.g., "type:creature color:g type:legendary toughness>=5"). If omitted, queries are read from standard input, one per line.', type=str, nargs='?', default=None)
+    parser.add_argument('-j', '--json', help='Print the matching cards as JSON', action='store_true', dest='json')
+    args = parser.parse_args()
+    index = CardIndex()
+    updated, removed = index.refresh()
+    if len(updated) > 0 or len(removed) > 0:
+        print("Indexed", len(updated), "changed deck" + ("" if len(updated)==1 else "s") + ", dropped", len(removed), "removed deck" + ("" if len(removed)==1 else "s") + ".", file=sys.stderr)
+        index.save()
+    queries = [args.query] if args.query is not None else None
+    while True:
+        if queries is None:
+            try:
+                query = input("> ")
+            except EOFError:
+                print()
+                break
+            if index.refresh() != ([], []):
+                index.save()
+        elif len(queries) == 0:
+            break
+        else:
+            query = queries.pop(0)
+        start_time = time.perf_counter()
+        try:
+            records = index.search(query)
+        except ValueError as e:
+            print("ERROR:", e, file=sys.stderr)
+            continue
+        elapsed_seconds = time.perf_counter() - start_time
+        if args.json:
+            print(json.dumps([{key:record[key] for key in ["deck", "name", "mana", "type_line"]} for record in records], indent=4))
+        else:
+            print_results(records, elapsed_seconds)
+
+if __name__ == '__main__':
+    main()
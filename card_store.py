@@ -0,0 +1,258 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+
+import paths
+from game_elements import Deck
+
+# Optional SQLite store for the card pool, as an alternative to the per-deck JSON files.
+#   decks  -- One row per deck: its name, set code, and the entries of its JSON file that are not cards (_basics, _common_tokens, ...).
+#   cards  -- One row per card of a deck JSON file, and tokens -- one row per token of a <deck>_Tokens.json file. Each row keeps the card
+#             dictionary exactly as found in the JSON file (data), so files round-trip unchanged, plus indexed columns extracted from it.
+#             revision is the store revision at which the row last changed.
+#   tags   -- One row per tag of each card.
+#   exports -- The store revision and time at which each deck was last exported to a target (e.g., Cockatrice), so that only rows
+#             changed since then need to be exported again.
+# Every write is a single transaction.
+
+CARD_STORE_SCHEMA_VERSION = 1
+CARD_COLUMNS = ["name", "setname", "cardtype", "subtype", "mana", "rarity", "special"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS decks (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL, setname TEXT, extras TEXT NOT NULL, token_extras TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS cards (id INTEGER PRIMARY KEY, deck_id INTEGER NOT NULL REFERENCES decks(id) ON DELETE CASCADE, position INTEGER NOT NULL, key TEXT NOT NULL,
+    name TEXT, setname TEXT, cardtype TEXT, subtype TEXT, mana TEXT, rarity TEXT, special TEXT, data TEXT NOT NULL, data_hash TEXT NOT NULL, revision INTEGER NOT NULL, UNIQUE (deck_id, key));
+CREATE TABLE IF NOT EXISTS tokens (id INTEGER PRIMARY KEY, deck_id INTEGER NOT NULL REFERENCES decks(id) ON DELETE CASCADE, position INTEGER NOT NULL, key TEXT NOT NULL,
+    name TEXT, setname TEXT, cardtype TEXT, subtype TEXT, mana TEXT, rarity TEXT, special TEXT, data TEXT NOT NULL, data_hash TEXT NOT NULL, revision INTEGER NOT NULL, UNIQUE (deck_id, key));
+CREATE TABLE IF NOT EXISTS tags (card_id INTEGER NOT NULL REFERENCES cards(id) ON DELETE CASCADE, tag TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS exports (deck_id INTEGER NOT NULL REFERENCES decks(id) ON DELETE CASCADE, target TEXT NOT NULL, revision INTEGER NOT NULL, exported_at REAL NOT NULL, PRIMARY KEY (deck_id, target));
+CREATE INDEX IF NOT EXISTS cards_name ON cards (name);
+CREATE INDEX IF NOT EXISTS cards_setname ON cards (setname);
+CREATE INDEX IF NOT EXISTS cards_cardtype ON cards (cardtype);
+CREATE INDEX IF NOT EXISTS cards_revision ON cards (deck_id, revision);
+CREATE INDEX IF NOT EXISTS tokens_name ON tokens (name);
+CREATE INDEX IF NOT EXISTS tokens_revision ON tokens (deck_id, revision);
+CREATE INDEX IF NOT EXISTS tags_tag ON tags (tag);
+CREATE INDEX IF NOT EXISTS tags_card_id ON tags (card_id);
+"""
+
+# Returns True if the input entry of a deck JSON file is a card (as opposed to _basics, _common_tokens, ...), in the same way as Deck.from_dict.
+def is_card_entry(key):
+    return key.lower() not in ["_basics", "_common_tokens"]
+
+def get_data_hash(card):
+    return hashlib.sha1(json.dumps(card, sort_keys=True).encode("utf-8")).hexdigest()
+
+# Returns the JSON file of the tokens of the deck with the input JSON file (as written by Deck.get_tokens).
+def get_tokens_json_filepath(deck_json_filepath):
+    return deck_json_filepath[:-len(".json")] + "_Tokens.json"
+
+class CardStore:
+    def __init__(self, path=paths.CARD_STORE_PATH):
+        self.path = path
+        if os.path.dirname(path) != "" and not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        # The store may be used by a build task on another thread (see build_scheduler), though never by two threads at the same time
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+            stored_version = self.get_meta("schema_version")
+            if stored_version is None:
+                self.set_meta("schema_version", CARD_STORE_SCHEMA_VERSION)
+            elif int(stored_version) != CARD_STORE_SCHEMA_VERSION:
+                raise ValueError("The card store " + path + " has schema version " + str(stored_version) + ", but version " + str(CARD_STORE_SCHEMA_VERSION) + " is required.")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def get_meta(self, key):
+        row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def set_meta(self, key, value):
+        self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def get_revision(self):
+        revision = self.get_meta("revision")
+        return 0 if revision is None else int(revision)
+
+    def get_deck_id(self, deck_name):
+        row = self.connection.execute("SELECT id FROM decks WHERE name = ?", (deck_name,)).fetchone()
+        return None if row is None else row[0]
+
+    def has_deck(self, deck_name):
+        return self.get_deck_id(deck_name) is not None
+
+    def get_deck_names(self):
+        return [row[0] for row in self.connection.execute("SELECT name FROM decks ORDER BY name")]
+
+    def get_setname(self, deck_name):
+        row = self.connection.execute("SELECT setname FROM decks WHERE name = ?", (deck_name,)).fetchone()
+        return None if row is None else row[0]
+
+    # Writes the entries of a deck JSON dictionary (card_dict, if given) and of its tokens JSON dictionary (tokens_dict, if given) to the store, in one transaction.
+    # Rows whose card dictionary did not change keep their revision; changed and new rows get a new revision; cards no longer in the deck are deleted.
+    # Returns the number of rows added, changed or deleted.
+    def put_deck(self, deck_name, card_dict, setname="UNK", tokens_dict=None):
+        with self.connection:
+            revision = self.get_revision() + 1
+            deck_id = self.get_deck_id(deck_name)
+            if deck_id is None:
+                deck_id = self.connection.execute("INSERT INTO decks (name, setname, extras, token_extras) VALUES (?, ?, '[]', '[]')", (deck_name, setname)).lastrowid
+            self.connection.execute("UPDATE decks SET setname = ? WHERE id = ?", (setname, deck_id))
+            num_changed = 0
+            if card_dict is not None:
+                num_changed += self.put_entries("cards", "extras", deck_id, card_dict, setname, revision)
+            if tokens_dict is not None:
+                num_changed += self.put_entries("tokens", "token_extras", deck_id, tokens_dict, setname, revision)
+            if num_changed > 0:
+                self.set_meta("revision", revision)
+        return num_changed
+
+    def put_entries(self, table, extras_column, deck_id, entries, setname, revision):
+        existing = {key:(row_id, data_hash, position) for row_id, key, data_hash, position in self.connection.execute("SELECT id, key, data_hash, position FROM "+table+" WHERE deck_id = ?", (deck_id,))}
+        extras = []
+        num_changed = 0
+        for position, (key, card) in enumerate(entries.items()):
+            if not is_card_entry(key) or type(card) != dict:
+                extras.append([position, key, card])
+                continue
+            data_hash = get_data_hash(card)
+            if key in existing and existing[key][1] == data_hash:
+                if existing[key][2] != position:
+                    self.connection.execute("UPDATE "+table+" SET position = ? WHERE id = ?", (position, existing[key][0]))
+                del existing[key]
+                continue
+            values = [card.get(column, setname if column=="setname" else None) for column in CARD_COLUMNS]
+            values = [json.dumps(value) if type(value) in [list, dict] else value for value in values]
+            if key in existing:
+                row_id = existing.pop(key)[0]
+                self.connection.execute("UPDATE "+table+" SET position = ?, "+", ".join([column+" = ?" for column in CARD_COLUMNS])+", data = ?, data_hash = ?, revision = ? WHERE id = ?",
+                                        [position] + values + [json.dumps(card), data_hash, revision, row_id])
+            else:
+                row_id = self.connection.execute("INSERT INTO "+table+" (deck_id, position, key, "+", ".join(CARD_COLUMNS)+", data, data_hash, revision) VALUES (?, ?, ?, "+", ".join(["?"]*len(CARD_COLUMNS))+", ?, ?, ?)",
+                                                 [deck_id, position, key] + values + [json.dumps(card), data_hash, revision]).lastrowid
+            if table == "cards":
+                tags = card.get("tags")
+                tags = [tags] if type(tags) == str else (tags or [])
+                self.connection.execute("DELETE FROM tags WHERE card_id = ?", (row_id,))
+                self.connection.executemany("INSERT INTO tags (card_id, tag) VALUES (?, ?)", [(row_id, tag) for tag in tags])
+            num_changed += 1
+        for key, (row_id, _, _) in existing.items():
+            self.connection.execute("DELETE FROM "+table+" WHERE id = ?", (row_id,))
+            num_changed += 1
+        self.connection.execute("UPDATE decks SET "+extras_column+" = ? WHERE id = ?", (json.dumps(extras), deck_id))
+        return num_changed
+
+    # Returns the deck (or, if tokens is True, its tokens) as a dictionary in the deck JSON format, with its entries in their original order. Returns None if the deck is not in the store.
+    def get_deck_dict(self, deck_name, tokens=False):
+        row = self.connection.execute("SELECT id, "+("token_extras" if tokens else "extras")+" FROM decks WHERE name = ?", (deck_name,)).fetchone()
+        if row is None:
+            return None
+        deck_id, extras = row
+        entries = [(position, key, json.loads(data)) for position, key, data in self.connection.execute("SELECT position, key, data FROM "+("tokens" if tokens else "cards")+" WHERE deck_id = ?", (deck_id,))]
+        entries += [tuple(extra) for extra in json.loads(extras)]
+        return {key:card for _, key, card in sorted(entries, key=lambda entry: entry[0])}
+
+    # Returns the names of the cards and tokens of the deck that changed since the deck was last exported to the input target, or None if it never was.
+    def get_changed_names(self, deck_name, target):
+        deck_id = self.get_deck_id(deck_name)
+        row = self.connection.execute("SELECT revision FROM exports WHERE deck_id = ? AND target = ?", (deck_id, target)).fetchone()
+        if row is None:
+            return None
+        names = set()
+        for table in ["cards", "tokens"]:
+            names.update([name for (name,) in self.connection.execute("SELECT name FROM "+table+" WHERE deck_id = ? AND revision > ?", (deck_id, row[0]))])
+        return names
+
+    # Returns the time at which the deck was last exported to the input target, or None.
+    def get_export_time(self, deck_name, target):
+        row = self.connection.execute("SELECT exported_at FROM exports WHERE deck_id = ? AND target = ?", (self.get_deck_id(deck_name), target)).fetchone()
+        return None if row is None else row[0]
+
+    def mark_exported(self, deck_name, target):
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO exports (deck_id, target, revision, exported_at) VALUES (?, ?, ?, ?)", (self.get_deck_id(deck_name), target, self.get_revision(), time.time()))
+
+    # Returns (deck name, card dictionary) of every card matching all of the given columns (exact matches, using the indexes) and tag.
+    def find_cards(self, name=None, setname=None, cardtype=None, tag=None):
+        conditions, values = [], []
+        for column, value in [("cards.name", name), ("cards.setname", setname), ("cards.cardtype", cardtype)]:
+            if value is not None:
+                conditions.append(column + " = ?")
+                values.append(value)
+        if tag is not None:
+            conditions.append("cards.id IN (SELECT card_id FROM tags WHERE tag = ?)")
+            values.append(tag)
+        query = "SELECT decks.name, cards.data FROM cards JOIN decks ON decks.id = cards.deck_id" + ("" if len(conditions)==0 else " WHERE " + " AND ".join(conditions)) + " ORDER BY decks.name, cards.position"
+        return [(deck_name, json.loads(data)) for deck_name, data in self.connection.execute(query, values)]
+
+    # Imports a deck JSON file, and its tokens JSON file if there is one. Returns the number of rows added, changed or deleted.
+    def import_json(self, deck_json_filepath, deck_name=None, setname="UNK"):
+        deck_name = os.path.basename(deck_json_filepath).replace(".json","") if deck_name is None else deck_name
+        with open(deck_json_filepath) as f:
+            card_dict = json.load(f)
+        tokens_dict = None
+        if os.path.isfile(get_tokens_json_filepath(deck_json_filepath)):
+            with open(get_tokens_json_filepath(deck_json_filepath)) as f:
+                tokens_dict = json.load(f)
+        return self.put_deck(deck_name, card_dict, setname=setname, tokens_dict=tokens_dict)
+
+    # Imports the tokens JSON file of a deck (as written by Deck.get_tokens), leaving the cards of the deck unchanged.
+    def import_tokens_json(self, deck_name, tokens_json_filepath):
+        with open(tokens_json_filepath) as f:
+            tokens_dict = json.load(f)
+        return self.put_deck(deck_name, None, setname=self.get_setname(deck_name), tokens_dict=tokens_dict)
+
+    # Writes the deck JSON file (and tokens JSON file, if the store has tokens for the deck) of a deck in the store.
+    def export_json(self, deck_name, deck_json_filepath):
+        with open(deck_json_filepath, "w") as f:
+            json.dump(self.get_deck_dict(deck_name), f, indent=4)
+        tokens_dict = self.get_deck_dict(deck_name, tokens=True)
+        if len(tokens_dict) > 0:
+            with open(get_tokens_json_filepath(deck_json_filepath), "w") as f:
+                json.dump(tokens_dict, f, indent=4)
+
+def main():
+    parser = argparse.ArgumentParser(description='MTG Custom Card Store')
+    parser.add_argument('command', help='import: copy deck JSON files into the store. export: write deck JSON files from the store. list: print the decks in the store.', choices=['import', 'export', 'list'])
+    parser.add_argument('-d', '--deck', help='Name of a deck. Can be repeated.', type=str, action='append', default=[], dest='decks')
+    parser.add_argument('-a', '--all', help='Every deck in DECK_PATH (import) or in the store (export)', action='store_true', dest='all')
+    parser.add_argument('-s', '--store', help='Path of the SQLite card store', type=str, default=paths.CARD_STORE_PATH, dest='store')
+    args = parser.parse_args()
+    with CardStore(args.store) as store:
+        if args.command == 'list':
+            for deck_name in store.get_deck_names():
+                print(deck_name)
+            return
+        deck_names = args.decks
+        if args.all:
+            deck_names = Deck.find_deck_names() if args.command == 'import' else store.get_deck_names()
+        for deck_name in deck_names:
+            deck_folder = os.path.join(paths.DECK_PATH, deck_name)
+            deck_json_filepath = Deck.get_deck_json_filepath(deck_folder)
+            if args.command == 'import':
+                num_changed = store.import_json(deck_json_filepath, setname=Deck.get_setname_from_deck_folder(deck_folder))
+                print("Imported", deck_name + ":", num_changed, "changed row" + ("" if num_changed==1 else "s"))
+            else:
+                if not store.has_deck(os.path.basename(deck_json_filepath).replace(".json","")):
+                    print("WARNING: The deck " + deck_name + " is not in the store.")
+                    continue
+                if not os.path.isdir(deck_folder):
+                    os.mkdir(deck_folder)
+                store.export_json(os.path.basename(deck_json_filepath).replace(".json",""), deck_json_filepath)
+                print("Exported", deck_name, "to", deck_json_filepath)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+import os
+import json
+import argparse
+
+import numpy as np
+
+import paths
+from game_elements import Card, Deck, Mana
+
+# Statistics engine for one deck or a whole library of decks. Every card of every deck is read once into a CardTable, a columnar table
+# of NumPy arrays (one row per card), and all summaries (mana curves, color shares, type counts and tag breakdowns) are computed from the
+# columns with vectorized, per-deck grouped operations. Results are plain dictionaries that can be printed, compared across decks or
+# written as JSON.
+
+COLORS = list(Mana.color_bits.keys())
+SUMMARY_CARDTYPES = ["Creature", "Artifact", "Enchantment", "Instant", "Sorcery"]
+OPTIONAL_SUMMARY_CARDTYPES = ["Planeswalker", "Battle"]
+
+class CardTable:
+    # Builds the table of every card of the input decks in a single pass over the cards.
+    def from_decks(decks):
+        deck_names, deck_sizes = [], []
+        deck_index, mana_value, color_mask, cardtype_mask, supertype_mask, special_id = [], [], [], [], [], []
+        special_names, special_ids = [], {}
+        tag_row, tag_supertag_id, tag_subtag_id = [], [], []
+        supertag_names, supertag_ids, subtag_names, subtag_ids = [], {}, [], {}
+        row = 0
+        for di, deck in enumerate(decks):
+            deck_names.append(deck.name)
+            deck_sizes.append(len(deck.cards))
+            for card in deck.cards:
+                deck_index.append(di)
+                mana_value.append(card.get_mana_value())
+                color_mask.append(card.color_mask)
+                cardtype_mask.append(card.cardtype_mask)
+                supertype_mask.append(card.supertype_mask)
+                if card.special is None:
+                    special_id.append(-1)
+                else:
+                    if card.special not in special_ids:
+                        special_ids[card.special] = len(special_names)
+                        special_names.append(card.special)
+                    special_id.append(special_ids[card.special])
+                for tag in (card.tags or []):
+                    supertag, _, subtag = tag.partition('-')
+                    if supertag not in supertag_ids:
+                        supertag_ids[supertag] = len(supertag_names)
+                        supertag_names.append(supertag)
+                    if subtag and subtag not in subtag_ids:
+                        subtag_ids[subtag] = len(subtag_names)
+                        subtag_names.append(subtag)
+                    tag_row.append(row)
+                    tag_supertag_id.append(supertag_ids[supertag])
+                    tag_subtag_id.append(subtag_ids[subtag] if subtag else -1)
+                row += 1
+        table = CardTable()
+        table.deck_names = deck_names
+        table.deck_sizes = np.array(deck_sizes, dtype=np.int64)
+        table.deck_index = np.array(deck_index, dtype=np.int32)
+        table.mana_value = np.array(mana_value, dtype=np.int64)
+        table.color_mask = np.array(color_mask, dtype=np.uint8)
+        table.cardtype_mask = np.array(cardtype_mask, dtype=np.uint16)
+        table.supertype_mask = np.array(supertype_mask, dtype=np.uint8)
+        table.special_id = np.array(special_id, dtype=np.int32)
+        table.special_names = special_names
+        table.tag_row = np.array(tag_row, dtype=np.int32)
+        table.tag_supertag_id = np.array(tag_supertag_id, dtype=np.int32)
+        table.tag_subtag_id = np.array(tag_subtag_id, dtype=np.int32)
+        table.supertag_names = supertag_names
+        table.subtag_names = subtag_names
+        return table
+
+    def num_decks(self):
+        return len(self.deck_names)
+
+    def has_cardtype(self, cardtype):
+        return (self.cardtype_mask & Card.cardtype_bits[cardtype]) != 0
+
+    def has_supertype(self, supertype):
+        return (self.supertype_mask & Card.supertype_bits[supertype]) != 0
+
+    # Returns a boolean column that is True for the cards whose special field satisfies the input predicate. Cards without a special field are False.
+    def special_matches(self, predicate):
+        special_flags = np.array([predicate(special) for special in self.special_names] + [False], dtype=bool) # The last entry is indexed by -1
+        return special_flags[self.special_id]
+
+    # Same definition as Card.is_spell.
+    def is_spell(self):
+        return ((self.cardtype_mask & Card.spell_cardtypes_mask) != 0) & ~self.has_cardtype("land")
+
+    # Sums the input column (or counts the True values of a boolean column) per deck.
+    def sum_per_deck(self, column):
+        return np.bincount(self.deck_index, weights=column, minlength=self.num_decks()).astype(np.int64)
+
+    # Returns a (decks x 5) array with the number of spells of each color (in WUBRG order) in each deck.
+    def color_counts(self):
+        color_flags = ((self.color_mask[:, None] >> np.arange(5, dtype=np.uint8)) & 1).astype(np.int64)
+        color_flags *= self.is_spell()[:, None]
+        counts = np.zeros((self.num_decks(), 5), dtype=np.int64)
+        np.add.at(counts, self.deck_index, color_flags)
+        return counts
+
+    # Returns (first mana value, decks x mana values array of counts) of the nonland cards of each deck, skipping the backs of transforming cards.
+    def mana_curves(self):
+        counted = ~self.has_cardtype("land") & ~self.special_matches(lambda special: "transform" in special and "back" in special)
+        mana_values = self.mana_value[counted]
+        if len(mana_values) == 0:
+            return 0, np.zeros((self.num_decks(), 0), dtype=np.int64), counted
+        first, last = int(mana_values.min()), int(mana_values.max())
+        width = last - first + 1
+        curves = np.bincount(self.deck_index[counted]*width + (mana_values-first), minlength=self.num_decks()*width).reshape(self.num_decks(), width)
+        return first, curves, counted
+
+    # Returns a (decks x cardtypes) array with the number of cards of each of Card.cardtypes in each deck, skipping tokens and backs.
+    def cardtype_counts(self):
+        counted = ~self.has_supertype("token") & ~self.special_matches(lambda special: "back" in special.lower())
+        type_flags = ((self.cardtype_mask[:, None] >> np.arange(len(Card.cardtypes), dtype=np.uint16)) & 1).astype(np.int64)
+        type_flags *= counted[:, None]
+        counts = np.zeros((self.num_decks(), len(Card.cardtypes)), dtype=np.int64)
+        np.add.at(counts, self.deck_index, type_flags)
+        return counts
+
+    # Returns (decks x supertags array, decks x supertags x subtags array) of tag counts. A tag with a subtag ("supertag-subtag") counts its
+    # supertag once per card, however many subtags of it the card has; a tag without a subtag counts once per occurrence.
+    def tag_counts(self):
+        num_decks, num_supertags, num_subtags = self.num_decks(), len(self.supertag_names), len(self.subtag_names)
+        supertag_counts = np.zeros(num_decks*num_supertags, dtype=np.int64)
+        subtag_counts = np.zeros(num_decks*num_supertags*max(num_subtags, 1), dtype=np.int64)
+        if len(self.tag_row) > 0:
+            tag_deck = self.deck_index[self.tag_row].astype(np.int64)
+            has_subtag = self.tag_subtag_id >= 0
+            plain = tag_deck[~has_subtag]*num_supertags + self.tag_supertag_id[~has_subtag]
+            supertag_counts += np.bincount(plain, minlength=num_decks*num_supertags)
+            card_supertags = np.unique(self.tag_row[has_subtag].astype(np.int64)*num_supertags + self.tag_supertag_id[has_subtag])
+            supertag_counts += np.bincount(self.deck_index[card_supertags//num_supertags].astype(np.int64)*num_supertags + card_supertags%num_supertags, minlength=num_decks*num_supertags)
+            subtags = (tag_deck[has_subtag]*num_supertags + self.tag_supertag_id[has_subtag])*num_subtags + self.tag_subtag_id[has_subtag]
+            subtag_counts += np.bincount(subtags, minlength=len(subtag_counts))
+        return supertag_counts.reshape(num_decks, num_supertags), subtag_counts.reshape(num_decks, num_supertags, max(num_subtags, 1))
+
+# Returns a list with a statistics dictionary for each deck of the input table. All counts and percentages are plain Python numbers.
+def compute_statistics(table):
+    num_spells = table.sum_per_deck(table.is_spell()).tolist()
+    color_counts = table.color_counts().tolist()
+    first_mana_value, curves, counted = table.mana_curves()
+    curves = curves.tolist()
+    total_mana_values = table.sum_per_deck(np.where(counted, table.mana_value, 0)).tolist()
+    cardtype_counts = table.cardtype_counts().tolist()
+    supertag_counts, subtag_counts = table.tag_counts()
+    supertag_counts, subtag_counts = supertag_counts.tolist(), subtag_counts.tolist()
+    deck_sizes = table.deck_sizes.tolist()
+    statistics = []
+    for di, name in enumerate(table.deck_names):
+        num_cards = deck_sizes[di]
+        total_colors = sum(color_counts[di])
+        colors = {}
+        for ci, color in enumerate(COLORS):
+            if color_counts[di][ci] > 0:
+                colors[color] = {"spells": color_counts[di][ci], "percent": round(color_counts[di][ci]*100/total_colors, 1)}
+        curve = {}
+        for offset, count in enumerate(curves[di]):
+            curve[first_mana_value+offset] = count
+        while len(curve) > 0 and curve[min(curve.keys())] == 0:
+            del curve[min(curve.keys())]
+        while len(curve) > 0 and curve[max(curve.keys())] == 0:
+            del curve[max(curve.keys())]
+        cardtypes = {cardtype.capitalize():count for cardtype, count in zip(Card.cardtypes, cardtype_counts[di])}
+        tags = {}
+        for si in sorted(range(len(table.supertag_names)), key=lambda si: table.supertag_names[si]):
+            if supertag_counts[di][si] == 0:
+                continue
+            subtags = {table.subtag_names[ti]:count for ti, count in enumerate(subtag_counts[di][si]) if count > 0 and ti < len(table.subtag_names)}
+            tags[table.supertag_names[si]] = {"count": supertag_counts[di][si], "subtags": {subtag:subtags[subtag] for subtag in sorted(subtags.keys())}}
+        statistics.append({
+            "name": name,
+            "cards": num_cards,
+            "spells": num_spells[di],
+            "lands": num_cards - num_spells[di],
+            "colors": colors,
+            "mana_curve": {mana_value:{"count": count, "percent": round(count/num_cards*100, 1)} for mana_value, count in curve.items()},
+            "average_mana_value": None if num_cards==0 else round(total_mana_values[di]/num_cards, 3),
+            "average_mana_value_nonland": None if num_spells[di]==0 else round(total_mana_values[di]/num_spells[di], 3),
+            "cardtypes": {cardtype:{"count": count, "percent": None if num_spells[di]==0 else round(100*count/num_spells[di], 1)} for cardtype, count in cardtypes.items()},
+            "tags": tags})
+    return statistics
+
+# Returns the statistics of each input deck, followed by the statistics of all of them combined (named "All decks") if there is more than one.
+def get_statistics(decks, combined=True):
+    decks = list(decks)
+    statistics = compute_statistics(CardTable.from_decks(decks))
+    if combined and len(decks) > 1:
+        statistics += compute_statistics(CardTable.from_decks([Deck(cards=[card for deck in decks for card in deck.cards], name="All decks")]))
+    return statistics
+
+def statistics_to_json(statistics):
+    return json.dumps(statistics, indent=4)
+
+# Prints the summaries of a single deck, in the same format as Deck.print_color_summary, print_mana_summary, print_type_summary and print_tag_summary.
+def print_statistics(deck_statistics):
+    name = deck_statistics["name"]
+    print()
+    print("COLOR SUMMARY FOR: ", name, ".....................")
+    print("All deck colors: ", list(deck_statistics["colors"].keys()))
+    for color, color_statistics in deck_statistics["colors"].items():
+        print("\t", color, "spells: ", color_statistics["percent"], "%")
+    print()
+    print()
+    print("MANA SUMMARY FOR: ", name, ".....................")
+    curve = deck_statistics["mana_curve"]
+    if len(curve) > 0:
+        max_count = max([entry["count"] for entry in curve.values()])
+        for mana_value, entry in curve.items():
+            count = entry["count"]
+            print("Mana Value "+str(mana_value)+":"+(" " if mana_value<10 else ""), "#"*count, " "*(max_count-count), "("+str(count)+")"+("" if count>=10 else " "), entry["percent"], "%")
+    print("Average Mana Value (Including Lands):", deck_statistics["average_mana_value"])
+    print("Average Mana Value (Excluding Lands):", deck_statistics["average_mana_value_nonland"])
+    print()
+    print()
+    print("TYPE SUMMARY FOR: ", name, ".....................")
+    cardtypes = deck_statistics["cardtypes"]
+    print(cardtypes["Land"]["count"], "\tLands")
+    print(deck_statistics["spells"], "\tSpells\t")
+    for typ in SUMMARY_CARDTYPES + OPTIONAL_SUMMARY_CARDTYPES:
+        if typ in OPTIONAL_SUMMARY_CARDTYPES and cardtypes[typ]["count"]==0:
+            continue
+        print(cardtypes[typ]["count"], "\t"+("Sorcerie" if typ=="Sorcery" else typ)+"s\t", cardtypes[typ]["percent"], "%")
+    print()
+    print()
+    print("TAG SUMMARY FOR: ", name, ".....................")
+    for tag, tag_statistics in deck_statistics["tags"].items():
+        print(tag_statistics["count"], "\t", tag)
+        for subtag, count in tag_statistics["subtags"].items():
+            print("  ", count, "\t", subtag)
+    print()
+
+# Prints one line per deck with its main statistics, for comparing decks side by side.
+def print_comparison(statistics):
+    print()
+    print("DECK COMPARISON .....................")
+    print("Cards\tSpells\tLands\tAvg MV\t" + "\t".join([color.upper()+" %" for color in COLORS]) + "\tDeck")
+    for deck_statistics in statistics:
+        color_percents = [str(deck_statistics["colors"][color]["percent"]) if color in deck_statistics["colors"] else "-" for color in COLORS]
+        print(str(deck_statistics["cards"])+"\t"+str(deck_statistics["spells"])+"\t"+str(deck_statistics["lands"])+"\t"+str(deck_statistics["average_mana_value_nonland"])+"\t"+"\t".join(color_percents)+"\t"+deck_statistics["name"])
+    print()
+
+def main():
+    parser = argparse.ArgumentParser(description='MTG Custom Deck Statistics')
+    parser.add_argument('-d', '--deck', help='Name of a deck. Can be repeated to compare decks.', type=str, action='append', default=[], dest='decks')
+    parser.add_argument('-a', '--all', help='Compute the statistics of every deck in DECK_PATH', action='store_true', dest='all')
+    parser.add_argument('-j', '--json', help='Write the statistics as JSON to this file (- for standard output) instead of printing the summaries', type=str, default=None, dest='json')
+    args = parser.parse_args()
+    deck_names = Deck.find_deck_names() if args.all else args.decks
+    if len(deck_names) == 0:
+        raise ValueError("No decks given. Use -d <deck name> or --all.")
+    decks = [Deck.from_deck_folder(os.path.join(paths.DECK_PATH, ' '.join(word[0].upper() + word[1:] for word in deck_name.split()))) for deck_name in deck_names]
+    statistics = get_statistics(decks)
+    if args.json == "-":
+        print(statistics_to_json(statistics))
+    elif args.json is not None:
+        with open(args.json, "w") as f:
+            f.write(statistics_to_json(statistics))
+    else:
+        for deck_statistics in statistics:
+            print_statistics(deck_statistics)
+        if len(statistics) > 1:
+            print_comparison(statistics)
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,11 @@
 ﻿import os
 import json
 import re
+import hashlib
 from functools import cmp_to_key
-from num2words import num2words
 
-from paths import CARD_BORDERS_PATH, DECK_PATH
+from paths import CARD_BORDERS_PATH, DECK_PATH, TOKENS_HASHES_PATH
+import card_schema
 
 class Mana:
     mana_symbols_standard = ['w','u','b','r','g','c','s']
@@ -18,6 +19,20 @@ class Mana:
     mana_symbols = mana_symbols_standard + mana_symbols_variable + mana_symbols_numeric + mana_symbols_dual_hybrid + mana_symbols_mono_hybrid + mana_symbols_phyrexian + mana_symbols_phyrexian_hybrid + mana_symbols_custom
     mana_symbols_bracketed = ["{"+s+"}" for s in mana_symbols] 
 
+    # Colors are represented as 5-bit masks, one bit per color in WUBRG order. 
+    color_bits = {'w':1, 'u':2, 'b':4, 'r':8, 'g':16}
+    color_counts = [bin(mask).count("1") for mask in range(32)] # Number of colors of each mask
+    mask_colors = [[c for c, bit in [('w',1),('u',2),('b',4),('r',8),('g',16)] if mask & bit] for mask in range(32)] # Colors of each mask, in WUBRG order
+    # Masks of the named color combinations (w=1, u=2, b=4, r=8, g=16):
+    color_combination_masks = {
+        "azorius":1|2, "orzhov":1|4, "boros":1|8, "selesnya":1|16, "dimir":2|4, "izzet":2|8, "simic":2|16, "rakdos":4|8, "golgari":4|16, "gruul":8|16,
+        "abzan":1|4|16, "bant":1|2|16, "esper":1|2|4, "grixis":2|4|8, "jeskai":1|2|8, "jund":4|8|16, "mardu":1|4|8, "naya":1|8|16, "sultai":2|4|16, "temur":2|8|16,
+        "glint":2|4|8|16, "dune":1|4|8|16, "ink":1|2|8|16, "witch":1|2|4|16, "yore":1|2|4|8}
+    # Frame name of each two-color mask:
+    color_pair_frame_names = {1|2:"wu", 1|4:"wb", 1|8:"rw", 1|16:"gw", 2|4:"ub", 2|8:"ur", 2|16:"gu", 4|8:"br", 4|16:"bg", 8|16:"rg"}
+    color_masks = {} # Results of Mana.get_color_mask, memoised per input cost string.
+    mana_values = {} # Results of Mana.get_mana_value, memoised per input cost string.
+
     # Returns a dictionary where keys are mana symbols present in the card's mana cost, and values are counts for each of those mana symbols.
     # Note that generic mana symbols are supported only up until {20}.  
     def get_mana_symbols(mana_cost):
@@ -35,6 +50,8 @@ class Mana:
 
     # Returns the integer mana value (converted mana cost) of the input card. 
     def get_mana_value(mana_cost):
+        if mana_cost in Mana.mana_values:
+            return Mana.mana_values[mana_cost]
         mana_value = 0
         mana_value_dict = Mana.get_mana_symbols(mana_cost)
         for symbol in mana_value_dict.keys():
@@ -44,10 +61,37 @@ class Mana:
                 mana_value += 2 * mana_value_dict[symbol]
             elif symbol not in Mana.mana_symbols_variable:
                 mana_value += 1 * mana_value_dict[symbol]
+        Mana.mana_values[mana_cost] = mana_value
         return mana_value
 
     def get_colors(mana_cost):
-        return [] if mana_cost is None else [color for color in ['w','u','b','r','g'] if color in mana_cost.lower()]
+        return list(Mana.mask_colors[Mana.get_color_mask(mana_cost)])
+
+    # Returns the color mask of the input mana cost. A color is present if its letter appears anywhere in the cost (e.g., {2/w} and {w/p} are white).
+    def get_color_mask(mana_cost):
+        if mana_cost is None:
+            return 0
+        mask = Mana.color_masks.get(mana_cost)
+        if mask is None:
+            lowered_mana_cost = mana_cost.lower()
+            mask = 0
+            for color, bit in Mana.color_bits.items():
+                if color in lowered_mana_cost:
+                    mask |= bit
+            Mana.color_masks[mana_cost] = mask
+        return mask
+
+    # Returns the color mask of the input list of colors (e.g., ['w','u']).
+    def colors_to_mask(colors):
+        mask = 0
+        for color in colors:
+            mask |= Mana.color_bits.get(color, 0)
+        return mask
+
+    # Returns True if the input color mask contains every color of the named color combination (e.g., "azorius").
+    def mask_has_colors(mask, color_combination):
+        combination_mask = Mana.color_combination_masks[color_combination]
+        return mask & combination_mask == combination_mask
     def get_colors_in_text(text):
         text = text.lower()
         colors = []
@@ -74,79 +118,79 @@ class Mana:
                     colors.append(c)
         return colors               
     def is_monocolored(mana_cost):
-        return len(Mana.get_colors(mana_cost))==1
+        return Mana.color_counts[Mana.get_color_mask(mana_cost)]==1
     def is_colorless(mana_cost):
-        return len(Mana.get_colors(mana_cost))==0
+        return Mana.color_counts[Mana.get_color_mask(mana_cost)]==0
     def is_multicolored(mana_cost):
-        return len(Mana.get_colors(mana_cost))>1
+        return Mana.color_counts[Mana.get_color_mask(mana_cost)]>1
     def is_bicolored(mana_cost):
-        return len(Mana.get_colors(mana_cost))==2
+        return Mana.color_counts[Mana.get_color_mask(mana_cost)]==2
     def is_tricolored(mana_cost):
-        return len(Mana.get_colors(mana_cost))==3
+        return Mana.color_counts[Mana.get_color_mask(mana_cost)]==3
     def is_quadcolored(mana_cost):
-        return len(Mana.get_colors(mana_cost))==4
+        return Mana.color_counts[Mana.get_color_mask(mana_cost)]==4
     def is_pentacolored(mana_cost):
-        return len(Mana.get_colors(mana_cost))==5
+        return Mana.color_counts[Mana.get_color_mask(mana_cost)]==5
     def is_white(mana_cost):
-        return 'w' in Mana.get_colors(mana_cost)
+        return Mana.get_color_mask(mana_cost) & Mana.color_bits['w'] != 0
     def is_blue(mana_cost):
-        return 'u' in Mana.get_colors(mana_cost)
+        return Mana.get_color_mask(mana_cost) & Mana.color_bits['u'] != 0
     def is_black(mana_cost):
-        return 'b' in Mana.get_colors(mana_cost)
+        return Mana.get_color_mask(mana_cost) & Mana.color_bits['b'] != 0
     def is_red(mana_cost):
-        return 'r' in Mana.get_colors(mana_cost)
+        return Mana.get_color_mask(mana_cost) & Mana.color_bits['r'] != 0
     def is_green(mana_cost):
-        return 'g' in Mana.get_colors(mana_cost)
+        return Mana.get_color_mask(mana_cost) & Mana.color_bits['g'] != 0
     def is_azorius(mana_cost):
-        return Mana.is_white(mana_cost) and Mana.is_blue(mana_cost)
+        return Mana.mask_has_colors(Mana.get_color_mask(mana_cost), "azorius")
     def is_orzhov(mana_cost):
-        return Mana.is_white(mana_cost) and Mana.is_black(mana_cost)
+        return Mana.mask_has_colors(Mana.get_color_mask(mana_cost), "orzhov")
     def is_boros(mana_cost):
-        return Mana.is_white(mana_cost) and Mana.is_red(mana_cost)
+        return Mana.mask_has_colors(Mana.get_color_mask(mana_cost), "boros")
     def is_selesnya(mana_cost):
-        return Mana.is_white(mana_cost) and Mana.is_green(mana_cost)
+        return Mana.mask_has_colors(Mana.get_color_mask(mana_cost), "selesnya")
     def is_dimir(mana_cost):
-        return Mana.is_blue(mana_cost) and Mana.is_black(mana_cost)
+        return Mana.mask_has_colors(Mana.get_color_mask(mana_cost), "dimir")
     def is_izzet(mana_cost):
-        return Mana.is_blue(mana_cost) and Mana.is_red(mana_cost)
+        return Mana.mask_has_colors(Mana.get_color_mask(mana_cost), "izzet")
     def is_simic(mana_cost):
-        return Mana.is_blue(mana_cost) and Mana.is_green(mana_cost)
+        return Mana.mask_has_colors(Mana.get_color_mask(mana_cost), "simic")
     def is_rakdos(mana_cost):
-        return Mana.is_black(mana_cost) and Mana.is_red(mana_cost)
+        return Mana.mask_has_colors(Mana.get_color_mask(mana_cost), "rakdos")
     def is_golgari(mana_cost):
-        return Mana.is_black(mana_cost) and Mana.is_green(mana_cost)
+        return Mana.mask_has_colors(Mana.get_color_mask(mana_cost), "golgari")
     def is_gruul(mana_cost):
-        return Mana.is_red(mana_cost) and Mana.is_green(mana_cost)
+        return Mana.mask_has_colors(Mana.get_color_mask(mana_cost), "gruul")
     def is_abzan(mana_cost):
-        return Mana.is_white(mana_cost) and Mana.is_black(mana_cost) and Mana.is_green(mana_cost)
+        return Mana.mask_has_colors(Mana.get_color_mask(mana_cost), "abzan")
     def is_bant(mana_cost):
-        return Mana.is_white(mana_cost) and Mana.is_blue(mana_cost) and Mana.is_green(mana_cost)
+        return Mana.mask_has_colors(Mana.get_color_mask(mana_cost), "bant")
     def is_esper(mana_cost):
-        return Mana.is_white(mana_cost) and Mana.is_blue(mana_cost) and Mana.is_black(mana_cost)
+        return Mana.mask_has_colors(Mana.get_color_mask(mana_cost), "esper")
     def is_grixis(mana_cost):
-        return Mana.is_blue(mana_cost) and Mana.is_black(mana_cost) and Mana.is_red(mana_cost)
+        return Mana.mask_has_colors(Mana.get_color_mask(mana_cost), "grixis")
     def is_jeskai(mana_cost):
-        return Mana.is_white(mana_cost) and Mana.is_blue(mana_cost) and Mana.is_red(mana_cost)
+        return Mana.mask_has_colors(Mana.get_color_mask(mana_cost), "jeskai")
     def is_jund(mana_cost):
-        return Mana.is_black(mana_cost) and Mana.is_red(mana_cost) and Mana.is_green(mana_cost)
+        return Mana.mask_has_colors(Mana.get_color_mask(mana_cost), "jund")
     def is_mardu(mana_cost):
-        return Mana.is_white(mana_cost) and Mana.is_black(mana_cost) and Mana.is_red(mana_cost)
+        return Mana.mask_has_colors(Mana.get_color_mask(mana_cost), "mardu")
     def is_naya(mana_cost):
-        return Mana.is_white(mana_cost) and Mana.is_red(mana_cost) and Mana.is_green(mana_cost)
+        return Mana.mask_has_colors(Mana.get_color_mask(mana_cost), "naya")
     def is_sultai(mana_cost):
-        return Mana.is_blue(mana_cost) and Mana.is_black(mana_cost) and Mana.is_green(mana_cost)
+        return Mana.mask_has_colors(Mana.get_color_mask(mana_cost), "sultai")
     def is_temur(mana_cost):
-        return Mana.is_blue(mana_cost) and Mana.is_red(mana_cost) and Mana.is_green(mana_cost)
+        return Mana.mask_has_colors(Mana.get_color_mask(mana_cost), "temur")
     def is_glint(mana_cost):
-        return Mana.is_blue(mana_cost) and Mana.is_black(mana_cost) and Mana.is_red(mana_cost) and Mana.is_green(mana_cost)
+        return Mana.mask_has_colors(Mana.get_color_mask(mana_cost), "glint")
     def is_dune(mana_cost):
-        return Mana.is_white(mana_cost) and Mana.is_black(mana_cost) and Mana.is_red(mana_cost) and Mana.is_green(mana_cost)
+        return Mana.mask_has_colors(Mana.get_color_mask(mana_cost), "dune")
     def is_ink(mana_cost):
-        return Mana.is_white(mana_cost) and Mana.is_blue(mana_cost) and Mana.is_red(mana_cost) and Mana.is_green(mana_cost)
+        return Mana.mask_has_colors(Mana.get_color_mask(mana_cost), "ink")
     def is_witch(mana_cost):
-        return Mana.is_white(mana_cost) and Mana.is_blue(mana_cost) and Mana.is_black(mana_cost) and Mana.is_green(mana_cost)
+        return Mana.mask_has_colors(Mana.get_color_mask(mana_cost), "witch")
     def is_yore(mana_cost):
-        return Mana.is_white(mana_cost) and Mana.is_blue(mana_cost) and Mana.is_black(mana_cost) and Mana.is_red(mana_cost)
+        return Mana.mask_has_colors(Mana.get_color_mask(mana_cost), "yore")
     
     # Sorts the input colors list to WUBRG order.
     # Colors are not wrapped around -- the order is always WUBRG. (e.g., W is always before G)
@@ -188,10 +232,33 @@ class Mana:
         mana_cost = mana_cost.replace("g/2", "2/g")
         return mana_cost
     
+    # Wrap-around order of the mana symbols, used to sort mana costs.
+    # NOTE: when adding new mana symbols to sorted_order, make sure to add them twice for proper wrap-around ordering
+    sorted_order = ["x","y","z","20","19","18","17","16","15","14","13","12","11","10","9","8","7","6","5","4","3","2","1","0","s","c","e","w","2/w","c/w","w/p","w/u","w/u/p","w/b","w/b/p","u","2/u","c/u","u/p","u/b","u/b/p","u/r","u/r/p","b","2/b","c/b","b/p","b/r","b/r/p","b/g","b/g/p","r","2/r","c/r","r/p","r/g","r/g/p","r/w","r/w/p","g","2/g","c/g","g/p","g/w","g/w/p","g/u","g/u/p","w","2/w","c/w","w/p","w/u","w/u/p","w/b","w/b/p","u","2/u","c/u","u/p","u/b","u/b/p","u/r","u/r/p","b","2/b","c/b","b/p","b/r","b/r/p","b/g","b/g/p","r","2/r","c/r","r/p","r/g","r/g/p","r/w","r/w/p","g","2/g","c/g","g/p"]
+    sorted_order_positions = None # Rank table: symbol -> list of its indices in sorted_order. Built on first use.
+    sorted_costs = {} # Results of Mana.sort, memoised per input cost string.
+
+    # Returns the rank table of sorted_order, giving every index at which each symbol appears.
+    def get_sorted_order_positions():
+        if Mana.sorted_order_positions is None:
+            positions = {}
+            for mi, mana_symbol in enumerate(Mana.sorted_order):
+                positions.setdefault(mana_symbol, []).append(mi)
+            Mana.sorted_order_positions = positions
+        return Mana.sorted_order_positions
+
     # Sorts the input mana cost so that wrap-around WUBRG order is reinforced. (e.g, WG --> GW)
+    # Results are memoised per cost string, since the same costs appear over and over in mana costs and rules text.
     def sort(mana_cost):
         if mana_cost is None or type(mana_cost)!=str:
             return None
+        sorted_cost = Mana.sorted_costs.get(mana_cost)
+        if sorted_cost is None:
+            sorted_cost = Mana.sort_uncached(mana_cost)
+            Mana.sorted_costs[mana_cost] = sorted_cost
+        return sorted_cost
+
+    def sort_uncached(mana_cost):
         if mana_cost == "{t}" or mana_cost == "{q}":
             return mana_cost
         mana_cost = Mana.correct_hybrid_symbols(mana_cost.lower())
@@ -199,45 +266,60 @@ class Mana:
         mana_symbols_list = []
         for mana_symbol in mana_symbols.keys():
             mana_symbols_list += [mana_symbol for i in range(mana_symbols[mana_symbol])]
-        mana_symbols_list = sorted(mana_symbols_list, key=cmp_to_key(Mana.compare_two_mana_symbols))
+        symbol_ranks = Mana.get_wrap_around_ranks(list(mana_symbols.keys()))
+        if symbol_ranks is not None:
+            mana_symbols_list = sorted(mana_symbols_list, key=symbol_ranks.get)
+        else:
+            mana_symbols_list = sorted(mana_symbols_list, key=cmp_to_key(Mana.compare_two_mana_symbols))
         mana_symbols_list = ["{"+m+"}" for m in mana_symbols_list]
         return "".join(mana_symbols_list)
-    
+
+    # Returns a dictionary giving the sort key of each of the input (distinct) symbols, or None if compare_two_mana_symbols doesn't order them consistently.
+    # The keys come from rotating sorted_order to start at each of the symbols present in turn, keeping the first rotation that agrees with compare_two_mana_symbols on every pair.
+    # Symbols whose wrap-around distances tie or form a cycle (e.g., W, B and G: each is closer to the next one around the color wheel) have no such rotation, and are sorted with the comparator.
+    def get_wrap_around_ranks(mana_symbols):
+        positions = Mana.get_sorted_order_positions()
+        if len(mana_symbols) <= 1:
+            return {mana_symbol: 0 for mana_symbol in mana_symbols}
+        if any([mana_symbol not in positions for mana_symbol in mana_symbols]):
+            return None
+        first_positions = {mana_symbol: positions[mana_symbol][0] for mana_symbol in mana_symbols}
+        for start in sorted(first_positions.values()):
+            rotated = sorted(mana_symbols, key=lambda m: (first_positions[m] < start, first_positions[m]))
+            if all([Mana.compare_two_mana_symbols(rotated[i], rotated[j]) < 0 and Mana.compare_two_mana_symbols(rotated[j], rotated[i]) > 0 for i in range(len(rotated)) for j in range(i+1, len(rotated))]):
+                return {mana_symbol: i for i, mana_symbol in enumerate(rotated)}
+        return None
+
     # Comparator used to decide which of two input mana symbols comes first in wrap-around WUBRG order.
     # Returns a negative number if mana_symbol_1 comes before mana_symbol_2.
+    # The wrap-around distance from 1 to 2 is measured from the last occurrence of 1 before the first occurrence of 2 that follows any occurrence of 1 in sorted_order (and vice versa).
     def compare_two_mana_symbols(mana_symbol_1, mana_symbol_2):
         mana_symbol_1 = mana_symbol_1.replace("{","").replace("}","")
         mana_symbol_2 = mana_symbol_2.replace("{","").replace("}","")
         if mana_symbol_1 == mana_symbol_2:
             return 0
-        # NOTE: when adding new mana symbols to sorted_order, make sure to add them twice for proper wrap-around ordering
-        sorted_order = ["x","y","z","20","19","18","17","16","15","14","13","12","11","10","9","8","7","6","5","4","3","2","1","0","s","c","e","w","2/w","c/w","w/p","w/u","w/u/p","w/b","w/b/p","u","2/u","c/u","u/p","u/b","u/b/p","u/r","u/r/p","b","2/b","c/b","b/p","b/r","b/r/p","b/g","b/g/p","r","2/r","c/r","r/p","r/g","r/g/p","r/w","r/w/p","g","2/g","c/g","g/p","g/w","g/w/p","g/u","g/u/p","w","2/w","c/w","w/p","w/u","w/u/p","w/b","w/b/p","u","2/u","c/u","u/p","u/b","u/b/p","u/r","u/r/p","b","2/b","c/b","b/p","b/r","b/r/p","b/g","b/g/p","r","2/r","c/r","r/p","r/g","r/g/p","r/w","r/w/p","g","2/g","c/g","g/p"]
-        distance_1_to_2, distance_2_to_1 = len(sorted_order), len(sorted_order)
-        found_first_index = None
-        for mi, mana_symbol in enumerate(sorted_order):
-            if mana_symbol == mana_symbol_1:
-                found_first_index = mi
-            if mana_symbol == mana_symbol_2 and found_first_index is not None:
-                distance_1_to_2 = mi - found_first_index
-                break
-        found_second_index = None
-        for mi, mana_symbol in enumerate(sorted_order):
-            if mana_symbol == mana_symbol_2:
-                found_second_index = mi
-            if mana_symbol == mana_symbol_1 and found_second_index is not None:
-                distance_2_to_1 = mi - found_second_index
-                break
-        if found_first_index is None and found_second_index is None: # Two unrecognized symbols:
+        positions = Mana.get_sorted_order_positions()
+        positions_1, positions_2 = positions.get(mana_symbol_1), positions.get(mana_symbol_2)
+        if positions_1 is None and positions_2 is None: # Two unrecognized symbols:
             return 0
-        if found_first_index is None: # Unrecognized symbol always at the beginning
+        if positions_1 is None: # Unrecognized symbol always at the beginning
             return -1
-        if found_second_index is None: # Unrecognized symbol always at the beginning
+        if positions_2 is None: # Unrecognized symbol always at the beginning
             return 1
+        distance_1_to_2 = Mana.get_wrap_around_distance(positions_1, positions_2)
+        distance_2_to_1 = Mana.get_wrap_around_distance(positions_2, positions_1)
         if distance_1_to_2 <= distance_2_to_1: # 1 comes before 2
             return -1 * distance_1_to_2
         else: # 2 comes before 1
             return distance_2_to_1
 
+    # Returns the distance in sorted_order from a symbol at positions_1 to the next symbol at positions_2 (len(sorted_order) if there is none).
+    def get_wrap_around_distance(positions_1, positions_2):
+        following = [p2 for p2 in positions_2 if p2 > positions_1[0]]
+        if len(following) == 0:
+            return len(Mana.sorted_order)
+        return following[0] - max([p1 for p1 in positions_1 if p1 < following[0]])
+
 class Set:
     # Whenever a new custom set is created with a default setname conflicting with an existing setname, add that original and replacement setname as a key-value pair to the dictionary below. 
     forbidden_custom_set_names = {"ANA":"ANK"}
@@ -267,7 +349,12 @@ class AbilityElements:
 class Card:
     supertypes = ["token", "legendary", "basic", "snow"]
     cardtypes  = ["artifact", "enchantment", "land", "creature", "planeswalker", "instant", "sorcery", "battle"]
+    # Card types and supertypes are represented as bit flags, one bit per entry of Card.cardtypes and Card.supertypes.
+    supertype_bits = {supertype:1<<i for i, supertype in enumerate(supertypes)}
+    cardtype_bits = {cardtype:1<<i for i, cardtype in enumerate(cardtypes)}
+    spell_cardtypes_mask = sum([bit for cardtype, bit in cardtype_bits.items() if cardtype!="land"])
     basic_lands = ["plains", "island", "swamp", "mountain", "forest", "wastes"]
+    number_words = None # See Card.get_number_words
 
     rarities = ["common", "uncommon", "rare", "mythic"]
 
@@ -294,6 +381,16 @@ class Card:
         if supertype_string[-1]==" ":
             supertype_string = supertype_string[0:-1]
         return supertype_string
+    # Returns the bit flags of the types (from type_bits, e.g. Card.cardtype_bits) whose names appear in the input type string.
+    def get_type_mask(type_string, type_bits):
+        if type_string is None:
+            return 0
+        type_string = type_string.lower()
+        mask = 0
+        for typ, bit in type_bits.items():
+            if typ in type_string:
+                mask |= bit
+        return mask
 
     # special: front or transform-front, back or transform-back, mdfc-front, mdfc-back (later add adventure, ...)
     # related_indicator: Text/mana cost to be written on an indicator of the opposite side of the card. If omitted, default text/mana value is computed from the card's "related" field if present and if special is mdfc/transform. Otherwise, indicator is omitted.
@@ -364,7 +461,7 @@ class Card:
             complete = int(complete)
         elif type(complete)==str:
             try:
-                complete = int(str)
+                complete = int(complete)
             except:
                 raise ValueError("Could not convert complete to an integer.")
         if real is not None and type(real)!=int and type(real)!=bool and type(real)!=str:
@@ -373,34 +470,53 @@ class Card:
             real = int(real)
         elif type(real)==str:
             try:
-                real = int(str)
+                real = int(real)
             except:
                 raise ValueError("Could not convert real to an integer.")
-        self.name=name
-        self.artist=artist
-        self.artwork=artwork
-        self.setname = setname if real else Set.adjust_forbidden_custom_setname(setname)
-        self.mana = Mana.sort(mana)
-        self.subtype=subtype
-        self.power=power
-        self.toughness=toughness
-        self.rarity=rarity
-        self.rules = Card.sort_rules_text_mana_symbols(rules)
-        self.rules1 = Card.sort_rules_text_mana_symbols(rules1)
-        self.rules2 = Card.sort_rules_text_mana_symbols(rules2)
-        self.rules3 = Card.sort_rules_text_mana_symbols(rules3)
-        self.rules4 = Card.sort_rules_text_mana_symbols(rules4)
-        self.rules5 = Card.sort_rules_text_mana_symbols(rules5)
-        self.rules6 = Card.sort_rules_text_mana_symbols(rules6)
-        self.flavor=flavor
-        self.special=special
-        self.related=related
-        self.related_indicator=related_indicator
-        self.tags=tags
-        self.complete=complete
-        self.supertype=Card.get_supertype_from_cardtype(cardtype)
-        self.cardtype=Card.filter_supertypes_from_cardtype(cardtype)
-        self.colors = self.get_colors() if colors is None else colors
+        self.set_record({"name": name, "artist": artist, "artwork": artwork, "setname": setname, "mana": mana, "cardtype": cardtype, "subtype": subtype,
+                         "power": power, "toughness": toughness, "rarity": rarity, "rules": rules, "rules1": rules1, "rules2": rules2, "rules3": rules3,
+                         "rules4": rules4, "rules5": rules5, "rules6": rules6, "flavor": flavor, "special": special, "related": related,
+                         "related_indicator": related_indicator, "colors": colors, "tags": tags, "complete": complete, "real": real, "frame": frame})
+
+    # Builds a Card from a record that was already validated and converted (see card_schema), without checking its fields again.
+    def from_record(record):
+        card = Card.__new__(Card)
+        card.set_record(record)
+        return card
+
+    # Sets every attribute of the card from the input record, a dictionary with one entry per input of Card.__init__ (see card_schema.CARD_SCHEMA).
+    def set_record(self, record):
+        self.name=record["name"]
+        self.artist=record["artist"]
+        self.artwork=record["artwork"]
+        self.setname = record["setname"] if record["real"] else Set.adjust_forbidden_custom_setname(record["setname"])
+        self.mana = Mana.sort(record["mana"])
+        self.subtype=record["subtype"]
+        self.power=record["power"]
+        self.toughness=record["toughness"]
+        self.rarity=record["rarity"]
+        self.rules = Card.sort_rules_text_mana_symbols(record["rules"])
+        self.rules1 = Card.sort_rules_text_mana_symbols(record["rules1"])
+        self.rules2 = Card.sort_rules_text_mana_symbols(record["rules2"])
+        self.rules3 = Card.sort_rules_text_mana_symbols(record["rules3"])
+        self.rules4 = Card.sort_rules_text_mana_symbols(record["rules4"])
+        self.rules5 = Card.sort_rules_text_mana_symbols(record["rules5"])
+        self.rules6 = Card.sort_rules_text_mana_symbols(record["rules6"])
+        self.flavor=record["flavor"]
+        self.special=record["special"]
+        self.related=record["related"]
+        self.related_indicator=record["related_indicator"]
+        self.tags=record["tags"]
+        self.complete=record["complete"]
+        self.real=record["real"]
+        self.supertype=Card.get_supertype_from_cardtype(record["cardtype"])
+        self.cardtype=Card.filter_supertypes_from_cardtype(record["cardtype"])
+        self.supertype_mask = Card.get_type_mask(self.supertype, Card.supertype_bits)
+        self.cardtype_mask = Card.get_type_mask(self.cardtype, Card.cardtype_bits)
+        self.colors = self.get_colors() if record["colors"] is None else record["colors"]
+        self.mana_color_mask = Mana.get_color_mask(self.mana) # Colors of the mana cost
+        self.color_mask = Mana.colors_to_mask(self.colors) # Colors of the card (given by the colors input for tokens and cards without a mana cost)
+        frame = record["frame"]
         if frame is not None and type(frame)==str and frame.endswith(".jpg"):
             if frame in os.listdir("."):
                 self.frame = frame
@@ -411,6 +527,23 @@ class Card:
         else:
             self.frame = self.get_frame_filename(CARD_BORDERS_PATH)
 
+    # Returns the card as a dictionary in the deck JSON format. Fields that are None or 0, and the colors and frame the card would compute by itself, are omitted.
+    def to_dict(self):
+        card_dict = {}
+        cardtype = self.cardtype if self.supertype is None else self.supertype + " " + self.cardtype
+        for key, value in [("name", self.name), ("artist", self.artist), ("artwork", self.artwork), ("setname", self.setname), ("mana", self.mana), ("cardtype", cardtype),
+                           ("subtype", self.subtype), ("power", self.power), ("toughness", self.toughness), ("rarity", self.rarity), ("rules", self.rules),
+                           ("rules1", self.rules1), ("rules2", self.rules2), ("rules3", self.rules3), ("rules4", self.rules4), ("rules5", self.rules5), ("rules6", self.rules6),
+                           ("flavor", self.flavor), ("special", self.special), ("related", self.related), ("related_indicator", self.related_indicator), ("tags", self.tags),
+                           ("complete", self.complete), ("real", self.real)]:
+            if value is not None and value != 0:
+                card_dict[key] = value
+        if self.colors != ([] if self.is_token() else Mana.get_colors(self.mana)):
+            card_dict["colors"] = self.colors
+        if self.frame != self.get_frame_filename(CARD_BORDERS_PATH):
+            card_dict["frame"] = os.path.basename(self.frame)
+        return card_dict
+
     def get_colors(self):
         if self.is_token():
             try:
@@ -420,94 +553,79 @@ class Card:
         else:
             return Mana.get_colors(self.mana)
     def is_monocolored(self):
-        return Mana.is_monocolored(self.mana)
+        return Mana.color_counts[self.mana_color_mask]==1
     def is_colorless(self):
-        return Mana.is_colorless(self.mana)
+        return Mana.color_counts[self.mana_color_mask]==0
     def is_multicolored(self):
-        return Mana.is_multicolored(self.mana)
+        return Mana.color_counts[self.mana_color_mask]>1
     def is_bicolored(self):
-        return Mana.is_bicolored(self.mana)
+        return Mana.color_counts[self.mana_color_mask]==2
     def is_tricolored(self):
-        return Mana.is_tricolored(self.mana)
+        return Mana.color_counts[self.mana_color_mask]==3
     def is_quadcolored(self):
-        return Mana.is_quadcolored(self.mana)
+        return Mana.color_counts[self.mana_color_mask]==4
     def is_pentacolored(self):
-        return Mana.is_pentacolored(self.mana)
+        return Mana.color_counts[self.mana_color_mask]==5
     def is_white(self):
-        if self.is_token():
-            return 'w' in self.colors
-        else:
-            return Mana.is_white(self.mana)
+        return (self.color_mask if self.is_token() else self.mana_color_mask) & Mana.color_bits['w'] != 0
     def is_blue(self):
-        if self.is_token():
-            return 'u' in self.colors
-        else:
-            return Mana.is_blue(self.mana)
+        return (self.color_mask if self.is_token() else self.mana_color_mask) & Mana.color_bits['u'] != 0
     def is_black(self):
-        if self.is_token():
-            return 'b' in self.colors
-        else:
-            return Mana.is_black(self.mana)
+        return (self.color_mask if self.is_token() else self.mana_color_mask) & Mana.color_bits['b'] != 0
     def is_red(self):
-        if self.is_token():
-            return 'r' in self.colors
-        else:
-            return Mana.is_red(self.mana)
+        return (self.color_mask if self.is_token() else self.mana_color_mask) & Mana.color_bits['r'] != 0
     def is_green(self):
-        if self.is_token():
-            return 'g' in self.colors
-        else:
-            return Mana.is_green(self.mana)
+        return (self.color_mask if self.is_token() else self.mana_color_mask) & Mana.color_bits['g'] != 0
     def is_azorius(self):
-        return Mana.is_azorius(self.mana)
+        return Mana.mask_has_colors(self.mana_color_mask, "azorius")
     def is_orzhov(self):
-        return Mana.is_orzhov(self.mana)
+        return Mana.mask_has_colors(self.mana_color_mask, "orzhov")
     def is_boros(self):
-        return Mana.is_boros(self.mana)
+        return Mana.mask_has_colors(self.mana_color_mask, "boros")
     def is_selesnya(self):
-        return Mana.is_selesnya(self.mana)
+        return Mana.mask_has_colors(self.mana_color_mask, "selesnya")
     def is_dimir(self):
-        return Mana.is_dimir(self.mana)
+        return Mana.mask_has_colors(self.mana_color_mask, "dimir")
     def is_izzet(self):
-        return Mana.is_izzet(self.mana)
+        return Mana.mask_has_colors(self.mana_color_mask, "izzet")
     def is_simic(self):
-        return Mana.is_simic(self.mana)
+        return Mana.mask_has_colors(self.mana_color_mask, "simic")
     def is_rakdos(self):
-        return Mana.is_rakdos(self.mana)
+        return Mana.mask_has_colors(self.mana_color_mask, "rakdos")
     def is_golgari(self):
-        return Mana.is_golgari(self.mana)
+        return Mana.mask_has_colors(self.mana_color_mask, "golgari")
     def is_gruul(self):
-        return Mana.is_gruul(self.mana)
+        return Mana.mask_has_colors(self.mana_color_mask, "gruul")
     def is_abzan(self):
-        return Mana.is_abzan(self.mana)
+        return Mana.mask_has_colors(self.mana_color_mask, "abzan")
     def is_bant(self):
-        return Mana.is_bant(self.mana)
+        return Mana.mask_has_colors(self.mana_color_mask, "bant")
     def is_esper(self):
-        return Mana.is_esper(self.mana)
+        return Mana.mask_has_colors(self.mana_color_mask, "esper")
     def is_grixis(self):
-        return Mana.is_grixis(self.mana)
+        return Mana.mask_has_colors(self.mana_color_mask, "grixis")
     def is_jeskai(self):
-        return Mana.is_jeskai(self.mana)
+        return Mana.mask_has_colors(self.mana_color_mask, "jeskai")
     def is_jund(self):
-        return Mana.is_jund(self.mana)
+        return Mana.mask_has_colors(self.mana_color_mask, "jund")
     def is_mardu(self):
-        return Mana.is_mardu(self.mana)
+        return Mana.mask_has_colors(self.mana_color_mask, "mardu")
     def is_naya(self):
-        return Mana.is_naya(self.mana)
+        return Mana.mask_has_colors(self.mana_color_mask, "naya")
     def is_sultai(self):
-        return Mana.is_sultai(self.mana)
+        return Mana.mask_has_colors(self.mana_color_mask, "sultai")
     def is_temur(self):
-        return Mana.is_temur(self.mana)
+        return Mana.mask_has_colors(self.mana_color_mask, "temur")
     def is_glint(self):
-        return Mana.is_glint(self.mana)
+        return Mana.mask_has_colors(self.mana_color_mask, "glint")
     def is_dune(self):
-        return Mana.is_dune(self.mana)
+        return Mana.mask_has_colors(self.mana_color_mask, "dune")
     def is_ink(self):
-        return Mana.is_ink(self.mana)
+        return Mana.mask_has_colors(self.mana_color_mask, "ink")
     def is_witch(self):
-        return Mana.is_witch(self.mana)
+        return Mana.mask_has_colors(self.mana_color_mask, "witch")
     def is_yore(self):
-        return Mana.is_yore(self.mana)
+        return Mana.mask_has_colors(self.mana_color_mask, "yore")
     
     # Returns a list with each color of mana (among WUBRG) that the card produces, if this card is a land.
     # Colors of mana in the costs of abilities are not considered -- only colors that the land itself produces.
@@ -541,21 +659,21 @@ class Card:
         return Mana.get_colors_in_text(rules)
     
     def is_land(self):
-        return "land" in self.cardtype.lower()
+        return self.cardtype_mask & Card.cardtype_bits["land"] != 0
     def is_creature(self):
-        return "creature" in self.cardtype.lower()
+        return self.cardtype_mask & Card.cardtype_bits["creature"] != 0
     def is_artifact(self):
-        return "artifact" in self.cardtype.lower()
+        return self.cardtype_mask & Card.cardtype_bits["artifact"] != 0
     def is_enchantment(self):
-        return "enchantment" in self.cardtype.lower()
+        return self.cardtype_mask & Card.cardtype_bits["enchantment"] != 0
     def is_planeswalker(self):
-        return "planeswalker" in self.cardtype.lower()
+        return self.cardtype_mask & Card.cardtype_bits["planeswalker"] != 0
     def is_instant(self):
-        return "instant" in self.cardtype.lower()
+        return self.cardtype_mask & Card.cardtype_bits["instant"] != 0
     def is_sorcery(self):
-        return "sorcery" in self.cardtype.lower()
+        return self.cardtype_mask & Card.cardtype_bits["sorcery"] != 0
     def is_battle(self):
-        return "battle" in self.cardtype.lower()
+        return self.cardtype_mask & Card.cardtype_bits["battle"] != 0
 
     def is_saga(self):
         return False if self.subtype is None else (self.is_enchantment() and "saga" in self.subtype.lower())
@@ -563,13 +681,13 @@ class Card:
         return False if self.subtype is None else (self.is_artifact() and "vehicle" in self.subtype.lower())
 
     def is_token(self):
-        return False if self.supertype is None else ("token" in self.supertype.lower())
+        return self.supertype_mask & Card.supertype_bits["token"] != 0
     def is_legendary(self):
-        return False if self.supertype is None else ("legendary" in self.supertype.lower())
+        return self.supertype_mask & Card.supertype_bits["legendary"] != 0
     def is_snow(self):
-        return False if self.supertype is None else ("snow" in self.supertype.lower())
+        return self.supertype_mask & Card.supertype_bits["snow"] != 0
     def is_basic(self):
-        return False if self.supertype is None else ("basic" in self.supertype.lower())
+        return self.supertype_mask & Card.supertype_bits["basic"] != 0
 
     def is_transform(self):
         special = self.special.lower() if type(self.special)==str else None
@@ -579,7 +697,7 @@ class Card:
         return "mdfc" in special
     
     def is_spell(self):
-        return (not self.is_land()) and (self.is_creature() or self.is_artifact() or self.is_enchantment() or self.is_planeswalker() or self.is_instant() or self.is_sorcery() or self.is_battle())
+        return (not self.is_land()) and (self.cardtype_mask & Card.spell_cardtypes_mask != 0)
 
     # Sorts any groups of mana symbols by wrap-around WUBRG order.
     def sort_rules_text_mana_symbols(rules):
@@ -638,32 +756,13 @@ class Card:
                 filename = Mana.sort("{"+colors[0].lower().strip()+"}" + "{"+colors[1].lower().strip()+"}").replace("{","").replace("}","")
             elif len(colors)>=3:
                 filename = "m"
-        elif self.is_tricolored() or self.is_quadcolored() or self.is_pentacolored():
+        elif Mana.color_counts[self.mana_color_mask]>=3:
             filename = "m"
-        elif self.is_bicolored():
-            if self.is_azorius():
-                filename = "wu"
-            elif self.is_orzhov():
-                filename = "wb"
-            elif self.is_boros():
-                filename = "rw"
-            elif self.is_selesnya():
-                filename = "gw"
-            elif self.is_dimir():
-                filename = "ub"
-            elif self.is_izzet():
-                filename = "ur"
-            elif self.is_simic():
-                filename = "gu"
-            elif self.is_rakdos():
-                filename = "br"
-            elif self.is_golgari():
-                filename = "bg"
-            elif self.is_gruul():
-                filename = "rg"
-        elif self.is_monocolored():
+        elif Mana.color_counts[self.mana_color_mask]==2:
+            filename = Mana.color_pair_frame_names[self.mana_color_mask]
+        elif Mana.color_counts[self.mana_color_mask]==1:
             filename = self.colors[0]
-        elif self.is_colorless():
+        else:
             filename = "c"
         filename += "_"
         # Manage special frames: (TODO -- add support for other special frames)
@@ -736,6 +835,13 @@ class Card:
             filename = os.path.join(card_borders_folder, filename)
         return filename
     
+    # Returns the set of number words from "zero" to "one hundred", as used to count tokens in rules text. num2words is only imported the first time.
+    def get_number_words():
+        if Card.number_words is None:
+            from num2words import num2words
+            Card.number_words = set(num2words(n) for n in range(101))
+        return Card.number_words
+
     def get_tokens(self):
         st0, ct0 = Card.get_tokens_from_rules_text(self.rules,  card_name=self.name, complete=self.complete)
         st1, ct1 = Card.get_tokens_from_rules_text(self.rules1, card_name=self.name, complete=self.complete)
@@ -755,8 +861,7 @@ class Card:
         # Helper function. Returns True if the input word (or pair of words) represents a numeric quantity -- e.g., "a", "an", "x", "one", "two", "three", "that many"
         # The second word is ignored except to compare the combination of word1 and word2 against "that many".
         def is_number_word(word1, word2=""):
-            number_words = ["a", "an", "x"] + [num2words(n) for n in range(101)]
-            return (word1.lower() in number_words) or ((word1.strip() + " " + word2.strip()).strip() == "that many")
+            return (word1.lower() in ["a", "an", "x"]) or (word1.lower() in Card.get_number_words()) or ((word1.strip() + " " + word2.strip()).strip() == "that many")
         if rules_text is None or len(rules_text) == 0:
             return [], []
         specialized_tokens, common_tokens = [], []
@@ -880,7 +985,7 @@ class Card:
                                                                                             (word.lower().replace(',','').replace('.','') != name.lower()) and
                                                                                             (word.lower().replace(',','').replace('.','') not in [we.lower() for we in words_to_exclude_from_names_and_subtypes]) and
                                                                                             (word.lower().replace(',','').replace('.','') not in Card.cardtypes) and
-                                                                                            (word.lower().replace(',','').replace('.','') not in [num2words(n) for n in range(101)]) and
+                                                                                            (word.lower().replace(',','').replace('.','') not in Card.get_number_words()) and
                                                                                             (word.lower().replace(',','').replace('.','') not in ["legendary", "colorless", "tapped", "x", "a", "an", "and"]) and
                                                                                             (word.lower().replace(',','').replace('.','') not in colors_dict.keys()))]).title()
             subtype = subtype.lower().replace("that many","").strip().title()
@@ -1076,136 +1181,88 @@ class Deck:
     def from_json(deck_json_filepath, setname="UNK", deck_name=None):
         f = open(deck_json_filepath)
         card_dict = json.load(f)
-        basics_dict = {}
-        common_tokens = []
+        deck_name = os.path.basename(deck_json_filepath).replace(".json","") if deck_name is None else deck_name
+        return Deck.from_dict(card_dict, setname=setname, deck_name=deck_name)
+
+    # Builds a Deck from a dictionary in the same format as a deck JSON file (card keys mapping to card dictionaries, plus the optional _basics and _common_tokens entries).
+    # Every card is validated and defaulted by card_schema first. If any card is invalid, raises a ValueError listing every problem found.
+    def from_dict(card_dict, setname="UNK", deck_name="Unknown"):
+        records, basics_dict, common_tokens, errors = card_schema.validate_deck_dict(card_dict, setname)
+        if len(errors) > 0:
+            raise ValueError(card_schema.format_errors(errors, deck_name))
+        records_by_name = {}
+        for _, record in records:
+            records_by_name.setdefault(record["name"], record)
         tags = []
-        for keyname, card in card_dict.items():
-            if keyname.lower() == "_basics":
-                basics_dict = card
-                continue
-            if keyname.lower() == "_common_tokens":
-                common_tokens = card
-                continue
-            if "artist" not in card.keys():
-                card["artist"]=None
-            if "artwork" not in card.keys():
-                card["artwork"]=None
-            if "setname" not in card.keys():
-                card["setname"]=setname
-            if "mana" not in card.keys():
-                card["mana"]=None
-            if "cardtype" not in card.keys():
-                card["cardtype"]=None
-            if "subtype" not in card.keys():
-                card["subtype"]=None
-            if "power" not in card.keys():
-                card["power"]=None
-            if "toughness" not in card.keys():
-                card["toughness"]=None
-            if "rarity" not in card.keys():
-                card["rarity"]=None
-            if "rules" not in card.keys():
-                card["rules"]=None
-            if "rules1" not in card.keys():
-                card["rules1"]=None
-            if "rules2" not in card.keys():
-                card["rules2"]=None
-            if "rules3" not in card.keys():
-                card["rules3"]=None
-            if "rules4" not in card.keys():
-                card["rules4"]=None            
-            if "rules5" not in card.keys():
-                card["rules5"]=None            
-            if "rules6" not in card.keys():
-                card["rules6"]=None
-            if "flavor" not in card.keys():
-                card["flavor"]=None
-            if "special" not in card.keys(): 
-                card["special"]=None
-            if "related_indicator" not in card.keys():
-                card["related_indicator"]=None
-            if "related" not in card.keys():
-                card["related"]=None
-            elif (card["special"] is not None) and (("mdfc" in card["special"].lower()) or ("transform" in card["special"].lower())) and (card["related_indicator"] is None):
-                related_name, related_mana = "", ""
-                # TODO -- this land stuff isn't super accurate, since the back side could have something other than {t}: Add x. Really it should read in the rules text and decide what to show.
-                for keyname2, card2 in card_dict.items():
-                    if keyname2.lower() == "_basics":
-                        continue
-                    if card2["name"] == card["related"]:
-                        related_name = card2["name"] if "name" in card2.keys() else ""
-                        if ("mana" not in card2.keys()) or len(card2["mana"])==0:
-                            if "land" in card2["cardtype"].lower():
-                                related_colors = Mana.get_colors_produced_by_land(card2["rules"])
-                                related_mana = "{t}: Add "
-                                for ci, c in enumerate(related_colors):
-                                    related_mana += "{"+c+"}"
-                                    if (ci==0) and len(related_colors)==2:
-                                        related_mana += " or "
-                                    elif len(related_colors)==3 and (ci == 0):
-                                        related_mana += ", "
-                                    elif len(related_colors)==3 and (ci == 1):
-                                        related_mana += ", or "
-                                related_mana += "."
-                            else:
-                                related_mana = ""
-                        else:
-                            related_mana = card2["mana"]
-                        break
-                card["related_indicator"]=related_name+" "+related_mana
-            if "colors" not in card.keys():
-                card["colors"]=None
-            if "tags" not in card.keys():
-                card["tags"]=None
-            if "complete" not in card.keys():
-                card["complete"]=0
-            if "real" not in card.keys():
-                card["real"]=0
-            if card["tags"] is not None:
-                for tag in card["tags"]:
+        for keyname, record in records:
+            if ("related" in card_dict[keyname].keys()) and (record["special"] is not None) and (("mdfc" in record["special"].lower()) or ("transform" in record["special"].lower())) and (record["related_indicator"] is None):
+                related_record = records_by_name.get(record["related"]) if type(record["related"])==str else None
+                record["related_indicator"] = Deck.get_related_indicator(related_record)
+            if record["tags"] is not None:
+                for tag in record["tags"]:
                     if tag not in tags:
                         tags.append(tag)
-            if "frame" not in card.keys():
-                card["frame"]=None
-        cards = [Card(name=card["name"],
-                      artist=card["artist"],
-                      artwork=card["artwork"],
-                      setname=card["setname"],
-                      mana=card["mana"],
-                      cardtype=card["cardtype"],
-                      subtype=card["subtype"],
-                      power=card["power"],
-                      toughness=card["toughness"],
-                      rarity=card["rarity"],
-                      rules=card["rules"],
-                      rules1=card["rules1"],
-                      rules2=card["rules2"],
-                      rules3=card["rules3"],
-                      rules4=card["rules4"],
-                      rules5=card["rules5"],
-                      rules6=card["rules6"],
-                      flavor=card["flavor"],
-                      special=card["special"],
-                      related=card["related"],
-                      related_indicator=card["related_indicator"],
-                      colors=card["colors"],
-                      tags=card["tags"],
-                      complete=card["complete"],
-                      real=card["real"],
-                      frame=card["frame"])
-                  for keyname, card in card_dict.items() if (keyname.lower() != "_basics") and (keyname.lower() != "_common_tokens")]
-        deck_name = os.path.basename(deck_json_filepath).replace(".json","") if deck_name is None else deck_name
+        cards = [Card.from_record(record) for _, record in records]
         return Deck(cards=cards, name=deck_name, tags=tags, basics_dict=basics_dict, common_tokens=common_tokens)
 
-    def from_deck_folder(deck_folder):
+    # Returns the default indicator of a MDFC or transform card whose other side is the card of the input record (None if it is not in the deck): its name and mana cost,
+    # or for a land without a mana cost, the mana it adds.
+    def get_related_indicator(related_record):
+        if related_record is None:
+            return " "
+        related_name = related_record["name"] if related_record["name"] is not None else ""
+        # TODO -- this land stuff isn't super accurate, since the back side could have something other than {t}: Add x. Really it should read in the rules text and decide what to show.
+        if related_record["mana"] is None or len(related_record["mana"])==0:
+            if related_record["cardtype"] is not None and "land" in related_record["cardtype"].lower():
+                related_colors = Mana.get_colors_produced_by_land(related_record["rules"])
+                related_mana = "{t}: Add "
+                for ci, c in enumerate(related_colors):
+                    related_mana += "{"+c+"}"
+                    if (ci==0) and len(related_colors)==2:
+                        related_mana += " or "
+                    elif len(related_colors)==3 and (ci == 0):
+                        related_mana += ", "
+                    elif len(related_colors)==3 and (ci == 1):
+                        related_mana += ", or "
+                related_mana += "."
+            else:
+                related_mana = ""
+        else:
+            related_mana = related_record["mana"]
+        return related_name+" "+related_mana
+
+    # Builds a Deck from a card store (see card_store.CardStore). If tokens is True, builds the deck of its tokens instead (named <deck name>_Tokens).
+    def from_store(store, deck_name, tokens=False):
+        card_dict = store.get_deck_dict(deck_name, tokens=tokens)
+        if card_dict is None:
+            raise ValueError(f"The deck {deck_name} is not in the card store {store.path}.")
+        return Deck.from_dict(card_dict, setname=store.get_setname(deck_name), deck_name=deck_name+"_Tokens" if tokens else deck_name)
+
+    # Returns the set name used for the cards of the deck in the input folder.
+    def get_setname_from_deck_folder(deck_folder):
         setname = (deck_folder.lower().replace("the ",""))[0:3].upper()
-        setname = Set.adjust_forbidden_custom_setname(setname)
+        return Set.adjust_forbidden_custom_setname(setname)
+
+    def from_deck_folder(deck_folder):
+        setname = Deck.get_setname_from_deck_folder(deck_folder)
         deck_folder = ' '.join(word[0].upper() + word[1:] for word in deck_folder.split())
         if not os.path.isdir(deck_folder):
             raise ValueError(f"The input deck folder ({deck_folder}) does not exist. Ensure a folder exists of the input name in the path defined by DECK_PATH in paths.py.")
-        deck_json_filepath = os.path.join(deck_folder, (os.path.basename(deck_folder).replace(" ", "_") + ".json"))
+        deck_json_filepath = Deck.get_deck_json_filepath(deck_folder)
         return Deck.from_json(deck_json_filepath, setname=setname) # , deck_name=deck_folder
 
+    # Returns the names of the deck folders in deck_path, i.e. every folder containing a <folder name>.json deck file.
+    def find_deck_names(deck_path=DECK_PATH):
+        deck_names = []
+        for folder in sorted(os.listdir(deck_path)):
+            if os.path.isfile(Deck.get_deck_json_filepath(os.path.join(deck_path, folder))):
+                deck_names.append(folder)
+        return deck_names
+
+    # Returns the path of the deck JSON file inside the input deck folder.
+    def get_deck_json_filepath(deck_folder):
+        return os.path.join(deck_folder, (os.path.basename(deck_folder).replace(" ", "_") + ".json"))
+
     def __init__(self, cards=[], name="Unknown", tags=[], basics_dict={}, common_tokens=[]):
         if any([type(c)!=Card for c in cards]):
             raise TypeError("All inputs must be of type Card.")
@@ -1217,6 +1274,19 @@ class Deck:
         self.basics_dict = basics_dict
         self.common_tokens = common_tokens
 
+    # Returns the deck as a dictionary in the deck JSON format.
+    def to_dict(self):
+        card_dict = {card.name:card.to_dict() for card in self.cards}
+        if len(self.basics_dict) > 0:
+            card_dict["_basics"] = self.basics_dict
+        if len(self.common_tokens) > 0:
+            card_dict["_common_tokens"] = self.common_tokens
+        return card_dict
+
+    # Writes the deck to a card store (see card_store.CardStore). Returns the number of rows added, changed or deleted.
+    def to_store(self, store, setname="UNK"):
+        return store.put_deck(self.name, self.to_dict(), setname=setname)
+
     def count_spells(self):
         return sum([card.is_spell() for card in self.cards])
     
@@ -1230,8 +1300,9 @@ class Deck:
                 continue
             if not count_backs and card.special is not None and "back" in card.special.lower():
                 continue
-            for thistype in card.cardtype.split():
-                cardtypes_dict[thistype.capitalize()] += 1
+            for cardtype, bit in Card.cardtype_bits.items():
+                if card.cardtype_mask & bit:
+                    cardtypes_dict[cardtype.capitalize()] += 1
         return cardtypes_dict
 
     def print_type_summary(self):
@@ -1281,22 +1352,16 @@ class Deck:
     def print_color_summary(self):
         print()
         print("COLOR SUMMARY FOR: ", self.name, ".....................")
-        deck_colors = []
-        mana_symbol_dict = {}
+        mana_symbol_dict = {color:0 for color in Mana.color_bits.keys()}
+        deck_color_mask = 0
         for card in self.cards:
             if not card.is_spell():
                 continue
-            for color in card.colors:
-                if color not in deck_colors:
-                    deck_colors.append(color)
-                if color in mana_symbol_dict.keys():
-                    mana_symbol_dict[color] += 1
-                else:
-                    mana_symbol_dict[color] = 1
-        total_mana_symbols = 0
-        for color in mana_symbol_dict.keys():
-            total_mana_symbols += mana_symbol_dict[color]
-        deck_colors = Mana.colors_to_wubrg_order(deck_colors)
+            deck_color_mask |= card.color_mask
+            for color in Mana.mask_colors[card.color_mask]:
+                mana_symbol_dict[color] += 1
+        total_mana_symbols = sum(mana_symbol_dict.values())
+        deck_colors = Mana.mask_colors[deck_color_mask]
         print("All deck colors: ", deck_colors)
         for color in deck_colors:
             print("\t", color, "spells: ", round(mana_symbol_dict[color]*100/total_mana_symbols, 1), "%")
@@ -1326,10 +1391,10 @@ class Deck:
         print("Average Mana Value (Excluding Lands):", round(total_deck_mana_value / self.count_spells(), 3))
         print()
 
-    # Obtains a list of tokens and writes it to tokens.json in the deck's save path.
-    def get_tokens(self, save_path=None):
+    # Returns the tokens made by the rules text of the input cards as a deck dictionary (in the format of a tokens JSON file), without writing anything.
+    def get_tokens_dict(cards):
         all_tokens, all_common_tokens = [], []
-        for card in self.cards:
+        for card in cards:
             this_card_specialized_tokens, this_card_common_tokens = card.get_tokens()
             all_tokens += this_card_specialized_tokens
             all_common_tokens += this_card_common_tokens
@@ -1358,20 +1423,76 @@ class Deck:
         all_tokens = unique_tokens(all_tokens)
         all_tokens = [{k: d[k] for k in ["name","cardtype","subtype","rules","power","toughness","frame","complete","related"] if k in d} for d in all_tokens] 
         all_common_tokens = list(set(all_common_tokens)) 
-        print(f"\nFound {len(all_tokens)} token with names:", [token["name"] for token in all_tokens])
-        if len(all_common_tokens)>0:
-            print(f"Found {len(all_common_tokens)} common tokens: {all_common_tokens}")
         tokens_dict = {"_TOKEN_"+d['name']: d for d in all_tokens}
         if len(all_common_tokens)>0:
             tokens_dict["_COMMON_TOKENS"] = all_common_tokens
+        return tokens_dict
+
+    # Returns True if the tokens JSON file at the input path was edited by hand after it was last written by Deck.get_tokens, and differs
+    # from the input tokens dictionary. Its tokens are then used instead of the ones made by the rules text.
+    def is_tokens_json_edited(tokens_json_filepath, tokens_dict):
+        if not os.path.isfile(tokens_json_filepath):
+            return False
+        generated_hash = Deck.load_generated_tokens_hashes().get(os.path.abspath(tokens_json_filepath))
+        with open(tokens_json_filepath, 'rb') as json_file:
+            current_hash = hashlib.sha1(json_file.read()).hexdigest()
+        return generated_hash is not None and current_hash != generated_hash and current_hash != hashlib.sha1(json.dumps(tokens_dict, indent=4).encode("utf-8")).hexdigest()
+
+    # Returns the tokens made by the rules text of the cards of the deck (see Deck.get_tokens_dict) as a Deck named <deck name>_Tokens, built in
+    # memory, and writes them behind to <deck name>_Tokens.json in the deck's save path (only when its content changes). If that file was edited by
+    # hand after it was last generated, it is left as is and its tokens are returned instead. Delete it to generate it again.
+    def get_tokens(self, save_path=None):
+        tokens_dict = Deck.get_tokens_dict(self.cards)
+        token_names = [token["name"] for key, token in tokens_dict.items() if key != "_COMMON_TOKENS"]
+        all_common_tokens = tokens_dict.get("_COMMON_TOKENS", [])
+        print(f"\nFound {len(token_names)} token with names:", token_names)
+        if len(all_common_tokens)>0:
+            print(f"Found {len(all_common_tokens)} common tokens: {all_common_tokens}")
         if save_path is None:
             save_path = os.path.join(DECK_PATH, self.name)
         if not os.path.isdir(save_path):
             os.mkdir(save_path)
-        if not os.path.isdir(save_path):
-            os.mkdir(save_path)
-        with open(os.path.join(save_path, self.name+'_Tokens.json'), 'w') as json_file:
-            json.dump(tokens_dict, json_file, indent=4)
+        setname = Deck.get_setname_from_deck_folder(self.name)
+        tokens_json_filepath = os.path.join(save_path, self.name+'_Tokens.json')
+        tokens_json = json.dumps(tokens_dict, indent=4).encode("utf-8")
+        tokens_json_hash = hashlib.sha1(tokens_json).hexdigest()
+        if Deck.is_tokens_json_edited(tokens_json_filepath, tokens_dict):
+            print(f"WARNING: {tokens_json_filepath} was edited after it was generated, so its tokens are used instead of the generated ones. Delete it to generate it again.")
+            return Deck.from_json(tokens_json_filepath, setname, self.name+"_Tokens")
+        generated_hashes = Deck.load_generated_tokens_hashes()
+        hash_key = os.path.abspath(tokens_json_filepath)
+        current_hash = None
+        if os.path.isfile(tokens_json_filepath):
+            with open(tokens_json_filepath, 'rb') as json_file:
+                current_hash = hashlib.sha1(json_file.read()).hexdigest()
+        tokens_deck = Deck.from_dict(tokens_dict, setname=setname, deck_name=self.name+"_Tokens")
+        if current_hash != tokens_json_hash:
+            temporary_path = tokens_json_filepath + ".tmp"
+            with open(temporary_path, 'wb') as json_file:
+                json_file.write(tokens_json)
+            os.replace(temporary_path, tokens_json_filepath)
+        if generated_hashes.get(hash_key) != tokens_json_hash:
+            generated_hashes[hash_key] = tokens_json_hash
+            Deck.save_generated_tokens_hashes(generated_hashes)
+        return tokens_deck
+
+    # Returns the SHA-1 of the content of every tokens JSON file written by Deck.get_tokens, by path, used to find the files edited by hand since.
+    def load_generated_tokens_hashes():
+        try:
+            with open(TOKENS_HASHES_PATH) as f:
+                return json.load(f)
+        except:
+            return {}
+
+    def save_generated_tokens_hashes(generated_hashes):
+        try:
+            os.makedirs(os.path.dirname(TOKENS_HASHES_PATH), exist_ok=True)
+            temporary_path = TOKENS_HASHES_PATH + ".tmp"
+            with open(temporary_path, 'w') as f:
+                json.dump(generated_hashes, f, indent=4)
+            os.replace(temporary_path, TOKENS_HASHES_PATH)
+        except Exception as e:
+            print("WARNING: Could not save the hashes of the generated tokens JSON files:", e)
                  
     # TODO -- For tokens with duplicate names, make json string names (not card names) different according to differences -- can just append _B, _C, etc. (use letters here bc numbers to be reserved for arts (many arts with same name except _number will all map to same dict, just get different arts))
 
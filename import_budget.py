@@ -0,0 +1,74 @@
+import os
+import sys
+import argparse
+import compileall
+import subprocess
+
+# Import-time budget of the command line entry points. Each entry point is run in a fresh interpreter with `python -X importtime`, and the
+# time spent importing modules (beyond the interpreter's own startup imports) is compared to its budget. Each entry point also lists the
+# packages it must never import, so that a module importing Pillow, NumPy or num2words at load time (instead of in the functions that
+# use them) is caught even while it still fits the budget. Exits with status 1 if any entry point is over its budget or imports a
+# forbidden package, so it can run with the other checks before a commit.
+
+# (name, arguments of the python command, budget in milliseconds, packages that must not be imported)
+IMPORT_BUDGETS = [("import card_schema",         ["-c", "import card_schema"],                       10,  ["PIL", "numpy", "num2words"]),
+                  ("import game_elements",       ["-c", "import game_elements"],                     50,  ["PIL", "numpy", "num2words"]),
+                  ("import build_deck",          ["-c", "import build_deck"],                        100, ["PIL", "numpy", "num2words"]),
+                  ("build_deck.py --help",       ["build_deck.py", "--help"],                        100, ["PIL", "numpy", "num2words"]),
+                  ("build_deck.py --summary-only", ["build_deck.py", "--summary-only", "-d", "{deck}"], 300, ["PIL"])]
+
+# Parses the output of -X importtime into a list of (module name, cumulative microseconds, True if imported directly by the entry point).
+def parse_importtime(output):
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|", 2)
+        imports.append((name.strip(), int(cumulative), not name[1:].startswith(" ")))
+    return imports
+
+# Runs python with the input arguments and returns its imports (see parse_importtime). Raises a RuntimeError if the command fails, since
+# a command that stops early imports fewer modules and would otherwise pass its budget.
+def get_imports(arguments):
+    result = subprocess.run([sys.executable, "-X", "importtime"] + arguments, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        errors = "\n".join([line for line in result.stderr.splitlines() if not line.startswith("import time:")])
+        raise RuntimeError(f"python {' '.join(arguments)} failed with status {result.returncode}:\n{errors}")
+    return parse_importtime(result.stderr)
+
+# Returns the number of milliseconds spent importing modules other than the interpreter's own startup imports, and the set of top-level
+# packages imported.
+def measure(arguments, startup_modules):
+    imports = get_imports(arguments)
+    milliseconds = sum([cumulative for name, cumulative, top_level in imports if top_level and name not in startup_modules]) / 1000
+    packages = set([name.split(".")[0] for name, _, _ in imports])
+    return milliseconds, packages
+
+def main():
+    parser = argparse.ArgumentParser(description='Checks the import time of the command line entry points against their budgets')
+    parser.add_argument('-d', '--deck', help='Deck used by the entry points that load a deck', type=str, default='Test', dest='deck')
+    parser.add_argument('-r', '--repeat', help='Number of runs of each entry point (the fastest is kept)', type=int, default=3, dest='repeat')
+    args = parser.parse_args()
+    # Stale bytecode would be compiled again on import, which isn't what is being measured
+    compileall.compile_dir(os.path.dirname(os.path.abspath(__file__)), maxlevels=0, quiet=1)
+    startup_modules = set([name for name, _, _ in get_imports(["-c", "pass"])])
+    problems = 0
+    for name, arguments, budget, forbidden_packages in IMPORT_BUDGETS:
+        arguments = [argument.replace("{deck}", args.deck) for argument in arguments]
+        try:
+            runs = [measure(arguments, startup_modules) for _ in range(max(args.repeat, 1))]
+        except RuntimeError as e:
+            print(f"{name:32} FAILED\n{e}")
+            problems += 1
+            continue
+        milliseconds = min([run[0] for run in runs])
+        forbidden_imported = sorted(set(forbidden_packages) & runs[0][1])
+        status = "ok"
+        if milliseconds > budget or len(forbidden_imported) > 0:
+            status = "OVER BUDGET" if milliseconds > budget else "FORBIDDEN IMPORT"
+            problems += 1
+        print(f"{name:32} {milliseconds:7.1f} ms of {budget:4} ms  {status}" + (" (imports " + ", ".join(forbidden_imported) + ")" if len(forbidden_imported) > 0 else ""))
+    sys.exit(1 if problems > 0 else 0)
+
+if __name__ == '__main__':
+    main()
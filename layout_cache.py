@@ -0,0 +1,107 @@
+import os
+import json
+import hashlib
+import threading
+
+import PIL
+
+from paths import LAYOUT_CACHE_PATH, FONT_PATHS
+
+# Cache of text layouts shared by every card and every build: the font sizes chosen for names, type lines, power/toughness and
+# MDFC indicators, and the complete layouts of rules text blocks (font size, line breaks, italics, symbols and symbol positions).
+# Entries are keyed by a hash of everything the layout depends on (the text, the box it is fitted in, the fonts, the Pillow version and the
+# source of the layout code in LAYOUT_SOURCE_PATHS, so that layouts are computed again after any change to that code),
+# and stored as JSON in LAYOUT_CACHE_PATH, so text that was laid out in an earlier build never goes through the fitting loops again.
+
+MAX_ENTRIES = 50000
+# Source files of the code that computes and stores the layouts. They are read rather than imported, since build_card imports this module.
+LAYOUT_SOURCE_PATHS = [os.path.join(os.path.dirname(os.path.abspath(__file__)), filename) for filename in ["build_card.py", "rich_text.py", "layout_cache.py"]]
+
+# Returns the SHA-1 of the source of the layout code.
+def get_source_fingerprint():
+    sha1 = hashlib.sha1()
+    for source_path in LAYOUT_SOURCE_PATHS:
+        with open(source_path, "rb") as f:
+            sha1.update(f.read())
+    return sha1.hexdigest()
+
+# Returns a string identifying the installed fonts and Pillow version, so that cached layouts are dropped when either changes.
+def get_fonts_fingerprint():
+    fingerprint = [PIL.__version__]
+    for font_path in sorted(set(FONT_PATHS.values())):
+        try:
+            stat = os.stat(font_path)
+            fingerprint.append([font_path, stat.st_size, stat.st_mtime])
+        except OSError:
+            fingerprint.append([font_path, None, None])
+    return json.dumps(fingerprint)
+
+class LayoutCache:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.changed = False
+        self.entries = None
+        self.new_entries = {}
+        self.fonts_fingerprint = get_fonts_fingerprint()
+        self.source_fingerprint = get_source_fingerprint()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                self.entries = json.load(f)
+        except:
+            self.entries = {}
+
+    # Returns the cache key of a layout of the input kind (e.g., "rules_text" or "font_size") that depends on the input values. Values must be JSON serializable.
+    def key(self, kind, *values):
+        return hashlib.sha1(json.dumps([self.source_fingerprint, self.fonts_fingerprint, kind, values]).encode("utf-8")).hexdigest()
+
+    # Returns the cached layout with the input key, or None.
+    def get(self, key):
+        with self.lock:
+            if self.entries is None:
+                self.load()
+            return self.entries.get(key)
+
+    def put(self, key, layout):
+        with self.lock:
+            if self.entries is None:
+                self.load()
+            self.entries[key] = layout
+            self.new_entries[key] = layout
+            while len(self.entries) > MAX_ENTRIES:
+                del self.entries[next(iter(self.entries))]
+            self.changed = True
+
+    # Returns the layouts added since this was last called, so that a render worker process can hand them to the parent process (see render_workers).
+    def take_new_entries(self):
+        with self.lock:
+            new_entries, self.new_entries = self.new_entries, {}
+            return new_entries
+
+    # Writes the cache to disk if any layout was added since it was loaded.
+    def save(self):
+        with self.lock:
+            if not self.changed:
+                return
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temporary_path = self.path + ".tmp"
+            with open(temporary_path, "w") as f:
+                json.dump(self.entries, f, separators=(",", ":"))
+            os.replace(temporary_path, self.path)
+            self.changed = False
+
+_cache = None
+_cache_lock = threading.Lock()
+
+# Returns the layout cache shared by every card.
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LayoutCache(LAYOUT_CACHE_PATH)
+        return _cache
+
+def save_cache():
+    get_cache().save()
@@ -0,0 +1,144 @@
+import os
+import sys
+import copy
+import json
+import argparse
+
+import paths
+import build_card
+import card_schema
+import layout_cache
+import rich_text
+from game_elements import Deck
+
+# Layout-only dry run of the card builder. Every card of a deck, and every token made by its rules text, goes through the same steps as a
+# render up to the point where pixels would be drawn: the card is built from the deck JSON (which resolves its frame), its mana and text
+# symbols are resolved to symbol images, and its name, type line, power/toughness and rules text are fitted to their boxes (with
+# build_card.CardDraw in measure-only mode, so no frame or artwork is decoded and no image is created). Problems are reported per card:
+# cards that can't be built, missing frames and symbol images, text that can't be fitted, and rules text that is set below a minimum
+# font size or is wider than its box. Rules text layouts go through the persistent layout cache, so checking unchanged cards again is fast,
+# and layouts checked here are not laid out again when the cards are rendered.
+
+MIN_RULES_FONT_SIZE = 24
+
+# Returns the cards of the input deck dictionary (as in a deck JSON file) and a list of (card name, problem) for the cards that could not be built.
+def load_cards(card_dict, deck_name="Unknown"):
+    try:
+        return Deck.from_dict(copy.deepcopy(card_dict), deck_name=deck_name).cards, []
+    except Exception:
+        pass
+    # Find the cards that can't be built on their own, and build the others together so that related cards still find each other
+    problems = []
+    loadable_card_dict = {}
+    for keyname, card in card_dict.items():
+        if keyname.lower() in ["_basics", "_common_tokens"]:
+            loadable_card_dict[keyname] = card
+            continue
+        _, errors = card_schema.validate_card(keyname, card)
+        if len(errors) > 0:
+            problems += [(card_name, problem) for card_name, _, problem in errors]
+            continue
+        try:
+            Deck.from_dict({keyname: copy.deepcopy(card)}, deck_name=deck_name)
+            loadable_card_dict[keyname] = card
+        except Exception as e:
+            problems.append((card.get("name", keyname) if type(card)==dict else keyname, "could not be built: " + str(e)))
+    return Deck.from_dict(copy.deepcopy(loadable_card_dict), deck_name=deck_name).cards, problems
+
+# Returns the paths of the symbol images used to draw the mana symbols of the input mana cost (see build_card.CardDraw.paste_mana_symbols).
+def get_mana_symbol_paths(mana):
+    if mana is None:
+        return []
+    mana_symbols = [m.replace('}','').replace('/','') for m in mana.split('{')]
+    return [os.path.join(paths.SYMBOL_PATH, symbol+".png") for symbol in mana_symbols if len(symbol)!=0]
+
+# Returns a list of problems found in the layout of the input card, without drawing it.
+#   min_font_size -- Rules text set in a smaller font size (in pixels at scale 1) is reported.
+def check_card(card, min_font_size=MIN_RULES_FONT_SIZE, scale=1):
+    problems = []
+    if card.frame is None or not os.path.isfile(card.frame):
+        problems.append(f"frame {card.frame} not found")
+    for symbol_path in get_mana_symbol_paths(card.mana):
+        if not os.path.isfile(symbol_path):
+            problems.append(f"mana symbol {os.path.basename(symbol_path)} not found in {paths.SYMBOL_PATH}, so it is not drawn")
+    card_draw = build_card.CardDraw(card, scale=scale, draw=False)
+    for element, write in [("name", card_draw.write_name), ("type line", card_draw.write_type_line), ("power/toughness", card_draw.write_power_toughness)]:
+        try:
+            write()
+        except Exception as e:
+            problems.append(f"{element} could not be fitted: {e}")
+    try:
+        layout, layout_key = card_draw.get_rules_text_layout()
+    except Exception as e:
+        problems.append(f"rules text could not be fitted: {e}")
+        return problems
+    if layout is None:
+        return problems
+    cache = layout_cache.get_cache()
+    if cache.get(layout_key) is None:
+        cache.put(layout_key, layout)
+    font_size = layout["font_size"]
+    if font_size < card_draw.scaled(min_font_size):
+        problems.append(f"rules text is set at {font_size}px, below the minimum of {card_draw.scaled(min_font_size)}px")
+    # Words are only added to a line while it fits in the box, so only lines of a single word can be wider than it
+    font_filename = paths.FONT_PATHS["flavor"] if layout["flavor_only"] else paths.FONT_PATHS["rules"]
+    for index, line in enumerate(layout["text_lines"]):
+        if index == layout["flavor_block_line_index"]:
+            font_filename = paths.FONT_PATHS["flavor"]
+        if len(line.split()) != 1:
+            continue
+        runs = tuple(rich_text.TextRun(*run) for run in layout["text_lines_runs"][index])
+        width = card_draw.get_runs_size(font_size, runs, font_filename, paths.FONT_PATHS["flavor"])[0]
+        if width > layout["max_width"]:
+            problems.append(f"rules text line \"{line}\" is {width}px wide, wider than its box ({layout['max_width']}px)")
+    for symbol in layout["symbols"]:
+        if not os.path.isfile(os.path.join(paths.SYMBOL_PATH, symbol.replace('/','')+".png")):
+            problems.append(f"symbol {{{symbol}}} in the rules text has no image in {paths.SYMBOL_PATH}, so the card can't be drawn")
+    return problems
+
+# Checks every card of the input deck folder and every token made by their rules text. Returns the number of cards and tokens checked
+# and a list of (card name, problem).
+def check_deck(deck_folder, min_font_size=MIN_RULES_FONT_SIZE, scale=1):
+    with open(Deck.get_deck_json_filepath(deck_folder), encoding="utf-8") as f:
+        card_dict = json.load(f)
+    deck_name = os.path.basename(deck_folder)
+    cards, problems = load_cards(card_dict, deck_name)
+    # The same tokens the build renders: the ones made by the rules text, unless the tokens JSON file was edited by hand (see Deck.get_tokens)
+    tokens_dict = Deck.get_tokens_dict(cards)
+    tokens_json_filepath = os.path.join(deck_folder, deck_name+"_Tokens.json")
+    if Deck.is_tokens_json_edited(tokens_json_filepath, tokens_dict):
+        with open(tokens_json_filepath, encoding="utf-8") as f:
+            tokens_dict = json.load(f)
+    tokens, token_problems = load_cards(tokens_dict, deck_name+"_Tokens")
+    problems += [(name+" (token)", problem) for name, problem in token_problems]
+    for card in cards:
+        problems += [(card.name, problem) for problem in check_card(card, min_font_size, scale)]
+    for token in tokens:
+        problems += [(token.name+" (token)", problem) for problem in check_card(token, min_font_size, scale)]
+    layout_cache.save_cache()
+    return len(cards), len(tokens), problems
+
+def print_problems(deck_name, num_cards, num_tokens, problems):
+    for card_name, problem in problems:
+        print(f"WARNING: {deck_name}: {card_name}: {problem}")
+    print(f"Checked {num_cards} card" + ("" if num_cards==1 else "s") + f" and {num_tokens} token" + ("" if num_tokens==1 else "s") + f" in {deck_name}: {len(problems)} problem" + ("" if len(problems)==1 else "s") + " found.")
+
+def main():
+    parser = argparse.ArgumentParser(description='Checks the layout of every card of one or more decks without rendering them')
+    parser.add_argument('-d', '--deck', help='Name of a deck. Can be repeated.', type=str, action='append', default=[], dest='decks')
+    parser.add_argument('-a', '--all', help='Check every deck in DECK_PATH', action='store_true', dest='all')
+    parser.add_argument('-m', '--min-font-size', help='Report rules text set in a smaller font size (in pixels)', type=int, default=MIN_RULES_FONT_SIZE, dest='min_font_size')
+    args = parser.parse_args()
+    deck_names = Deck.find_deck_names() if args.all else args.decks
+    if len(deck_names) == 0:
+        raise ValueError("No decks given. Use -d <deck name> or --all.")
+    total_problems = 0
+    for deck_name in deck_names:
+        deck_folder = os.path.join(paths.DECK_PATH, ' '.join(word[0].upper() + word[1:] for word in deck_name.split()))
+        num_cards, num_tokens, problems = check_deck(deck_folder, args.min_font_size)
+        print_problems(os.path.basename(deck_folder), num_cards, num_tokens, problems)
+        total_problems += len(problems)
+    sys.exit(1 if total_problems > 0 else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+import os
+import io
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Supported output formats: format name -> (Pillow format, file extension, allowed save options)
+ENCODING_FORMATS = {"jpeg": ("JPEG", ".jpg",  ["quality", "subsampling", "progressive", "optimize"]),
+                    "png":  ("PNG",  ".png",  ["optimize", "compress_level"]),
+                    "webp": ("WEBP", ".webp", ["quality", "lossless", "method"])}
+ENCODING_FORMAT_ALIASES = {"jpg": "jpeg"}
+# Pillow format -> image modes it can write. Images in any other mode are converted to RGBA (if the format can write it and the image has
+# transparency) or RGB before they are saved.
+SAVE_MODES = {"JPEG": ["RGB", "L", "CMYK"],
+              "PNG":  ["RGB", "RGBA", "L", "LA", "P", "1", "I", "I;16"],
+              "WEBP": ["RGB", "RGBA"]}
+
+# Every image written by the builder belongs to one of these targets, each with its own encoder settings.
+ENCODING_TARGETS = ["Cards", "Tokens", "Printing", "Cockatrice"]
+
+# Holds the format and save options used to write one kind of output image.
+# With no options, images are saved exactly as a plain Image.save to a .jpg path would save them.
+class OutputEncoder:
+    def __init__(self, image_format="jpeg", **options):
+        image_format = ENCODING_FORMAT_ALIASES.get(image_format.lower(), image_format.lower())
+        if image_format not in ENCODING_FORMATS.keys():
+            raise ValueError(f"Unsupported output format {image_format}. Must be one of: {', '.join(ENCODING_FORMATS.keys())}.")
+        allowed_options = ENCODING_FORMATS[image_format][2]
+        for option in options.keys():
+            if option not in allowed_options:
+                raise ValueError(f"Unsupported option {option} for {image_format} output. Must be one of: {', '.join(allowed_options)}.")
+        self.image_format = image_format
+        self.options = options
+
+    # Parses an encoder specification of the form "format[:option=value,flag,...]" -- e.g., "jpeg:quality=95,subsampling=0,progressive" or "webp:lossless".
+    def from_string(spec):
+        image_format, _, option_string = spec.partition(":")
+        options = {}
+        for option in option_string.split(","):
+            option = option.strip()
+            if len(option) == 0:
+                continue
+            key, has_value, value = option.partition("=")
+            if not has_value:
+                options[key.strip()] = True
+            elif value.strip().isdigit():
+                options[key.strip()] = int(value.strip())
+            elif value.strip().lower() in ["true", "false"]:
+                options[key.strip()] = value.strip().lower() == "true"
+            else:
+                options[key.strip()] = value.strip()
+        return OutputEncoder(image_format.strip(), **options)
+
+    def __repr__(self):
+        return self.image_format + ("" if len(self.options)==0 else ":"+",".join(k if v is True else k+"="+str(v) for k, v in self.options.items()))
+
+    @property
+    def extension(self):
+        return ENCODING_FORMATS[self.image_format][1]
+
+    @property
+    def pillow_format(self):
+        return ENCODING_FORMATS[self.image_format][0]
+
+    # True if this encoder writes the same bytes as the builder's original plain .jpg saves.
+    def is_default(self):
+        return self.image_format == "jpeg" and len(self.options) == 0
+
+    # Returns the input path with its image extension replaced by this encoder's extension.
+    def output_path(self, path):
+        root, ext = os.path.splitext(path)
+        if ext.lower() in [e for _, e, _ in ENCODING_FORMATS.values()] + [".jpeg"]:
+            path = root
+        return path + self.extension
+
+    # Returns the input image in a mode this encoder's format can write (see SAVE_MODES).
+    def prepare_image(self, image):
+        save_modes = SAVE_MODES[self.pillow_format]
+        if image.mode in save_modes:
+            return image
+        if "RGBA" in save_modes and ("A" in image.getbands() or "transparency" in image.info):
+            return image.convert("RGBA")
+        return image.convert("RGB")
+
+    # Encodes the input image to the input path (with this encoder's extension) and returns the path written.
+    def save(self, image, path):
+        path = self.output_path(path)
+        self.prepare_image(image).save(path, format=self.pillow_format, **self.options)
+        return path
+
+    # Encodes the input image and returns the encoded bytes.
+    def encode(self, image):
+        buffer = io.BytesIO()
+        self.prepare_image(image).save(buffer, format=self.pillow_format, **self.options)
+        return buffer.getvalue()
+
+    # Writes an already-saved image file to target_path (given without extension), re-encoding only if this encoder doesn't match the source file.
+    # Returns the path written.
+    def export(self, source_path, target_path, extension=None):
+        target_path = target_path + (extension if extension is not None else self.extension)
+        if self.is_default() and os.path.splitext(source_path)[1].lower() in [".jpg", ".jpeg"]:
+            shutil.copy(source_path, target_path)
+        else:
+            from PIL import Image
+            with Image.open(source_path) as image:
+                self.prepare_image(image).save(target_path, format=self.pillow_format, **self.options)
+        return target_path
+
+# Encoders currently in use for each target. Change with configure_encoders.
+encoders = {target: OutputEncoder() for target in ENCODING_TARGETS}
+
+# Sets the encoder for each target from a list of strings of the form "Target=spec" (see OutputEncoder.from_string). A spec with no target applies to every target.
+def configure_encoders(specs):
+    for spec in (specs or []):
+        target, has_target, encoder_spec = spec.partition("=")
+        if has_target and target.strip().title() in ENCODING_TARGETS:
+            encoders[target.strip().title()] = OutputEncoder.from_string(encoder_spec)
+        elif has_target and target.strip() and ":" not in target:
+            raise ValueError(f"Unknown encoding target {target}. Must be one of: {', '.join(ENCODING_TARGETS)}.")
+        else:
+            for encoding_target in ENCODING_TARGETS:
+                encoders[encoding_target] = OutputEncoder.from_string(spec)
+    return encoders
+
+# Background thread pool that encodes and writes images while the caller moves on to the next card.
+# Pillow releases the GIL while compressing, so encoding overlaps with the layout of the following card.
+# At most max_pending images are held in memory waiting to be written; submit blocks once that limit is reached.
+class EncoderPool:
+    def __init__(self, max_workers=2, max_pending=None):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="encoder")
+        self.pending = threading.BoundedSemaphore(max_pending if max_pending is not None else 2*max_workers)
+        self.futures = []
+        self.lock = threading.Lock()
+
+    # Queues the image to be written to path with the input encoder. Returns a Future resolving to the path written.
+    def submit(self, encoder, image, path):
+        self.pending.acquire()
+        try:
+            future = self.executor.submit(encoder.save, image, path)
+        except:
+            self.pending.release()
+            raise
+        future.add_done_callback(lambda f: self.pending.release())
+        with self.lock:
+            self.futures.append(future)
+        return future
+
+    # Blocks until every image queued so far (by any thread) has been written. Raises the first encoding error, if any.
+    def wait(self):
+        with self.lock:
+            futures = list(self.futures)
+        try:
+            for future in futures:
+                future.result()
+        finally:
+            with self.lock:
+                self.futures = [future for future in self.futures if not future.done()]
+
+    def shutdown(self):
+        try:
+            self.wait()
+        finally:
+            self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
@@ -13,6 +13,13 @@ FONT_PATHS = {"name":   os.path.join(ASSETS_PATH, "Fonts", "Beleren-Bold.ttf"),
               "flavor": os.path.join(ASSETS_PATH, "Fonts", "MPlantin-Italic.ttf")}
 
 DECK_PATH = os.path.join("..", "Decks")
+LAYOUT_CACHE_PATH = os.path.join(DECK_PATH, ".cache", "layout.json")
+SEARCH_INDEX_PATH = os.path.join(DECK_PATH, ".cache", "search_index.json")
+RENDER_STORE_PATH = os.path.join(DECK_PATH, ".cache", "Renders")
+TOKENS_HASHES_PATH = os.path.join(DECK_PATH, ".cache", "tokens_hashes.json")
+RENDER_COSTS_PATH = os.path.join(DECK_PATH, ".cache", "render_costs.json")
+ASSET_BUNDLE_PATH = os.path.join(DECK_PATH, ".cache", "assets.bundle")
+CARD_STORE_PATH = os.path.join(DECK_PATH, "cards.sqlite")
 
 COCKATRICE_PATH = os.path.join("/", "Users", "fabiochiappina", "Library", "Application Support", "Cockatrice", "Cockatrice")
 COCKATRICE_MANUFACTOR_PATH = os.path.join(COCKATRICE_PATH, "manufactor")
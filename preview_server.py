@@ -0,0 +1,176 @@
+import os
+import math
+import json
+import time
+import argparse
+import threading
+import traceback
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import paths
+import game_elements
+import build_card
+import output_encoding
+import artwork_cache
+
+# Small localhost HTTP service for previewing cards while editing them.
+#   POST /render  -- body is a single card dictionary, in the same format as a card entry of a deck JSON file. Returns the rendered card image.
+#                    Query parameters:
+#                      variant=card|printing -- Whether to return the card image (default) or its printing image.
+#                      format=png|jpeg|webp  -- Encoding of the returned image (default png).
+#                      scale=<number>        -- Resolution scale of the returned image (default 1; e.g., 0.5 for quick drafts).
+#                      deck=<deck name>      -- If given, the card's artwork is read from <DECK_PATH>/<deck name>/Artwork. Must be one of the decks in
+#                                               DECK_PATH (see Deck.find_deck_names). Nothing is ever written to the deck folders.
+#   GET  /stats   -- Returns JSON with the number of renders and latency percentiles (in milliseconds).
+# Invalid requests (bad parameters or card dictionary) get a 400 response with the problem. Errors while rendering a valid card get a 500
+# response, and their details are only printed in the server's log.
+
+# Keeps the render latencies seen so far and computes percentiles over them.
+class LatencyTracker:
+    def __init__(self, max_samples=10000):
+        self.max_samples = max_samples
+        self.samples = []
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def add(self, seconds):
+        with self.lock:
+            self.count += 1
+            self.samples.append(seconds)
+            if len(self.samples) > self.max_samples:
+                del self.samples[0:len(self.samples)-self.max_samples]
+
+    # Returns the pth percentile (0-100) of the stored latencies, in seconds, using nearest-rank.
+    def percentile(self, p, sorted_samples=None):
+        if sorted_samples is None:
+            with self.lock:
+                sorted_samples = sorted(self.samples)
+        if len(sorted_samples) == 0:
+            return None
+        rank = max(1, math.ceil(p/100*len(sorted_samples)))
+        return sorted_samples[rank-1]
+
+    def summary(self):
+        with self.lock:
+            sorted_samples = sorted(self.samples)
+            count = self.count
+        summary = {"count": count}
+        for p in [50, 90, 95, 99]:
+            latency = self.percentile(p, sorted_samples)
+            summary["p"+str(p)+"_ms"] = None if latency is None else round(latency*1000, 2)
+        summary["max_ms"] = None if len(sorted_samples)==0 else round(sorted_samples[-1]*1000, 2)
+        return summary
+
+# Builds a Card from a single card dictionary, applying the same defaults as Deck.from_json.
+def card_from_dict(card_dict, setname="UNK"):
+    if type(card_dict) != dict or "name" not in card_dict.keys():
+        raise ValueError("Request body must be a card dictionary with at least a name.")
+    deck = game_elements.Deck.from_dict({card_dict["name"]: card_dict}, setname=setname, deck_name="Preview")
+    return deck.cards[0]
+
+# Renders the input card in memory and returns the encoded image bytes.
+def render_preview(card, variant="card", image_format="png", deck_name=None, scale=1):
+    artwork_image = None
+    if deck_name is not None:
+        artwork_folder = os.path.join(paths.DECK_PATH, deck_name, "Artwork")
+        if os.path.isdir(artwork_folder):
+            artworks = build_card.find_cards_with_card_name(card.name, search_path=artwork_folder)
+            if len(artworks) > 0:
+                # Fit the artwork directly instead of going through the deck's artwork cache, which would write to the deck folder.
+                _, artwork_size = build_card.get_artwork_window(card, scale)
+                artwork_image = artwork_cache.fit_artwork(os.path.join(artwork_folder, sorted(artworks)[0]), artwork_size)
+    card_draw = build_card.CardDraw(card, scale=scale)
+    image = card_draw.render(artwork_image=artwork_image)
+    if variant == "printing":
+        image = build_card.create_printing_image(card, image)
+    return output_encoding.OutputEncoder(image_format).encode(image)
+
+class PreviewRequestHandler(BaseHTTPRequestHandler):
+    latencies = LatencyTracker()
+
+    def send_bytes(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status, data):
+        self.send_bytes(status, "application/json", json.dumps(data).encode("utf-8"))
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/stats":
+            self.send_json(200, self.latencies.summary())
+        else:
+            self.send_json(404, {"error": "Unknown path. Use POST /render or GET /stats."})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/render":
+            self.send_json(404, {"error": "Unknown path. Use POST /render or GET /stats."})
+            return
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        variant = query.get("variant", "card").lower()
+        image_format = query.get("format", "png").lower()
+        if variant not in ["card", "printing"]:
+            self.send_json(400, {"error": "variant must be card or printing."})
+            return
+        image_format = output_encoding.ENCODING_FORMAT_ALIASES.get(image_format, image_format)
+        if image_format not in output_encoding.ENCODING_FORMATS.keys():
+            self.send_json(400, {"error": "format must be one of: "+", ".join(output_encoding.ENCODING_FORMATS.keys())+"."})
+            return
+        try:
+            scale = float(query.get("scale", 1))
+            if scale <= 0:
+                raise ValueError
+        except ValueError:
+            self.send_json(400, {"error": "scale must be a positive number."})
+            return
+        # Only the names of existing decks are accepted, so the parameter can't point anywhere else on disk
+        deck_name = query.get("deck")
+        if deck_name is not None and deck_name not in game_elements.Deck.find_deck_names():
+            self.send_json(400, {"error": "deck must be the name of a deck in DECK_PATH."})
+            return
+        start_time = time.perf_counter()
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            card_dict = json.loads(self.rfile.read(length).decode("utf-8"))
+            card = card_from_dict(card_dict, setname=query.get("setname", "UNK"))
+        except (ValueError, TypeError) as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        except Exception as e: # Fields of the wrong type can fail anywhere in Card, but they are still a problem of the request
+            self.send_json(400, {"error": "The card dictionary could not be read as a card: " + type(e).__name__ + "."})
+            return
+        try:
+            body = render_preview(card, variant=variant, image_format=image_format, deck_name=deck_name, scale=scale)
+        except Exception:
+            print(f"WARNING: Failed to render a preview of {card.name}:")
+            traceback.print_exc()
+            self.send_json(500, {"error": "The card could not be rendered. See the server log for details."})
+            return
+        self.latencies.add(time.perf_counter() - start_time)
+        self.send_bytes(200, "image/"+image_format, body)
+
+    def log_message(self, format, *args):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description='MTG Custom Card Preview Server')
+    parser.add_argument('--host', help='Host to listen on', type=str, default='127.0.0.1', dest='host')
+    parser.add_argument('-p', '--port', help='Port to listen on', type=int, default=8765, dest='port')
+    parser.add_argument('--preload-frames', help='1 to decode every card frame at startup instead of on first use', type=int, default=False, dest='preload_frames')
+    args = parser.parse_args()
+    print("Preloading assets...")
+    build_card.preload_assets(frames=bool(args.preload_frames))
+    server = ThreadingHTTPServer((args.host, args.port), PreviewRequestHandler)
+    print(f"Serving card previews on http://{args.host}:{args.port}/render")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+if __name__ == '__main__':
+    main()
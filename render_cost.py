@@ -0,0 +1,101 @@
+import os
+import json
+import threading
+
+import numpy as np
+
+import paths
+
+# Estimates how long a card takes to render from cheap features of the card, so that the most expensive cards can be started first and a
+# long saga or text-heavy card doesn't end up rendered last while everything else waits on it (see render_pipeline.render_cards).
+# The estimate is a linear model of the features in FEATURES. It starts from DEFAULT_COEFFICIENTS and is calibrated on the render times
+# recorded by builds run with --profile: every profiled card adds a sample (its features and its measured time, normalized to scale 1), and
+# the coefficients are fitted to the last MAX_SAMPLES samples by least squares, pulled towards the defaults so that a few samples can't
+# produce a model that orders cards badly. The samples and coefficients are kept in RENDER_COSTS_PATH.
+
+RENDER_COST_VERSION = 1
+MAX_SAMPLES = 5000
+# Weight of the default coefficients in the fit, in samples
+PRIOR_WEIGHT = 1.0
+FEATURES = ["base", "text_characters", "symbols", "artworks", "saga", "double_faced", "token", "stored_layer"]
+# Seconds per unit of each feature at scale 1
+DEFAULT_COEFFICIENTS = {"base": 0.02, "text_characters": 0.00004, "symbols": 0.001, "artworks": 0.012, "saga": 0.02, "double_faced": 0.004, "token": 0.0, "stored_layer": -0.015}
+MIN_ESTIMATE = 0.001
+TEXT_FIELDS = ["rules", "rules1", "rules2", "rules3", "rules4", "rules5", "rules6", "flavor"]
+
+# Returns the features of the input card (as a list in the order of FEATURES).
+#   num_artworks     -- Number of artworks the card is rendered with (each is composited and encoded separately).
+#   has_stored_layer -- True if the card's layer is in the render store, so its text is not laid out again.
+def get_card_features(card, num_artworks=1, has_stored_layer=False):
+    text = "".join([getattr(card, field) for field in TEXT_FIELDS if getattr(card, field) is not None])
+    return [1, len(text), text.count("{"), max(num_artworks, 1), int(card.is_saga()), int(card.is_mdfc() or card.is_transform()), int(card.is_token()), int(has_stored_layer)]
+
+class RenderCostModel:
+    def __init__(self, path=paths.RENDER_COSTS_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.coefficients = dict(DEFAULT_COEFFICIENTS)
+        self.samples = []
+        self.changed = False
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+            if saved["version"] == RENDER_COST_VERSION and saved["features"] == FEATURES:
+                self.coefficients = saved["coefficients"]
+                self.samples = saved["samples"]
+        except:
+            pass
+
+    # Returns the estimated number of seconds the card with the input features takes to render at the input scale.
+    def estimate(self, features, scale=1):
+        seconds = sum([self.coefficients[feature] * value for feature, value in zip(FEATURES, features)])
+        return max(seconds, MIN_ESTIMATE) * scale * scale
+
+    # Records that the card with the input features took the input number of seconds to render at the input scale.
+    def add_sample(self, features, seconds, scale=1):
+        with self.lock:
+            self.samples.append(list(features) + [seconds / (scale * scale)])
+            self.samples = self.samples[-MAX_SAMPLES:]
+            self.changed = True
+
+    # Fits the coefficients to the recorded samples.
+    def calibrate(self):
+        with self.lock:
+            if len(self.samples) == 0:
+                return
+            samples = np.array(self.samples, dtype=np.float64)
+            features, seconds = samples[:, :-1], samples[:, -1]
+            defaults = np.array([DEFAULT_COEFFICIENTS[feature] for feature in FEATURES])
+            # Scale each feature to at most 1, so the defaults pull on every coefficient alike
+            feature_scales = np.maximum(np.abs(features).max(axis=0), 1)
+            scaled_features = features / feature_scales
+            prior = PRIOR_WEIGHT * np.eye(len(FEATURES))
+            scaled_coefficients = np.linalg.solve(scaled_features.T @ scaled_features + prior, scaled_features.T @ seconds + prior @ (defaults * feature_scales))
+            self.coefficients = {feature: float(coefficient) for feature, coefficient in zip(FEATURES, scaled_coefficients / feature_scales)}
+            self.changed = True
+
+    # Writes the samples and coefficients to disk if they changed since they were loaded.
+    def save(self):
+        with self.lock:
+            if not self.changed:
+                return
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temporary_path = self.path + ".tmp"
+            with open(temporary_path, "w") as f:
+                json.dump({"version": RENDER_COST_VERSION, "features": FEATURES, "coefficients": self.coefficients, "samples": self.samples}, f, separators=(",", ":"))
+            os.replace(temporary_path, self.path)
+            self.changed = False
+
+_model = None
+_model_lock = threading.Lock()
+
+# Returns the render cost model shared by every build in this process.
+def get_model():
+    global _model
+    with _model_lock:
+        if _model is None:
+            _model = RenderCostModel()
+        return _model
@@ -0,0 +1,150 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import build_card
+import output_encoding
+import artwork_cache
+import layout_cache
+import render_cost
+import render_store as render_store_module
+
+# Staged streaming pipeline used to render a list of cards:
+#   1. Reader threads prefetch and decode the frame and every artwork of the next few cards.
+#   2. The calling thread lays out the text and composites each card (and its printing image) as soon as its inputs are ready.
+#   3. Writer threads (an EncoderPool) encode and save the finished images.
+# Stages are connected by bounded queues, so at most `prefetch` cards are decoded ahead of the card being laid out, and at most the
+# encoder pool's max_pending images are waiting to be written. Pillow releases the GIL while decoding and encoding, so the stages overlap.
+# Cards are rendered longest first, as estimated by render_cost, so the last cards in the pipeline are the quick ones.
+# Given a render_workers.RenderWorkerPool, stages 1 to 3 run for each card in a worker process instead (see render_card), so several cards
+# are laid out at the same time.
+
+# Decodes everything a card needs before layout: its frame (into the shared asset cache) and its artworks, fitted to the frame's artwork window.
+# If a render store is given, also reads the card's stored layer (see build_card.CardDraw.render_layer).
+# Returns the list of (artwork filename, artwork image) and the stored layer (None if there is none).
+def prefetch_card_inputs(card, artwork_folder, scale=1, render_store=None):
+    layer = render_store.load_layer(render_store.get_layer_key(card, scale)) if render_store is not None else None
+    if layer is None and card.frame is not None and os.path.isfile(card.frame):
+        build_card.load_asset_image(card.frame, scale=scale)
+    return build_card.load_card_artworks(card, artwork_folder, scale), layer
+
+# Renders the input card and its printing image, writing them directly, in a render worker process (see render_workers). If use_render_store
+# is true, the card's layer is read from (or added to) the render store. Returns the number of seconds the card took and the layouts added
+# to the layout cache meanwhile, for the parent process to keep.
+def render_card(card, save_path, printing_path, scale=1, use_render_store=False):
+    start_time = time.perf_counter()
+    render_store = render_store_module.get_store() if use_render_store else None
+    artwork_images, layer = prefetch_card_inputs(card, os.path.join(os.path.dirname(save_path), "Artwork"), scale, render_store)
+    if layer is None and render_store is not None:
+        layer = build_card.CardDraw(card, scale=scale).render_layer()
+        render_store.put_layer(render_store.get_layer_key(card, scale), layer)
+    card_images = build_card.create_card_image_from_Card(card, save_path=save_path, artwork_images=artwork_images, scale=scale, layer=layer)
+    build_card.create_printing_image_from_Card(card, saved_image_path=save_path, save_path=printing_path, card_images=card_images)
+    return time.perf_counter() - start_time, layout_cache.get_cache().take_new_entries()
+
+# Returns the render_cost features of the input card.
+def get_render_features(card, artwork_folder, scale=1, render_store=None):
+    num_artworks = len(build_card.find_cards_with_card_name(card.name, search_path=artwork_folder)) if os.path.isdir(artwork_folder) else 1
+    has_stored_layer = render_store is not None and os.path.isfile(render_store.get_layer_path(render_store.get_layer_key(card, scale)))
+    return render_cost.get_card_features(card, num_artworks, has_stored_layer)
+
+# Returns True if the images of every input card in save_path and printing_path are already links to their stored renders in the input
+# render_store.RenderStore, so that render_cards would have nothing to do. The stored entries are marked as used.
+def is_rendered(cards, save_path, printing_path, scale=1, render_store=None):
+    if render_store is None:
+        return False
+    artwork_folder = os.path.join(os.path.dirname(save_path), "Artwork")
+    keys = []
+    for card in cards:
+        for card_artwork, key in render_store.get_entries(card, artwork_folder, scale):
+            if not render_store.is_linked(key, card, card_artwork, save_path, printing_path):
+                return False
+            keys.append(key)
+    for key in keys:
+        render_store.touch(key)
+    render_store.save()
+    return True
+
+# Renders the input cards into save_path (the Cards or Tokens folder) and their printing images into printing_path.
+#   encoder_pool   -- EncoderPool used to write the images. If None, one is created and waited on before returning.
+#   prefetch       -- Number of cards whose inputs may be decoded ahead of the card being laid out.
+#   reader_threads -- Number of threads decoding frames and artworks.
+#   label          -- Word used in the progress messages ("card" or "token").
+#   scale          -- Resolution scale of the rendered images (see build_card.scale_value).
+#   render_store   -- If given, a render_store.RenderStore. Cards whose images are all in the store are linked from it instead of rendered,
+#                     and the images of the other cards are added to it once written. The layers of cards whose artwork changed are read
+#                     back from the store, and the layers of the others are added to it.
+#   cost_model     -- render_cost.RenderCostModel used to order the cards longest first. If None, the cards are rendered in order.
+#   profile        -- If true, the render time of every card is added to the cost model, which is then calibrated and saved.
+#   workers        -- render_workers.RenderWorkerPool rendering the cards. If None, they are rendered in the calling thread.
+def render_cards(cards, save_path, printing_path, encoder_pool=None, prefetch=4, reader_threads=2, label="card", scale=1, render_store=None, cost_model=None, profile=False, workers=None):
+    if encoder_pool is None:
+        with output_encoding.EncoderPool() as encoder_pool:
+            return render_cards(cards, save_path, printing_path, encoder_pool=encoder_pool, prefetch=prefetch, reader_threads=reader_threads, label=label, scale=scale, render_store=render_store, cost_model=cost_model, profile=profile, workers=workers)
+    artwork_folder = os.path.join(os.path.dirname(save_path), "Artwork")
+    cards = list(cards)
+    stored_entries = []
+    if render_store is not None:
+        cards_to_render = []
+        for card in cards:
+            entries = render_store.get_entries(card, artwork_folder, scale)
+            if all([render_store.has(key, card) for _, key in entries]):
+                print("Reusing stored image for", label, ":", card.name)
+                for card_artwork, key in entries:
+                    render_store.link_to_deck(key, card, card_artwork, save_path, printing_path)
+            else:
+                for card_artwork, key in entries:
+                    render_store.unlink_from_deck(card, card_artwork, save_path, printing_path)
+                stored_entries += [(card, card_artwork, key) for card_artwork, key in entries]
+                cards_to_render.append(card)
+        cards = cards_to_render
+    if cost_model is not None:
+        card_features = [get_render_features(card, artwork_folder, scale, render_store) for card in cards]
+        estimates = [cost_model.estimate(features, scale) for features in card_features]
+        order = sorted(range(len(cards)), key=lambda index: estimates[index], reverse=True)
+        cards, card_features, estimates = [cards[i] for i in order], [card_features[i] for i in order], [estimates[i] for i in order]
+    render_times = []
+    if workers is not None:
+        # Cards are handed to the workers longest first, and each worker takes the next card as soon as it is done with one
+        results = [workers.submit(render_card, card, save_path, printing_path, scale, render_store is not None) for card in cards]
+        cache = layout_cache.get_cache()
+        for card_index, (card, result) in enumerate(zip(cards, results)):
+            render_time, new_layouts = result.get()
+            print("Built image for", label, card_index+1, "of", len(cards), ":", card.name)
+            for key, layout in new_layouts.items():
+                cache.put(key, layout)
+            if render_store is not None and os.path.isfile(render_store.get_layer_path(render_store.get_layer_key(card, scale))):
+                render_store.touch(render_store.get_layer_key(card, scale))
+            render_times.append(render_time)
+    else:
+        with ThreadPoolExecutor(max_workers=reader_threads, thread_name_prefix="reader") as readers:
+            prefetched = deque()
+            next_to_prefetch = 0
+            for card_index, card in enumerate(cards):
+                while next_to_prefetch < len(cards) and len(prefetched) < max(1, prefetch):
+                    prefetched.append(readers.submit(prefetch_card_inputs, cards[next_to_prefetch], artwork_folder, scale, render_store))
+                    next_to_prefetch += 1
+                artwork_images, layer = prefetched.popleft().result()
+                start_time = time.perf_counter()
+                print("Building image for", label, card_index+1, "of", len(cards), ":", card.name)
+                if layer is None and render_store is not None:
+                    layer = build_card.CardDraw(card, scale=scale).render_layer()
+                    readers.submit(render_store.put_layer, render_store.get_layer_key(card, scale), layer)
+                card_images = build_card.create_card_image_from_Card(card, save_path=save_path, encoder_pool=encoder_pool, artwork_images=artwork_images, scale=scale, layer=layer)
+                build_card.create_printing_image_from_Card(card, saved_image_path=save_path, save_path=printing_path, card_images=card_images, encoder_pool=encoder_pool)
+                render_times.append(time.perf_counter() - start_time)
+    artwork_cache.save_caches()
+    layout_cache.save_cache()
+    encoder_pool.wait()
+    for card, card_artwork, key in stored_entries:
+        render_store.put(key, card, card_artwork, save_path, printing_path)
+    if render_store is not None:
+        render_store.save()
+    if profile and cost_model is not None and len(cards) > 0:
+        for features, render_time in zip(card_features, render_times):
+            cost_model.add_sample(features, render_time, scale)
+        cost_model.calibrate()
+        cost_model.save()
+        error = sum([abs(estimate - render_time) for estimate, render_time in zip(estimates, render_times)]) / sum(render_times)
+        print(f"Profiled {len(cards)} {label}" + ("" if len(cards)==1 else "s") + f": {sum(render_times):.2f}s rendering, {sum(estimates):.2f}s estimated ({error*100:.0f}% error per {label}). Render cost model calibrated on {len(cost_model.samples)} samples.")
@@ -0,0 +1,333 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import threading
+
+import PIL
+from PIL import Image
+
+import paths
+import artwork_cache
+import layout_cache
+import output_encoding
+import rich_text
+import build_card
+
+# Content-addressed store of rendered card and token images, shared by every deck. Each render is keyed by a digest of everything its
+# images depend on: the card's drawn fields, its frame, the hash of its artwork, the fonts, symbols and other assets, the resolution scale,
+# the encoders and the source of the rendering code (RENDERER_MODULES), so that any change to the renderer renders every card again. The card image and printing image of each key are kept in RENDER_STORE_PATH, and the Cards,
+# Tokens and Printing folders of each deck get hardlinks to them (or copies, where hardlinks are not supported), so identical inputs
+# anywhere in the library (another deck, a renamed artwork, an older version of the deck) are rendered once.
+# The store also keeps the layer of each card drawn by build_card.CardDraw.render_layer (frame, text, symbols, P/T and indicators, without the
+# artwork), keyed by the same inputs minus the artwork and encoders, and saved as uncompressed BMP, which reads back much faster than the
+# layer can be drawn. When only the artwork of a card changes, its layer is read back and the new artwork pasted onto it, so the card's text
+# is not laid out and drawn again.
+# The time each entry was last used is kept in an index file, and entries are evicted once they are older than MAX_ENTRY_AGE_DAYS
+# or, oldest first, while the store is larger than MAX_STORE_MEGABYTES. Deck folders keep their links to evicted images.
+# Frames, fonts and other assets are identified by the SHA-1 of their content, remembered in hashes.json together with the size and
+# modification time of each file (as the artwork cache does), so a fresh checkout or a touched file doesn't invalidate the store.
+
+# Increase whenever the keys or the format of the stored entries change. Changes to the rendering code change the keys by themselves.
+RENDER_STORE_VERSION = 1
+MAX_STORE_MEGABYTES = 2048
+MAX_ENTRY_AGE_DAYS = 90
+# Fields of Card.to_dict that are never drawn, so cards that differ only in them share their images.
+UNRENDERED_FIELDS = ["setname", "artist", "tags", "complete", "related", "real"]
+# Folders of the symbols, indicators and overlays drawn on cards (see build_card.preload_assets).
+ASSET_FOLDERS = [paths.ASSETS_PATH, paths.SYMBOL_PATH, paths.SET_SYMBOL_PATH, paths.SAGA_SYMBOL_PATH, paths.MDFC_INDICATOR_PATH]
+# Modules whose code draws the stored images and layers.
+RENDERER_MODULES = [build_card, rich_text, artwork_cache, layout_cache]
+
+# Returns the SHA-1 of the source of the rendering code, so that stored images are not reused once any of it changes.
+def get_renderer_fingerprint():
+    sha1 = hashlib.sha1()
+    for module in RENDERER_MODULES:
+        with open(module.__file__, "rb") as f:
+            sha1.update(f.read())
+    return sha1.hexdigest()
+
+# Replaces target with a hardlink to source, or a copy of it if hardlinks are not supported. The target is replaced atomically.
+def link_or_copy(source, target):
+    # Renaming onto another link of the same file does nothing and would leave the temporary link behind
+    if os.path.isfile(target) and os.path.samefile(source, target):
+        return
+    temporary_target = target + "." + str(os.getpid()) + "." + str(threading.get_ident()) + ".tmp"
+    try:
+        os.link(source, temporary_target)
+    except OSError:
+        shutil.copy2(source, temporary_target)
+    os.replace(temporary_target, target)
+
+# Removes the file at the input path if there is one. Rendered files that are hardlinked to the store must be removed before they are
+# written again, so that writing them never changes the stored image they are linked to.
+def remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+class RenderStore:
+    def __init__(self, path=paths.RENDER_STORE_PATH):
+        self.path = path
+        self.index_path = os.path.join(path, "index.json")
+        self.lock = threading.Lock()
+        self.changed = False
+        self.entries = None
+        self.hashes_path = os.path.join(path, "hashes.json")
+        self.hashes_changed = False
+        try:
+            with open(self.hashes_path) as f:
+                self.hashes = json.load(f)
+        except:
+            self.hashes = {}
+        self.fingerprint = [PIL.__version__, get_renderer_fingerprint(), self.get_fonts_fingerprint(), self.get_assets_fingerprint()]
+
+    # Loads the index of stored entries ({key: last use time}).
+    def load(self):
+        try:
+            with open(self.index_path) as f:
+                self.entries = json.load(f)
+        except:
+            self.entries = {}
+
+    # Returns the SHA-1 of the file at the input path, reading the file only if it changed since it was last hashed.
+    def get_file_hash(self, path):
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        with self.lock:
+            entry = self.hashes.get(key)
+        if entry is not None and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+            return entry["sha1"]
+        sha1 = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha1.update(chunk)
+        with self.lock:
+            self.hashes[key] = {"mtime": stat.st_mtime, "size": stat.st_size, "sha1": sha1.hexdigest()}
+            self.hashes_changed = True
+        return sha1.hexdigest()
+
+    # Returns a list identifying the content of every font, so that stored images are not reused once any of them changes.
+    def get_fonts_fingerprint(self):
+        fingerprint = []
+        for font_path in sorted(set(paths.FONT_PATHS.values())):
+            try:
+                fingerprint.append(self.get_file_hash(font_path))
+            except OSError:
+                fingerprint.append(None)
+        return fingerprint
+
+    # Returns a list identifying the content of every symbol and overlay image, so that stored images are not reused once any of them changes.
+    def get_assets_fingerprint(self):
+        fingerprint = []
+        for folder in ASSET_FOLDERS:
+            for filename in sorted(os.listdir(folder)):
+                if os.path.splitext(filename)[1].lower() in [".png", ".jpg"]:
+                    fingerprint.append([os.path.relpath(os.path.join(folder, filename), paths.ASSETS_PATH), self.get_file_hash(os.path.join(folder, filename))])
+        return fingerprint
+
+    # Returns the inputs of every image of the input card other than its artwork: its drawn fields and the content of its frame.
+    def get_card_inputs(self, card):
+        drawn_fields = {key:value for key, value in card.to_dict().items() if key not in UNRENDERED_FIELDS}
+        try:
+            frame = [self.get_file_hash(card.frame)]
+        except (OSError, TypeError):
+            frame = [card.frame]
+        return [drawn_fields, frame]
+
+    # Returns the content key of the images of the input card rendered with the artwork of the input hash (None if it has no artwork).
+    def get_key(self, card, artwork_hash, scale=1):
+        card_or_token = "Tokens" if card.is_token() else "Cards"
+        encoders = [repr(output_encoding.encoders[card_or_token]), repr(output_encoding.encoders["Printing"])]
+        content = [RENDER_STORE_VERSION, self.fingerprint, self.get_card_inputs(card), artwork_hash, scale, encoders]
+        return hashlib.sha1(json.dumps(content, sort_keys=True).encode("utf-8")).hexdigest()
+
+    # Returns the content key of the layer of the input card (see build_card.CardDraw.render_layer).
+    def get_layer_key(self, card, scale=1):
+        content = [RENDER_STORE_VERSION, self.fingerprint, self.get_card_inputs(card), scale, "layer"]
+        return hashlib.sha1(json.dumps(content, sort_keys=True).encode("utf-8")).hexdigest()
+
+    # Returns a list of (artwork filename, content key) with one entry per image rendered for the input card (see build_card.create_card_image_from_Card).
+    def get_entries(self, card, artwork_folder, scale=1):
+        card_artworks = build_card.find_cards_with_card_name(card.name, search_path=artwork_folder) if os.path.isdir(artwork_folder) else []
+        if len(card_artworks) == 0:
+            return [(card.name+".jpg", self.get_key(card, None, scale))]
+        cache = artwork_cache.get_cache(os.path.dirname(artwork_folder))
+        return [(card_artwork, self.get_key(card, cache.source_hash(os.path.join(artwork_folder, card_artwork)), scale)) for card_artwork in card_artworks]
+
+    # Returns the paths of the stored card image and printing image of the input key.
+    def get_stored_paths(self, key, card):
+        folder = os.path.join(self.path, key[0:2])
+        card_or_token = "Tokens" if card.is_token() else "Cards"
+        return (output_encoding.encoders[card_or_token].output_path(os.path.join(folder, key+"_card")),
+                output_encoding.encoders["Printing"].output_path(os.path.join(folder, key+"_printing")))
+
+    # Returns the paths of the card image and printing image of the input card rendered with the input artwork, in the deck's Cards or Tokens folder (save_path) and Printing folder.
+    def get_deck_paths(self, card, card_artwork, save_path, printing_path):
+        card_or_token = "Tokens" if card.is_token() else "Cards"
+        printing_name = "_TOKEN_"+card_artwork if card.is_token() else card_artwork
+        return (output_encoding.encoders[card_or_token].output_path(os.path.join(save_path, card_artwork)),
+                output_encoding.encoders["Printing"].output_path(os.path.join(printing_path, printing_name)))
+
+    def get_layer_path(self, key):
+        return os.path.join(self.path, key[0:2], key+"_layer.bmp")
+
+    # Returns the stored layer of the input key, or None.
+    def load_layer(self, key):
+        try:
+            layer = Image.open(self.get_layer_path(key))
+            layer.load()
+        except:
+            return None
+        self.touch(key)
+        return layer
+
+    # Stores the input layer under the input key. Only RGB layers (drawn on the JPEG frames) are stored.
+    def put_layer(self, key, layer):
+        if layer.mode == "RGBX":
+            layer = layer.convert("RGB")
+        if layer.mode != "RGB":
+            return
+        layer_path = self.get_layer_path(key)
+        os.makedirs(os.path.dirname(layer_path), exist_ok=True)
+        temporary_path = layer_path + "." + str(os.getpid()) + "." + str(threading.get_ident()) + ".tmp"
+        layer.save(temporary_path, format="BMP")
+        os.replace(temporary_path, layer_path)
+        self.touch(key)
+
+    def has(self, key, card):
+        return all([os.path.isfile(stored_path) for stored_path in self.get_stored_paths(key, card)])
+
+    # Returns True if the deck's images of the input card rendered with the input artwork are links to the stored images of the input key.
+    def is_linked(self, key, card, card_artwork, save_path, printing_path):
+        for stored_path, deck_path in zip(self.get_stored_paths(key, card), self.get_deck_paths(card, card_artwork, save_path, printing_path)):
+            try:
+                if not os.path.samefile(stored_path, deck_path):
+                    return False
+            except OSError:
+                return False
+        return True
+
+    # Records that the entry of the input key was used now.
+    def touch(self, key):
+        with self.lock:
+            if self.entries is None:
+                self.load()
+            self.entries[key] = time.time()
+            self.changed = True
+
+    # Links the stored images of the input key into the deck folders.
+    def link_to_deck(self, key, card, card_artwork, save_path, printing_path):
+        for stored_path, deck_path in zip(self.get_stored_paths(key, card), self.get_deck_paths(card, card_artwork, save_path, printing_path)):
+            link_or_copy(stored_path, deck_path)
+        self.touch(key)
+
+    # Adds the images of a card that was just rendered into the deck folders to the store.
+    def put(self, key, card, card_artwork, save_path, printing_path):
+        stored_paths = self.get_stored_paths(key, card)
+        deck_paths = self.get_deck_paths(card, card_artwork, save_path, printing_path)
+        if not all([os.path.isfile(deck_path) for deck_path in deck_paths]):
+            return
+        os.makedirs(os.path.dirname(stored_paths[0]), exist_ok=True)
+        for stored_path, deck_path in zip(stored_paths, deck_paths):
+            link_or_copy(deck_path, stored_path)
+        self.touch(key)
+
+    # Removes the deck's existing images of the input card before it is rendered again (see remove_file).
+    def unlink_from_deck(self, card, card_artwork, save_path, printing_path):
+        for deck_path in self.get_deck_paths(card, card_artwork, save_path, printing_path):
+            remove_file(deck_path)
+
+    # Writes the index to disk if any entry was used since it was loaded, and the file hashes if any file was hashed again.
+    def save(self):
+        with self.lock:
+            if self.hashes_changed:
+                os.makedirs(self.path, exist_ok=True)
+                temporary_path = self.hashes_path + ".tmp"
+                with open(temporary_path, "w") as f:
+                    json.dump(self.hashes, f, indent=1)
+                os.replace(temporary_path, self.hashes_path)
+                self.hashes_changed = False
+            if not self.changed:
+                return
+            os.makedirs(self.path, exist_ok=True)
+            temporary_path = self.index_path + ".tmp"
+            with open(temporary_path, "w") as f:
+                json.dump(self.entries, f, separators=(",", ":"))
+            os.replace(temporary_path, self.index_path)
+            self.changed = False
+
+    # Removes the entries unused for more than max_age_days, then the least recently used ones while the store is larger than max_megabytes.
+    # Stored files missing from the index count as last used when they were written. Returns the number of entries removed.
+    def evict(self, max_megabytes=MAX_STORE_MEGABYTES, max_age_days=MAX_ENTRY_AGE_DAYS):
+        if not os.path.isdir(self.path):
+            return 0
+        with self.lock:
+            if self.entries is None:
+                self.load()
+            entry_files = {}
+            for folder in os.listdir(self.path):
+                if not os.path.isdir(os.path.join(self.path, folder)):
+                    continue
+                for filename in os.listdir(os.path.join(self.path, folder)):
+                    key = filename.split("_")[0]
+                    entry_files.setdefault(key, []).append(os.path.join(self.path, folder, filename))
+            last_used = {}
+            sizes = {}
+            for key, files in entry_files.items():
+                stats = [os.stat(f) for f in files]
+                last_used[key] = self.entries.get(key, max([s.st_mtime for s in stats]))
+                sizes[key] = sum([s.st_size for s in stats])
+            oldest_allowed = time.time() - max_age_days*24*3600
+            total_size = sum(sizes.values())
+            evicted = []
+            for key in sorted(entry_files, key=lambda k: last_used[k]):
+                if last_used[key] >= oldest_allowed and total_size <= max_megabytes*1024*1024:
+                    break
+                for f in entry_files[key]:
+                    remove_file(f)
+                total_size -= sizes[key]
+                evicted.append(key)
+            self.entries = {key: last_used[key] for key in entry_files if key not in evicted}
+            self.changed = True
+        self.save()
+        return len(evicted)
+
+    # Returns the number of entries and the size in bytes of the store.
+    def get_size(self):
+        entry_count = 0
+        total_size = 0
+        if os.path.isdir(self.path):
+            for folder in os.listdir(self.path):
+                if os.path.isdir(os.path.join(self.path, folder)):
+                    for filename in os.listdir(os.path.join(self.path, folder)):
+                        entry_count += "_card" in filename
+                        total_size += os.path.getsize(os.path.join(self.path, folder, filename))
+        return entry_count, total_size
+
+_store = None
+_store_lock = threading.Lock()
+
+# Returns the render store shared by every deck.
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = RenderStore()
+        return _store
+
+def main():
+    parser = argparse.ArgumentParser(description='Evicts old entries from the shared store of rendered images.')
+    parser.add_argument('-s', '--max-size', help='Size in megabytes the store is reduced to', type=float, default=MAX_STORE_MEGABYTES, dest='max_size')
+    parser.add_argument('-a', '--max-age', help='Entries unused for more than this many days are removed', type=float, default=MAX_ENTRY_AGE_DAYS, dest='max_age')
+    args = parser.parse_args()
+    store = get_store()
+    evicted = store.evict(max_megabytes=args.max_size, max_age_days=args.max_age)
+    entry_count, total_size = store.get_size()
+    print(f"Evicted {evicted} entries. The store holds {entry_count} renders in {total_size/1024/1024:.1f} MB.")
+
+if __name__ == "__main__":
+    main()
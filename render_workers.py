@@ -0,0 +1,58 @@
+import os
+import multiprocessing
+
+import build_card
+import layout_cache
+import render_store
+
+# Pool of worker processes rendering cards in parallel (see render_pipeline.render_card). The parent process decodes every asset a card can
+# be drawn with first (symbols, indicators, overlays, fonts and the frames of the deck's cards, see build_card.preload_assets), loads the
+# layout cache and the render store, and only then forks the workers. Each worker starts with all of it already in its memory, shared
+# copy-on-write with the parent and the other workers, instead of importing Pillow and decoding the assets again: starting a worker takes
+# milliseconds, and each added worker only adds the memory of the cards it is drawing. The workers are forked as soon as the pool is created,
+# before the build starts any thread, since a process forked while other threads hold locks can deadlock.
+# Where fork isn't available (e.g., on Windows), there's no pool and the cards are rendered in the calling thread.
+
+# Returns the number of render workers used by default: one per CPU, or none on a single CPU.
+def get_default_workers():
+    cpu_count = os.cpu_count() or 1
+    return cpu_count if cpu_count > 1 else 0
+
+class RenderWorkerPool:
+    #   workers -- Number of worker processes.
+    #   scale   -- Resolution scale at which the assets are preloaded.
+    #   frames  -- Paths of the frames to preload (see build_card.preload_assets).
+    def __init__(self, workers, scale=1, frames=[]):
+        build_card.preload_assets(frames=[frame for frame in frames if frame is not None and os.path.isfile(frame)], scale=scale)
+        cache = layout_cache.get_cache()
+        if cache.entries is None:
+            cache.load()
+        store = render_store.get_store()
+        if store.entries is None:
+            store.load()
+        self.workers = workers
+        self.pool = multiprocessing.get_context("fork").Pool(workers)
+
+    # Starts the pool, or returns None if fewer than two workers are asked for or processes can't be forked on this platform.
+    def start(workers, scale=1, frames=[]):
+        if workers is None or workers < 2 or "fork" not in multiprocessing.get_all_start_methods():
+            return None
+        return RenderWorkerPool(workers, scale=scale, frames=frames)
+
+    # Calls function with the input arguments in a worker process. Returns a multiprocessing AsyncResult: its get() returns the function's
+    # result, or raises its error.
+    def submit(self, function, *args):
+        return self.pool.apply_async(function, args)
+
+    # Waits for the submitted work to finish and stops the workers.
+    def shutdown(self):
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.pool.terminate()
+        self.shutdown()
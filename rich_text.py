@@ -0,0 +1,134 @@
+from collections import namedtuple
+
+# Rich-text model of the rules text. Each text block is parsed once into plain text with a style per character, and each line is then
+# described by an immutable tuple of TextRuns, which is what the line wrapper, the text measurer and the drawer consume.
+#   text   -- the characters of the run
+#   italic -- True if the run is drawn with the italics font (reminder text, <i>...</i>)
+#   symbol -- True if the run is an inline symbol placeholder (SYMBOL_PLACEHOLDER), over which the symbol image is pasted
+TextRun = namedtuple("TextRun", ["text", "italic", "symbol"])
+
+SYMBOL_PLACEHOLDER = "○"
+
+# Removes the <i> and </i> tags from the input text block and returns (plain text, italic flag of each character of the plain text).
+# Text in parentheses (reminder text) and between <i> and </i> is italicized. An unclosed italics section runs to the end of the block,
+# and an unopened one starts at the beginning of the block.
+def parse_italics(text_block):
+    if not any([it in text_block for it in ["(",")","<i>","</i>"]]):
+        return text_block, [False]*len(text_block)
+    italics_start_positions, italics_end_positions = [], []
+    last_found_indicator = None
+    for position in range(len(text_block)):
+        try:
+            if text_block[position:position+3]=="<i>":
+                if last_found_indicator is None or last_found_indicator != "<i>":
+                    italics_start_positions.append(position)
+                    text_block = text_block[0:position] + text_block[position+3:]
+                    last_found_indicator = "<i>"
+            elif text_block[position:position+4]=="</i>":
+                if last_found_indicator is None or last_found_indicator != "</i>":
+                    italics_end_positions.append(position)
+                    text_block = text_block[0:position] + text_block[position+4:]
+                    last_found_indicator = "</i>"
+            elif text_block[position]=="(":
+                if last_found_indicator is None or last_found_indicator != "(":
+                    italics_start_positions.append(position)
+                    last_found_indicator = "("
+            elif text_block[position]==")":
+                if last_found_indicator is None or last_found_indicator != ")":
+                    italics_end_positions.append(position+1)
+                    last_found_indicator = ")"
+        except:
+            pass
+    while len(italics_end_positions) < len(italics_start_positions):
+        italics_end_positions.append(len(text_block)+1)
+    while len(italics_start_positions) < len(italics_end_positions):
+        italics_start_positions = [0] + italics_start_positions
+    # Drop empty sections at the start of the block, then switch the style at every start and end position:
+    pairs = [(start, end) for start, end in zip(italics_start_positions, italics_end_positions) if end > 0]
+    if len(pairs) == 0:
+        return text_block, [False]*len(text_block)
+    boundaries = sorted([start for start, _ in pairs] + [end for _, end in pairs])
+    is_italic = boundaries[0] == 0
+    if not is_italic:
+        boundaries = [0] + boundaries
+    italic_flags = [False]*len(text_block)
+    for i in range(1, len(boundaries)):
+        for position in range(boundaries[i-1], min(boundaries[i], len(text_block))):
+            italic_flags[position] = is_italic
+        is_italic = not is_italic
+    return text_block, italic_flags
+
+# Splits a text block (with symbols already replaced by SYMBOL_PLACEHOLDER) into the words used for line wrapping.
+# Consecutive symbols are combined into a single word, together with any punctuation that directly follows them.
+def split_words(text_block):
+    words = text_block.split()
+    words_adjusted_for_symbols = []
+    last_symbol_seen = None
+    for wi, word in enumerate(words):
+        if word != SYMBOL_PLACEHOLDER:
+            if last_symbol_seen is not None:
+                words_adjusted_for_symbols.append(" " + "  ".join(words[last_symbol_seen:wi])+(" " if ((wi<=len(words)-1) and (words[wi] not in [".",",",":"]))else ""))
+                last_symbol_seen = None
+            words_adjusted_for_symbols.append(word)
+            continue
+        if last_symbol_seen is None:
+            last_symbol_seen = wi
+        if wi==len(words)-1:
+            words_adjusted_for_symbols.append(" " + "  ".join(words[last_symbol_seen:]))
+    # One more pass through the adjusted words, combining any symbols with following punctuation:
+    words_readjusted = []
+    previous_word_is_symbol = False
+    previous_word_is_quote = False
+    for word in words_adjusted_for_symbols:
+        if previous_word_is_symbol and word in [".",",",":",".\""]:
+            words_readjusted[-1] = words_readjusted[-1] + " " + word
+        elif previous_word_is_quote and SYMBOL_PLACEHOLDER in word:
+            words_readjusted[-1] = words_readjusted[-1] + word
+        else:
+            words_readjusted.append(word)
+        previous_word_is_symbol = SYMBOL_PLACEHOLDER in word
+        previous_word_is_quote = "\"" in word
+    return words_readjusted
+
+# Returns the italic flags of the non-whitespace characters of a parsed text block. Wrapping only changes whitespace, so these flags
+# give the style of every character of every line the block is wrapped into.
+def get_nonspace_italic_flags(text_block, italic_flags):
+    return [italic for c, italic in zip(text_block, italic_flags) if not c.isspace()]
+
+def count_nonspace(text):
+    return sum(1 for c in text if not c.isspace())
+
+# Returns the tuple of TextRuns of a line of a text block.
+#   nonspace_italic_flags -- the flags of the block, as returned by get_nonspace_italic_flags
+#   first_nonspace_index  -- index in nonspace_italic_flags of the first non-whitespace character of the line
+# Whitespace is italicized only if the characters on both sides of it are.
+def style_line(line, nonspace_italic_flags, first_nonspace_index=0):
+    runs = []
+    run_text, run_italic, run_symbol = "", None, None
+    k = first_nonspace_index
+    for c in line:
+        if c.isspace():
+            before = nonspace_italic_flags[k-1] if 0 < k <= len(nonspace_italic_flags) else None
+            after = nonspace_italic_flags[k] if k < len(nonspace_italic_flags) else None
+            italic = bool(before if after is None else (after if before is None else (before and after)))
+        else:
+            italic = nonspace_italic_flags[k] if k < len(nonspace_italic_flags) else False
+            k += 1
+        symbol = c == SYMBOL_PLACEHOLDER
+        if len(run_text) > 0 and (italic != run_italic or symbol or run_symbol):
+            runs.append(TextRun(run_text, run_italic, run_symbol))
+            run_text = ""
+        run_text, run_italic, run_symbol = run_text + c, italic, symbol
+    if len(run_text) > 0:
+        runs.append(TextRun(run_text, run_italic, run_symbol))
+    return tuple(runs)
+
+# Returns the text of the input runs as a list of (text, italic) chunks, merging consecutive runs of the same style. Each chunk is measured and drawn with a single font.
+def group_by_italics(runs):
+    chunks = []
+    for run in runs:
+        if len(chunks) > 0 and chunks[-1][1] == run.italic:
+            chunks[-1] = (chunks[-1][0] + run.text, run.italic)
+        else:
+            chunks.append((run.text, run.italic))
+    return chunks
@@ -0,0 +1,12 @@
+import os
+import sys
+
+import pytest
+
+# The modules are run from the repository root (paths.py uses paths relative to it), so every test runs there too.
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_PATH)
+
+@pytest.fixture(autouse=True)
+def run_from_root(monkeypatch):
+    monkeypatch.chdir(ROOT_PATH)
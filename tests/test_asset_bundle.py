@@ -0,0 +1,58 @@
+import os
+
+import pytest
+from PIL import Image
+
+import paths
+import asset_bundle
+import build_card
+import output_encoding
+import render_store
+from game_elements import Deck
+
+CARD_DICT = {"Elvish Sage": {"name": "Elvish Sage", "mana": "{1}{g}", "cardtype": "Creature", "subtype": "Elf Druid", "power": 1, "toughness": 2,
+                             "rarity": "common", "rules": "{t}: Add {g}.", "flavor": "The forest remembers."}}
+
+# Bundle of every asset but the frames, shared by the tests of this module
+@pytest.fixture(scope="module")
+def bundle(tmp_path_factory):
+    bundle_path = str(tmp_path_factory.mktemp("bundle") / "assets.bundle")
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    asset_bundle.build_bundle(bundle_path=bundle_path)
+    return asset_bundle.AssetBundle(bundle_path)
+
+# Makes the renderer load its assets from the bundle
+@pytest.fixture
+def use_bundle(bundle, monkeypatch):
+    monkeypatch.setattr(asset_bundle, "_bundle", bundle)
+    monkeypatch.setattr(asset_bundle, "_bundle_loaded", True)
+    monkeypatch.setattr(build_card, "_asset_images", {})
+    return bundle
+
+def test_images_keep_their_mode(bundle):
+    for path in [os.path.join(paths.ASSETS_PATH, "black_card.jpg")] + [os.path.join(paths.SYMBOL_PATH, f) for f in sorted(os.listdir(paths.SYMBOL_PATH)) if f.endswith(".png")][:5]:
+        image = bundle.get_image(path)
+        with Image.open(path) as original:
+            assert image.mode == original.mode
+            assert image.tobytes() == original.convert(image.mode).tobytes()
+
+def test_frames_are_left_out_by_default(bundle):
+    frame = os.path.join(paths.CARD_BORDERS_PATH, [f for f in sorted(os.listdir(paths.CARD_BORDERS_PATH)) if f.endswith(".jpg")][0])
+    assert bundle.get_image(frame) is None
+
+# Same as building a deck with -e png while there is an asset bundle
+def test_render_png_with_bundle(use_bundle, tmp_path):
+    card = Deck.from_dict(CARD_DICT, deck_name="Test").cards[0]
+    encoder = output_encoding.OutputEncoder("png")
+    for folder in ["Cards", "Printing"]:
+        os.mkdir(tmp_path / folder)
+    card_images = build_card.create_card_image_from_Card(card, save_path=str(tmp_path / "Cards"), encoder=encoder, artwork_images=[])
+    build_card.create_printing_image_from_Card(card, save_path=str(tmp_path / "Printing"), card_images=card_images, encoder=encoder)
+    for folder in ["Cards", "Printing"]:
+        with Image.open(tmp_path / folder / "Elvish Sage.png") as image:
+            assert image.format == "PNG" and image.mode == "RGB"
+
+def test_rgbx_layers_are_stored(tmp_path):
+    store = render_store.RenderStore(path=str(tmp_path))
+    store.put_layer("0123", Image.new("RGBX", (8, 8)))
+    assert store.load_layer("0123").mode == "RGB"
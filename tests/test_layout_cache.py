@@ -0,0 +1,10 @@
+import layout_cache
+
+def test_key_depends_on_layout_source(tmp_path, monkeypatch):
+    source_path = tmp_path / "build_card.py"
+    source_path.write_text("# layout code\n")
+    monkeypatch.setattr(layout_cache, "LAYOUT_SOURCE_PATHS", [str(source_path)])
+    key = layout_cache.LayoutCache(str(tmp_path / "layout.json")).key("rules_text", "Flying", 500)
+    assert layout_cache.LayoutCache(str(tmp_path / "layout.json")).key("rules_text", "Flying", 500) == key
+    source_path.write_text("# changed layout code\n")
+    assert layout_cache.LayoutCache(str(tmp_path / "layout.json")).key("rules_text", "Flying", 500) != key
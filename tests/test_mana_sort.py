@@ -0,0 +1,27 @@
+import random
+from functools import cmp_to_key
+
+from game_elements import Mana
+
+SYMBOLS = sorted(set(Mana.sorted_order) | set(Mana.mana_symbols))
+
+# Sorts the input mana cost with the pairwise comparator alone, as Mana.sort did before it used rank keys
+def sort_with_comparator(mana_cost):
+    mana_symbols = Mana.get_mana_symbols(Mana.correct_hybrid_symbols(mana_cost.lower()))
+    mana_symbols_list = []
+    for mana_symbol in mana_symbols.keys():
+        mana_symbols_list += [mana_symbol for i in range(mana_symbols[mana_symbol])]
+    return "".join(["{"+m+"}" for m in sorted(mana_symbols_list, key=cmp_to_key(Mana.compare_two_mana_symbols))])
+
+def test_rank_key_matches_comparator():
+    rng = random.Random(34)
+    for _ in range(20000):
+        distinct_symbols = rng.sample(SYMBOLS, rng.randint(1, 6))
+        mana_symbols_list = [rng.choice(distinct_symbols) for _ in range(rng.randint(1, 10))]
+        mana_cost = "".join(["{"+m+"}" for m in mana_symbols_list])
+        assert Mana.sort_uncached(mana_cost) == sort_with_comparator(mana_cost), mana_cost
+
+def test_wrap_around_order():
+    assert Mana.sort("{g}{w}") == "{g}{w}"
+    assert Mana.sort("{w}{g}") == "{g}{w}"
+    assert Mana.sort("{u}{2}{w}") == "{2}{w}{u}"
@@ -0,0 +1,25 @@
+import io
+
+import pytest
+from PIL import Image
+
+import output_encoding
+
+# Every mode the renderer can produce (RGBX comes from the asset bundle, LA and P from PNG assets) must be writable in every format
+@pytest.mark.parametrize("image_format", ["jpeg", "png", "webp"])
+@pytest.mark.parametrize("mode", ["RGB", "RGBX", "RGBA", "L", "LA", "P", "CMYK"])
+def test_encode_every_mode(image_format, mode):
+    image = Image.new(mode, (8, 8))
+    encoded = output_encoding.OutputEncoder(image_format).encode(image)
+    assert Image.open(io.BytesIO(encoded)).format == output_encoding.ENCODING_FORMATS[image_format][0]
+
+def test_prepare_image_keeps_transparency():
+    image = Image.new("LA", (8, 8))
+    assert output_encoding.OutputEncoder("png").prepare_image(image).mode == "LA"
+    assert output_encoding.OutputEncoder("webp").prepare_image(image).mode == "RGBA"
+    assert output_encoding.OutputEncoder("jpeg").prepare_image(image).mode == "RGB"
+
+def test_prepare_image_keeps_writable_modes():
+    image = Image.new("RGB", (8, 8))
+    for image_format in output_encoding.ENCODING_FORMATS:
+        assert output_encoding.OutputEncoder(image_format).prepare_image(image) is image
@@ -0,0 +1,49 @@
+import json
+import threading
+import http.client
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import preview_server
+
+CARD_DICT = {"name": "Elvish Sage", "mana": "{1}{g}", "cardtype": "Creature", "subtype": "Elf Druid", "power": 1, "toughness": 2, "rarity": "common", "rules": "{t}: Add {g}."}
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), preview_server.PreviewRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+# Posts the input body to /render with the input query string and returns (status, response body)
+def post_render(server, query="", body=CARD_DICT):
+    connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1])
+    connection.request("POST", "/render" + query, body=body if type(body) == bytes else json.dumps(body).encode("utf-8"))
+    response = connection.getresponse()
+    return response.status, response.read()
+
+def test_render_printing_png(server):
+    status, body = post_render(server, "?variant=printing")
+    assert status == 200 and body.startswith(b"\x89PNG")
+
+def test_invalid_requests_are_client_errors(server):
+    assert post_render(server, body=b"not json")[0] == 400
+    assert post_render(server, body={"mana": "{g}"})[0] == 400
+    assert post_render(server, body={"name": "Elvish Sage", "rarity": "bogus"})[0] == 400
+    assert post_render(server, "?scale=-1")[0] == 400
+
+def test_deck_must_be_a_known_deck(server, monkeypatch):
+    monkeypatch.setattr(preview_server.game_elements.Deck, "find_deck_names", lambda: ["Test"])
+    assert post_render(server, "?deck=Test")[0] == 200
+    for deck_name in ["..", "../..", "Test/../..", "%2Fetc", "Unknown"]:
+        assert post_render(server, "?deck=" + deck_name)[0] == 400
+
+def test_render_failures_are_server_errors(server, monkeypatch):
+    def fail(*args, **kwargs):
+        raise OSError("internal detail")
+    monkeypatch.setattr(preview_server, "render_preview", fail)
+    status, body = post_render(server)
+    assert status == 500 and b"internal detail" not in body